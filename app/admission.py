@@ -0,0 +1,141 @@
+# admission.py
+"""
+Contrôle d'admission des connexions avant l'échange de clés SSH.
+
+L'échange de clés (transport.start_server) est l'étape la plus coûteuse
+en CPU ; un scanner qui se reconnecte en boucle suffit à saturer le
+serveur. Chaque connexion acceptée passe d'abord par :
+
+  - un seau à jetons par IP source,
+  - un seau à jetons par /24 (ou /64 en IPv6),
+  - un plafond global de handshakes simultanés.
+
+Un refus ne coûte qu'un close() (et un événement connection_throttled).
+"""
+import ipaddress
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_IP_RATE = 2.0           # connexions/s par IP (régime permanent)
+DEFAULT_IP_BURST = 10
+DEFAULT_NET_RATE = 10.0         # connexions/s par /24
+DEFAULT_NET_BURST = 50
+DEFAULT_MAX_HANDSHAKES = 64
+MAX_TRACKED = 100000            # seaux gardés en mémoire (LRU)
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst, now):
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, rate, burst, now):
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class _BucketTable:
+    """Seaux par clé, bornés en nombre (les plus anciens sont oubliés)."""
+
+    def __init__(self, rate, burst, max_tracked=MAX_TRACKED):
+        self.rate = rate
+        self.burst = burst
+        self.max_tracked = max_tracked
+        self._buckets = OrderedDict()
+
+    def take(self, key, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, now)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_tracked:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket.take(self.rate, self.burst, now)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def network_of(ip):
+    """Préfixe /24 (IPv4) ou /64 (IPv6) d'une adresse."""
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return ip
+    prefix = 24 if addr.version == 4 else 64
+    return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+
+
+class HandshakeSlot:
+    """Place de handshake ; release() peut être appelé plusieurs fois."""
+
+    __slots__ = ("_sem",)
+
+    def __init__(self, sem):
+        self._sem = sem
+
+    def release(self):
+        sem, self._sem = self._sem, None
+        if sem is not None:
+            sem.release()
+
+
+class AdmissionController:
+    def __init__(self,
+                 ip_rate=DEFAULT_IP_RATE, ip_burst=DEFAULT_IP_BURST,
+                 net_rate=DEFAULT_NET_RATE, net_burst=DEFAULT_NET_BURST,
+                 max_handshakes=DEFAULT_MAX_HANDSHAKES):
+        self._lock = threading.Lock()
+        self._per_ip = _BucketTable(ip_rate, ip_burst)
+        self._per_net = _BucketTable(net_rate, net_burst)
+        self._handshakes = threading.BoundedSemaphore(max_handshakes)
+        self.max_handshakes = max_handshakes
+        # Métriques
+        self.admitted = 0
+        self.throttled = {"ip_rate": 0, "net_rate": 0, "handshake_concurrency": 0}
+
+    def admit(self, ip):
+        """
+        Décision au moment de l'accept(). Retourne None si la connexion est
+        admise, sinon la raison du refus ("ip_rate" / "net_rate").
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not self._per_ip.take(ip, now):
+                self.throttled["ip_rate"] += 1
+                return "ip_rate"
+            if not self._per_net.take(network_of(ip), now):
+                self.throttled["net_rate"] += 1
+                return "net_rate"
+            self.admitted += 1
+        return None
+
+    def begin_handshake(self):
+        """
+        Réserve une place de handshake (non bloquant). Retourne un
+        HandshakeSlot à libérer une fois l'échange de clés terminé, ou None
+        si le plafond est atteint.
+        """
+        if self._handshakes.acquire(blocking=False):
+            return HandshakeSlot(self._handshakes)
+        with self._lock:
+            self.throttled["handshake_concurrency"] += 1
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "admitted": self.admitted,
+                "throttled": dict(self.throttled),
+                "tracked_ips": len(self._per_ip),
+                "tracked_networks": len(self._per_net),
+            }
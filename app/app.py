@@ -1,48 +1,85 @@
 #!/usr/bin/env python3
-from flask import Flask, request, render_template_string, redirect, session, url_for, send_from_directory
-import sqlite3, os, logging, json
-from datetime import datetime
+from flask import Flask, Request, request, render_template, get_template_attribute, make_response, redirect, session, url_for, send_from_directory
+import sqlite3, os, logging
+from urllib.parse import urlencode
+from datetime import datetime, timezone
+import time
 #import seccomp_config
 import subprocess
+import event_sink
+from event_sink import get_sink, flush_on_sigterm
+import db
+from response_cache import ResponseCache
+from upload_store import UploadStore
+from werkzeug.exceptions import RequestEntityTooLarge
 
 app = Flask(__name__)
 app.secret_key = 'supersecretkey123'
+db.init_app(app)
 
 # === Dossiers ===
 UPLOAD_FOLDER = 'uploads'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# === Uploads (voir upload_store.py) ===
+# Les fichiers multipart sont écrits et hachés au fil de la lecture,
+# directement dans le stockage par contenu, dans la limite de
+# ECOM_UPLOAD_MAX_BYTES (au-delà : 413).
+UPLOADS = UploadStore(UPLOAD_FOLDER, max_bytes=int(os.environ.get('ECOM_UPLOAD_MAX_BYTES', str(16 * 1024 * 1024))))
+app.config['MAX_CONTENT_LENGTH'] = UPLOADS.max_bytes + 64 * 1024    # + enveloppe multipart
+
+class HoneypotRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UPLOADS.spool()
+
+app.request_class = HoneypotRequest
+
 # --- Répertoire des logs commun (../logs) ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))          # .../projet_honeypot_final/app
-LOG_DIR = os.path.join(os.path.dirname(BASE_DIR), "logs")      # .../projet_honeypot_final/logs
+LOG_DIR = os.environ.get("ECOM_LOG_DIR", os.path.join(os.path.dirname(BASE_DIR), "logs"))  # .../projet_honeypot_final/logs
 os.makedirs(LOG_DIR, exist_ok=True)
 
-# Logging JSON pour ELK
-logging.basicConfig(
-    filename=os.path.join(LOG_DIR, 'ecom_honeypot.log'),
-    level=logging.INFO,
-    format='%(message)s'
-)
-
-def log_event(event_type, details=None):
-    entry = {
-        '@timestamp': datetime.utcnow().isoformat() + 'Z',
+# Logging JSON pour ELK (écriture par lots en arrière-plan, voir event_sink.py).
+# log_event ne fait qu'une capture de la requête (références vers des
+# objets immuables : args, form, en-tête) ; la mise en forme de l'événement
+# et le JSON sont faits par le thread d'écriture (serialize_event).
+def serialize_event(snapshot):
+    ts, event_type, src_ip, user_agent, method, path, args, form, details = snapshot
+    return event_sink.dumps({
+        '@timestamp': datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat() + 'Z',
         'honeypot': 'ecommerce',
         'event_type': event_type,
-        'src_ip': request.remote_addr,
-        'user_agent': request.headers.get('User-Agent', ''),
-        'method': request.method,
-        'path': request.path,
-        'query': request.args.to_dict(),
-        'form': request.form.to_dict() if request.form else {},
+        'src_ip': src_ip,
+        'user_agent': user_agent,
+        'method': method,
+        'path': path,
+        'query': args.to_dict(),
+        'form': form.to_dict() if form else {},
         'details': details or {}
-    }
-    logging.info(json.dumps(entry, ensure_ascii=False))
+    })
+
+LOG_SINK = get_sink(os.path.join(LOG_DIR, 'ecom_honeypot.log'), serializer=serialize_event)
+
+def log_event(event_type, details=None):
+    try:
+        form = request.form
+    except RequestEntityTooLarge:
+        form = None                 # corps refusé (voir upload())
+    LOG_SINK.emit((time.time(), event_type, request.remote_addr,
+                   request.headers.get('User-Agent', ''), request.method,
+                   request.path, request.args, form, details))
 
 # === DB setup ===
 def init_db():
-    conn = sqlite3.connect('database.db')
+    """
+    Crée le schéma et les données par défaut. Idempotent et sûr en
+    parallèle : tout se fait dans une transaction BEGIN IMMEDIATE, donc si
+    plusieurs processus démarrent ensemble (workers sans preload), un seul
+    écrit à la fois et les suivants ne trouvent plus rien à faire.
+    """
+    conn = db.connect()
     c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
     c.execute('''CREATE TABLE IF NOT EXISTS users (
         id INTEGER PRIMARY KEY,
         username TEXT UNIQUE,
@@ -74,72 +111,94 @@ def init_db():
         total REAL,
         date TEXT
     )''')
+    # Version du catalogue, incrémentée à chaque écriture sur products
+    # (invalide les caches de db.py)
+    c.execute('''CREATE TABLE IF NOT EXISTS catalog_meta (
+        version INTEGER NOT NULL
+    )''')
+    c.execute("INSERT INTO catalog_meta (version) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM catalog_meta)")
+    for op in ('INSERT', 'UPDATE', 'DELETE'):
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS products_{op.lower()}_version
+        AFTER {op} ON products
+        BEGIN UPDATE catalog_meta SET version = version + 1; END''')
+    # Index secondaires et évolutions du schéma (voir db.MIGRATIONS)
+    applied = db.migrate(conn)
+    if applied:
+        logging.info("Migrations du schéma appliquées : %s", applied)
+    # Index plein texte de /search
+    if not db.create_search_index(conn):
+        logging.warning("SQLite sans FTS5 : la recherche utilisera LIKE")
     # default data
     c.execute("INSERT OR IGNORE INTO users (username, password, role) VALUES ('admin','admin123','admin')")
-    c.execute("INSERT OR IGNORE INTO products (name, category, price, description) VALUES ('Laptop Pro','Laptop',1299.99,'Puissant et rapide')")
-    c.execute("INSERT OR IGNORE INTO products (name, category, price, description) VALUES ('Smartphone X','Phone',899.99,'Caméra 108MP')")
-    c.execute("INSERT OR IGNORE INTO products (name, category, price, description) VALUES ('Wireless Mouse','Accessory',49.99,'Souris sans fil')")
+    # products n'a pas de contrainte UNIQUE : on n'insère que les produits
+    # absents, sinon chaque démarrage (ou chaque worker) les dupliquerait
+    for product in [('Laptop Pro', 'Laptop', 1299.99, 'Puissant et rapide'),
+                    ('Smartphone X', 'Phone', 899.99, 'Caméra 108MP'),
+                    ('Wireless Mouse', 'Accessory', 49.99, 'Souris sans fil')]:
+        c.execute("""INSERT INTO products (name, category, price, description)
+            SELECT ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM products WHERE name = ?)""",
+            product + (product[0],))
     conn.commit()
     conn.close()
 
 init_db()
 
 # === Templates ===
-BASE = """
-<!DOCTYPE html>
-<html><head>
-<meta charset="utf-8">
-<title>E-Shop Pro</title>
-<link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.3/dist/css/bootstrap.min.css" rel="stylesheet">
-<style>
-body { padding-top: 70px; background:#f8f9fa; }
-.card-img-top { height:200px; object-fit:cover; }
-.comment-box { margin-top:10px; }
-</style>
-</head><body>
-<nav class="navbar navbar-expand-lg navbar-dark bg-dark fixed-top">
-<div class="container">
-<a class="navbar-brand" href="/">E-Shop Pro</a>
-<form class="d-flex me-auto" action="/search" method="get">
-<input class="form-control me-2" type="search" name="q" placeholder="Recherche...">
-<button class="btn btn-outline-light" type="submit">Search</button>
-</form>
-<div class="navbar-nav ms-auto">
-<a class="nav-link" href="/cart">Panier</a>
-{% if session.username %}
-<a class="nav-link" href="/profile">{{ session.username }}</a>
-<a class="nav-link" href="/logout">Déconnexion</a>
-{% else %}
-<a class="nav-link" href="/login">Login</a>
-<a class="nav-link" href="/register">Inscription</a>
-{% endif %}
-<a class="nav-link" href="/upload">Upload</a>
-<a class="nav-link" href="/admin">Admin</a>
-</div>
-</div>
-</nav>
-<div class="container mt-4">
-{{ content|safe }}
-</div>
-</body></html>
-"""
+# templates/base.html (mise en page) et templates/_macros.html (cartes
+# produit) : compilés une seule fois par l'environnement Jinja de Flask.
+def render_cards(products):
+    return str(get_template_attribute('_macros.html', 'product_cards')(products))
+
+# Cartes de la première page de l'accueil : (version du catalogue, HTML,
+# curseur de la page suivante), recalculées seulement quand la table
+# products change (voir catalog_meta)
+_home_cards = (None, "", None)
+
+def home_cards():
+    global _home_cards
+    version = db.current_catalog_version()
+    if _home_cards[0] != version:
+        products, next_after = db.get_catalog_page()
+        _home_cards = (version, render_cards(products), next_after)
+    return _home_cards[1], _home_cards[2]
+
+def next_page_link(next_after):
+    """Lien "Page suivante" (mêmes paramètres, ?after= avancé), ou ''."""
+    if next_after is None:
+        return ""
+    args = request.args.to_dict()
+    args['after'] = next_after
+    return f'<p><a href="{request.path}?{urlencode(args)}" class="btn btn-outline-primary">Page suivante</a></p>'
+
+# === Cache des pages (visiteurs anonymes, voir response_cache.py) ===
+RESPONSE_CACHE = ResponseCache(
+    ttl=float(os.environ.get('ECOM_RESPONSE_CACHE_TTL', '30')),
+    max_entries=int(os.environ.get('ECOM_RESPONSE_CACHE_SIZE', '1000')),
+)
+
+def cached_page(render, tags=()):
+    """
+    Réponse de render() (HTML, ou None si la page n'existe pas), servie
+    depuis le cache pour les GET anonymes, avec ETag / If-None-Match.
+    Le log_event de la page reste à la charge de la route, à chaque hit.
+    """
+    if request.method != 'GET' or 'username' in session or not RESPONSE_CACHE.enabled:
+        body = render()
+        return None if body is None else make_response(body)
+    version = db.current_catalog_version()
+    entry = RESPONSE_CACHE.get(request.full_path, version)
+    if entry is None:
+        body = render()
+        if body is None:
+            return None
+        entry = RESPONSE_CACHE.put(request.full_path, body.encode('utf-8'), version, tags)
+    resp = make_response(entry.body)
+    resp.set_etag(entry.etag)
+    return resp.make_conditional(request)
 
 # === Helpers ===
 def get_products(query=None, category=None):
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
-    sql = "SELECT * FROM products WHERE 1=1"
-    params = []
-    if query:
-        sql += " AND name LIKE ?"
-        params.append('%'+query+'%')
-    if category:
-        sql += " AND category=?"
-        params.append(category)
-    c.execute(sql, params)
-    products = c.fetchall()
-    conn.close()
-    return products
+    return db.get_products(query, category)
 
 def add_to_cart(product_id):
     if 'cart' not in session:
@@ -155,60 +214,47 @@ def remove_from_cart(product_id):
 # === Routes ===
 @app.route('/')
 def index():
-    products = get_products()
-    cards = ""
-    for p in products:
-        cards += f'''
-        <div class="col-md-4 mb-4">
-        <div class="card">
-        <div class="card-body">
-        <h5 class="card-title">{p[1]}</h5>
-        <p class="card-text">{p[4]}</p>
-        <p class="h4 text-success">{p[3]} €</p>
-        <a href="/product?id={p[0]}" class="btn btn-primary">Voir</a>
-        <a href="/cart?add={p[0]}" class="btn btn-success">Ajouter</a>
-        </div></div></div>
-        '''
-    content = f'<h1>Bienvenue sur E-Shop Pro</h1><div class="row">{cards}</div>'
     log_event('page_access', {'page': 'home'})
-    return render_template_string(BASE, content=content, session=session)
+    return cached_page(render_home)
+
+def render_home():
+    after = db.page_cursor(request.args.get('after'))
+    limit = db.page_size(request.args.get('limit'), db.CATALOG_PAGE_SIZE)
+    if after is None and limit == db.CATALOG_PAGE_SIZE:
+        cards, next_after = home_cards()
+    else:
+        products, next_after = db.get_catalog_page(after, limit)
+        cards = render_cards(products)
+    content = f'<h1>Bienvenue sur E-Shop Pro</h1><div class="row">{cards}</div>{next_page_link(next_after)}'
+    return render_template('base.html', content=content)
 
 @app.route('/search')
 def search():
     q = request.args.get('q', '')
     products = get_products(q)
-    cards = ""
-    for p in products:
-        cards += f'''
-        <div class="col-md-4 mb-4">
-        <div class="card">
-        <div class="card-body">
-        <h5 class="card-title">{p[1]}</h5>
-        <p class="card-text">{p[4]}</p>
-        <p class="h4 text-success">{p[3]} €</p>
-        <a href="/product?id={p[0]}" class="btn btn-primary">Voir</a>
-        <a href="/cart?add={p[0]}" class="btn btn-success">Ajouter</a>
-        </div></div></div>
-        '''
+    cards = render_cards(products) if products else ""
     if cards:
         content = f'<h2>Résultats pour : {q}</h2><div class="row">{cards}</div>'
     else:
         content = f'<h2>Résultats pour : {q}</h2><p>Aucun résultat</p>'
     log_event('search', {'query': q})
-    return render_template_string(BASE, content=content, session=session)
+    return render_template('base.html', content=content)
 
 @app.route('/product')
 def product():
     pid = request.args.get('id')
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM products WHERE id=?", (pid,))
-    p = c.fetchone()
-    c.execute("SELECT * FROM comments WHERE product_id=?", (pid,))
-    comments = c.fetchall()
-    conn.close()
-    if not p:
+    resp = cached_page(lambda: render_product(pid), tags=[('product', db.product_key(pid))])
+    if resp is None:
         return "Produit non trouvé", 404
+    log_event('product_view', {'id': pid})
+    return resp
+
+def render_product(pid):
+    p = db.get_product(pid)
+    if not p:
+        return None
+    comments, next_after = db.get_comments(pid, db.page_cursor(request.args.get('after')),
+                                           db.page_size(request.args.get('limit')))
     comment_html = ""
     for com in comments:
         comment_html += f"<li><strong>{com[2]}</strong>: {com[3]}</li>"
@@ -228,11 +274,11 @@ def product():
     <button class="btn btn-primary">Publier</button>
     </form>
     <ul class="comment-box">{comment_html}</ul>
+    {next_page_link(next_after)}
     </div>
     </div>
     '''
-    log_event('product_view', {'id': pid})
-    return render_template_string(BASE, content=content, session=session)
+    return render_template('base.html', content=content)
 
 @app.route('/comment', methods=['POST'])
 def comment():
@@ -240,12 +286,8 @@ def comment():
         return redirect('/login')
     pid = request.form['product_id']
     comment_text = request.form['comment']
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
-    c.execute("INSERT INTO comments(product_id,username,comment) VALUES(?,?,?)",
-              (pid, session['username'], comment_text))
-    conn.commit()
-    conn.close()
+    db.add_comment(pid, session['username'], comment_text)
+    RESPONSE_CACHE.invalidate_tag(('product', db.product_key(pid)))
     log_event('comment', {'product_id': pid, 'comment': comment_text})
     return redirect(f'/product?id={pid}')
 
@@ -260,17 +302,10 @@ def cart():
         remove_from_cart(remove_id)
         log_event('cart_remove', {'product_id': remove_id})
     items = session.get('cart', [])
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
-    products = []
+    products = db.get_products_by_ids(items)
     total = 0
-    for pid in items:
-        c.execute("SELECT * FROM products WHERE id=?", (pid,))
-        p = c.fetchone()
-        if p:
-            products.append(p)
-            total += p[3]
-    conn.close()
+    for p in products:
+        total += p[3]
     content = "<h2>Panier</h2>"
     if products:
         content += "<ul>"
@@ -279,7 +314,7 @@ def cart():
         content += f"</ul><p>Total : {total} €</p><a href='/checkout' class='btn btn-success'>Payer</a>"
     else:
         content += "<p>Votre panier est vide.</p>"
-    return render_template_string(BASE, content=content, session=session)
+    return render_template('base.html', content=content)
 
 @app.route('/checkout', methods=['GET', 'POST'])
 def checkout():
@@ -287,20 +322,12 @@ def checkout():
         log_event('checkout', {'user': session.get('username')})
         items = session.get('cart', [])
         total = 0
-        conn = sqlite3.connect('database.db')
-        c = conn.cursor()
         products = []
-        for pid in items:
-            c.execute("SELECT * FROM products WHERE id=?", (pid,))
-            p = c.fetchone()
-            if p:
-                products.append(p[1])
-                total += p[3]
-        c.execute("INSERT INTO orders(username,products,total,date) VALUES(?,?,?,?)",
-                  (session.get('username', 'guest'), ','.join(products), total,
-                   datetime.utcnow().isoformat()))
-        conn.commit()
-        conn.close()
+        for p in db.get_products_by_ids(items):
+            products.append(p[1])
+            total += p[3]
+        db.create_order(session.get('username', 'guest'), ','.join(products), total,
+                        datetime.utcnow().isoformat())
         session['cart'] = []
         return "Paiement simulé effectué ! Merci."
     content = '''
@@ -312,18 +339,14 @@ def checkout():
     <button class="btn btn-danger">Confirmer le paiement</button>
     </form>
     '''
-    return render_template_string(BASE, content=content, session=session)
+    return render_template('base.html', content=content)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        conn = sqlite3.connect('database.db')
-        c = conn.cursor()
-        c.execute("SELECT * FROM users WHERE username=? AND password=?", (username, password))
-        user = c.fetchone()
-        conn.close()
+        user = db.get_user(username, password)
         if user:
             session['username'] = user[1]
             session['role'] = user[3]
@@ -338,23 +361,18 @@ def login():
     <input class="form-control mb-2" name="password" placeholder="admin123" type="password"><br>
     <button class="btn btn-primary">Login</button>
     </form>'''
-    return render_template_string(BASE, content=content, session=session)
+    return render_template('base.html', content=content)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
-        conn = sqlite3.connect('database.db')
-        c = conn.cursor()
         try:
-            c.execute("INSERT INTO users(username,password) VALUES(?,?)", (username, password))
-            conn.commit()
+            db.create_user(username, password)
             session['username'] = username
-        except:
+        except sqlite3.Error:
             return "Utilisateur existe déjà"
-        finally:
-            conn.close()
         return redirect('/')
     content = '''<h2>Inscription</h2>
     <form method="post">
@@ -362,43 +380,47 @@ def register():
     <input class="form-control mb-2" name="password" type="password" placeholder="pass123"><br>
     <button class="btn btn-success">S'inscrire</button>
     </form>'''
-    return render_template_string(BASE, content=content, session=session)
+    return render_template('base.html', content=content)
 
 @app.route('/profile')
 def profile():
     if 'username' not in session:
         return redirect('/login')
-    conn = sqlite3.connect('database.db')
-    c = conn.cursor()
-    c.execute("SELECT * FROM orders WHERE username=?", (session['username'],))
-    orders = c.fetchall()
-    conn.close()
+    orders, next_after = db.get_orders(session['username'], db.page_cursor(request.args.get('after')),
+                                       db.page_size(request.args.get('limit')))
     orders_html = ""
     for o in orders:
         # o[2] = products, o[3] = total, o[4] = date
         orders_html += f"<li>Produits: {o[2]} | Total: {o[3]} € | Date: {o[4]}</li>"
     content = f"<h2>Profil de {session['username']}</h2><p>Rôle: {session.get('role','user')}</p>"
     if orders_html:
-        content += "<h3>Commandes</h3><ul>" + orders_html + "</ul>"
+        content += "<h3>Commandes</h3><ul>" + orders_html + "</ul>" + next_page_link(next_after)
     else:
         content += "<p>Aucune commande passée</p>"
-    return render_template_string(BASE, content=content, session=session)
+    return render_template('base.html', content=content)
 
 @app.route('/upload', methods=['GET', 'POST'])
 def upload():
     if request.method == 'POST':
-        f = request.files['file']
+        try:
+            f = request.files['file']
+        except RequestEntityTooLarge:
+            log_event('upload_too_large', {'content_length': request.content_length, 'max_bytes': UPLOADS.max_bytes})
+            raise
         if f:
-            path = os.path.join(UPLOAD_FOLDER, f.filename)
-            f.save(path)
-            log_event('upload', {'filename': f.filename, 'size': os.path.getsize(path)})
-            return f"Fichier {f.filename} uploadé ! <a href='/uploads/{f.filename}'>Voir</a>"
+            stored = UPLOADS.commit(f.stream, f.filename)
+            details = {'filename': f.filename, 'stored_as': stored.name, 'size': stored.size,
+                       'sha256': stored.sha256, 'duplicate': stored.duplicate, 'content_type': f.content_type}
+            if stored.ssdeep is not None:
+                details['ssdeep'] = stored.ssdeep
+            log_event('upload', details)
+            return f"Fichier {stored.name} uploadé ! <a href='/uploads/{stored.name}'>Voir</a>"
     content = '''<h2>Upload fichier</h2>
     <form method="post" enctype="multipart/form-data">
     <input type="file" name="file"><br><br>
     <button class="btn btn-primary">Uploader</button>
     </form>'''
-    return render_template_string(BASE, content=content, session=session)
+    return render_template('base.html', content=content)
 
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
@@ -424,7 +446,7 @@ def admin():
             content += f"<pre>Erreur :\n{e.output}</pre>"
 
     content += "<p>Usage: /admin?cmd=ls -la</p>"
-    return render_template_string(BASE, content=content, session=session)
+    return render_template('base.html', content=content)
 
 @app.route('/logout')
 def logout():
@@ -434,9 +456,12 @@ def logout():
 @app.errorhandler(404)
 def page_not_found(e):
     log_event('404', {'path': request.path})
-    return render_template_string(BASE, content="<h2>Page non trouvée</h2>", session=session), 404
+    return render_template('base.html', content="<h2>Page non trouvée</h2>"), 404
 
 if __name__ == '__main__':
+    # Serveur de développement (un seul processus). En production :
+    #   gunicorn -c gunicorn.conf.py wsgi:app
     #seccomp_config.apply_seccomp_blacklist()
+    flush_on_sigterm()
     print("[+] Honeypot E-commerce complet démarré sur http://0.0.0.0:5000")
     app.run(host='0.0.0.0', port=5000, threaded=True)
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# auth_stats.py
+"""
+Statistiques en continu sur les tentatives d'authentification (SSH, FTP),
+en mémoire bornée, sans relire les logs :
+
+  - HyperLogLog : nombre d'IP, d'identifiants, de mots de passe et de
+    couples identifiant:mot de passe distincts (~0,8 % d'erreur, p=14) ;
+  - Count-Min : fréquence estimée (par excès) de n'importe quelle IP ou
+    n'importe quel mot de passe ;
+  - Space-Saving : les AUTH_STATS_TOP_K valeurs les plus fréquentes de
+    chaque dimension (compte et erreur maximale).
+
+Toutes les AUTH_STATS_INTERVAL secondes, l'état est enregistré sur disque
+(<dossier>/<honeypot>-<instance>.json, rechargé au redémarrage) et un
+événement "auth_rollup" est écrit dans le log du honeypot : les tableaux de
+bord lisent ces quelques lignes au lieu d'agréger les millions de
+"login_attempt". Le fichier d'état est ouvert par start(), avant la
+sandbox seccomp : les workers FTP (profil ftp_readonly, ni ouverture en
+écriture ni troncature) le réécrivent avec pwrite.
+
+Fusion des états de tous les processus (workers FTP, SSH) :
+    python auth_stats.py show ../logs/auth_stats [--service ftp] [--top 10]
+
+Variables d'environnement :
+    AUTH_STATS_INTERVAL   période des enregistrements / rollups en s (défaut: 60)
+    AUTH_STATS_TOP_K      valeurs suivies par Space-Saving (défaut: 100)
+    AUTH_STATS_HLL_P      précision HyperLogLog, 2^p registres (défaut: 14)
+    AUTH_STATS_CMS_WIDTH  largeur du Count-Min (défaut: 4096)
+    AUTH_STATS_CMS_DEPTH  profondeur du Count-Min (défaut: 4)
+"""
+import argparse
+import atexit
+import base64
+import errno
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+import weakref
+import zlib
+from array import array
+from datetime import datetime
+
+INTERVAL = float(os.environ.get("AUTH_STATS_INTERVAL", "60"))
+TOP_K = int(os.environ.get("AUTH_STATS_TOP_K", "100"))
+HLL_P = int(os.environ.get("AUTH_STATS_HLL_P", "14"))
+CMS_WIDTH = int(os.environ.get("AUTH_STATS_CMS_WIDTH", "4096"))
+CMS_DEPTH = int(os.environ.get("AUTH_STATS_CMS_DEPTH", "4"))
+ROLLUP_TOP = 10             # valeurs par dimension dans un événement auth_rollup
+
+DIMENSIONS = ("ip", "username", "password", "credential")
+FREQUENCIES = ("ip", "password")        # dimensions avec un Count-Min
+_MASK64 = (1 << 64) - 1
+
+
+def key_hash(value):
+    """Hachage 128 bits stable (d'un processus et d'un redémarrage à l'autre)."""
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8", "surrogateescape"),
+                                          digest_size=16).digest(), "little")
+
+
+def _pack(data):
+    return base64.b64encode(zlib.compress(bytes(data))).decode("ascii")
+
+
+def _unpack(text):
+    return zlib.decompress(base64.b64decode(text))
+
+
+# ============================================================
+#   SKETCHES
+# ============================================================
+
+class HyperLogLog:
+    """Cardinalité approchée : 2^p registres d'un octet."""
+
+    _INV_POW = [2.0 ** -i for i in range(65)]
+
+    def __init__(self, p=HLL_P, registers=None):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m) if registers is None else bytearray(registers)
+
+    def add_hash(self, h):
+        h &= _MASK64
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = 64 - self.p - rest.bit_length() + 1
+        index = h >> (64 - self.p)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = self.m
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / sum(map(self._INV_POW.__getitem__, self.registers))
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))        # petites cardinalités
+        return round(estimate)
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+
+class CountMinSketch:
+    """Fréquences estimées par excès : depth lignes de width compteurs."""
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH, counters=None):
+        self.width = width
+        self.depth = depth
+        self.counters = array("Q", bytes(8 * width * depth)) if counters is None else counters
+
+    def _cells(self, h):
+        h1, h2 = h & _MASK64, (h >> 64) | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def add_hash(self, h, n=1):
+        counters = self.counters
+        for cell in self._cells(h):
+            counters[cell] += n
+
+    def estimate(self, value):
+        counters = self.counters
+        return min(counters[cell] for cell in self._cells(key_hash(value)))
+
+    def merge(self, other):
+        self.counters = array("Q", map(sum, zip(self.counters, other.counters)))
+
+
+class SpaceSaving:
+    """Les k valeurs les plus fréquentes : {valeur: [compte, erreur max]}."""
+
+    def __init__(self, k=TOP_K, entries=None):
+        self.k = k
+        self.entries = dict(entries or {})
+        # Tas (compte, valeur) paresseux : un compte peut y être en retard
+        # sur entries, il est corrigé quand il remonte au sommet
+        self._heap = [(entry[0], value) for value, entry in self.entries.items()]
+        heapq.heapify(self._heap)
+
+    def add(self, value, n=1):
+        entry = self.entries.get(value)
+        if entry is not None:
+            entry[0] += n
+        elif len(self.entries) < self.k:
+            self.entries[value] = [n, 0]
+            heapq.heappush(self._heap, (n, value))
+        else:
+            # La valeur la moins comptée cède sa place ; son compte devient
+            # l'erreur maximale de la nouvelle
+            heap = self._heap
+            while heap[0][0] != self.entries[heap[0][1]][0]:
+                _, stale = heap[0]
+                heapq.heapreplace(heap, (self.entries[stale][0], stale))
+            floor = heap[0][0]
+            _, victim = heapq.heapreplace(heap, (floor + n, value))
+            del self.entries[victim]
+            self.entries[value] = [floor + n, floor]
+
+    def top(self, n=None):
+        ranked = sorted(self.entries.items(), key=lambda item: item[1][0], reverse=True)
+        return [(value, count, error) for value, (count, error) in ranked[:n]]
+
+    def merge(self, other):
+        for value, (count, error) in other.entries.items():
+            entry = self.entries.setdefault(value, [0, 0])
+            entry[0] += count
+            entry[1] += error
+        self.entries = {value: entry for value, entry in
+                        sorted(self.entries.items(), key=lambda item: item[1][0], reverse=True)[:self.k]}
+        self._heap = [(entry[0], value) for value, entry in self.entries.items()]
+        heapq.heapify(self._heap)
+
+
+# ============================================================
+#   ÉTAT D'UN HONEYPOT
+# ============================================================
+
+class Sketches:
+    """Un jeu de sketches par dimension, sérialisable en JSON."""
+
+    def __init__(self):
+        self.attempts = 0
+        self.unique = {dim: HyperLogLog() for dim in DIMENSIONS}
+        self.frequency = {dim: CountMinSketch() for dim in FREQUENCIES}
+        self.top = {dim: SpaceSaving() for dim in DIMENSIONS}
+
+    def add(self, ip, username, password):
+        self.attempts += 1
+        credential = None
+        if username is not None and password is not None:
+            credential = f"{username}:{password}"
+        for dim, value in zip(DIMENSIONS, (ip, username, password, credential)):
+            if value is None:
+                continue
+            h = key_hash(value)
+            self.unique[dim].add_hash(h)
+            if dim in self.frequency:
+                self.frequency[dim].add_hash(h)
+            self.top[dim].add(value)
+
+    def merge(self, other):
+        self.attempts += other.attempts
+        for dim in DIMENSIONS:
+            self.unique[dim].merge(other.unique[dim])
+            self.top[dim].merge(other.top[dim])
+        for dim in FREQUENCIES:
+            self.frequency[dim].merge(other.frequency[dim])
+
+    def summary(self, top=ROLLUP_TOP):
+        return {
+            "attempts_total": self.attempts,
+            "unique": {dim: self.unique[dim].count() for dim in DIMENSIONS},
+            "top": {dim: [[value, count] for value, count, _error in self.top[dim].top(top)]
+                    for dim in DIMENSIONS},
+        }
+
+    def to_dict(self):
+        return {
+            "version": 1,
+            "attempts": self.attempts,
+            "hll_p": HLL_P, "cms_width": CMS_WIDTH, "cms_depth": CMS_DEPTH, "top_k": TOP_K,
+            "hll": {dim: _pack(s.registers) for dim, s in self.unique.items()},
+            "cms": {dim: _pack(s.counters.tobytes()) for dim, s in self.frequency.items()},
+            "top": {dim: s.top() for dim, s in self.top.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if (data.get("version"), data.get("hll_p"), data.get("cms_width"), data.get("cms_depth")) != \
+                (1, HLL_P, CMS_WIDTH, CMS_DEPTH):
+            raise ValueError("paramètres des sketches différents")
+        sketches = cls()
+        sketches.attempts = data["attempts"]
+        for dim in DIMENSIONS:
+            sketches.unique[dim] = HyperLogLog(HLL_P, _unpack(data["hll"][dim]))
+            sketches.top[dim] = SpaceSaving(TOP_K, {v: [c, e] for v, c, e in data["top"][dim]})
+        for dim in FREQUENCIES:
+            counters = array("Q")
+            counters.frombytes(_unpack(data["cms"][dim]))
+            sketches.frequency[dim] = CountMinSketch(CMS_WIDTH, CMS_DEPTH, counters)
+        return sketches
+
+
+_instances = weakref.WeakSet()
+
+
+class AuthStats:
+    """
+    Sketches d'un processus honeypot. record() est appelé à chaque
+    tentative (depuis n'importe quel thread) ; un thread enregistre l'état
+    et écrit un événement auth_rollup dans `sink` toutes les `interval` s.
+    """
+
+    def __init__(self, honeypot_type, sink, directory, interval=INTERVAL):
+        self.honeypot_type = honeypot_type
+        self.sink = sink
+        self.directory = directory
+        self.interval = interval
+        self.instance = None
+        self.sketches = Sketches()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._fd = None
+        self._written = 0           # taille du dernier état écrit (voir _save)
+        self._rolled_up = 0         # tentatives au dernier rollup
+        _instances.add(self)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"{self.honeypot_type}-{self.instance}.json")
+
+    def start(self, instance="0"):
+        """Recharge l'état enregistré, ouvre le fichier d'état (avant toute sandbox), lance le thread."""
+        self.instance = instance
+        _register_atexit()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            with os.fdopen(os.dup(self._fd), "rb") as f:
+                data = f.read()
+            self._written = len(data)
+            if data.strip():
+                self.sketches = Sketches.from_dict(json.loads(data))
+                self._rolled_up = self.sketches.attempts
+        except OSError as e:
+            logging.warning("auth_stats : état non enregistré (%s)", e)
+            self._fd = None
+        except (ValueError, KeyError) as e:
+            logging.warning("auth_stats : état %s ignoré (%s)", self.path, e)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="auth-stats", daemon=True)
+            self._thread.start()
+        return self
+
+    def record(self, ip, username, password):
+        with self._lock:
+            self.sketches.add(ip, username, password)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.rollup()
+
+    def rollup(self):
+        """Enregistre l'état et écrit un événement auth_rollup s'il y a eu des tentatives."""
+        with self._lock:
+            attempts = self.sketches.attempts - self._rolled_up
+            if not attempts:
+                return
+            self._rolled_up = self.sketches.attempts
+            summary = self.sketches.summary()
+            state = json.dumps(self.sketches.to_dict()).encode("utf-8") if self._fd is not None else None
+        event = {
+            "timestamp": datetime.now().astimezone().isoformat(),
+            "honeypot_type": self.honeypot_type,
+            "event_type": "auth_rollup",
+            "instance": self.instance,
+            "window_seconds": self.interval,
+            "attempts": attempts,
+        }
+        event.update(summary)
+        self.sink.emit(event)
+        if state is not None:
+            self._save(state)
+
+    def _save(self, state):
+        # Réécriture en place : la troncature est interdite dans la sandbox
+        # FTP, un état plus court est donc complété par des espaces (ignorés
+        # par le décodeur JSON).
+        if len(state) < self._written:
+            state += b" " * (self._written - len(state))
+        try:
+            os.pwrite(self._fd, state, 0)
+            self._written = len(state)
+        except OSError as e:
+            if e.errno not in (errno.EPERM, errno.EACCES, errno.EROFS, errno.ENOSPC):
+                raise
+            logging.warning("auth_stats : enregistrement désactivé (%s)", e)
+            self._fd = None
+
+    def close(self):
+        """Dernier rollup (appelé à l'arrêt, avant la fermeture des sinks)."""
+        self._stop.set()
+        if self.instance is not None:
+            self.rollup()
+
+    def _after_fork_in_child(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+
+def close_all():
+    for stats in list(_instances):
+        stats.close()
+
+
+def _reset_after_fork():
+    for stats in list(_instances):
+        stats._after_fork_in_child()
+
+
+_atexit_registered = False
+
+
+def _register_atexit():
+    # Enregistré au premier start(), donc après event_sink (dont les sinks
+    # sont créés à l'import des honeypots) : atexit exécute les handlers en
+    # ordre inverse, le dernier rollup part avant la fermeture des sinks.
+    global _atexit_registered
+    if not _atexit_registered:
+        _atexit_registered = True
+        atexit.register(close_all)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# ============================================================
+#   LECTURE / FUSION DES ÉTATS
+# ============================================================
+
+def load_merged(directory, service=None):
+    """(Sketches fusionnés, fichiers lus) de tous les états du dossier."""
+    merged = Sketches()
+    used = []
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return merged, used
+    for name in names:
+        if not name.endswith(".json") or (service and not name.startswith(service + "-")):
+            continue
+        try:
+            with open(os.path.join(directory, name), "rb") as f:
+                merged.merge(Sketches.from_dict(json.loads(f.read())))
+            used.append(name)
+        except (ValueError, KeyError) as e:
+            logging.warning("%s ignoré : %s", name, e)
+    return merged, used
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Statistiques d'authentification des honeypots")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_show = sub.add_parser("show", help="fusionne et affiche les états enregistrés")
+    p_show.add_argument("directory")
+    p_show.add_argument("--service", help="ftp, ssh_real...")
+    p_show.add_argument("--top", type=int, default=10)
+    p_count = sub.add_parser("count", help="fréquence estimée d'une IP ou d'un mot de passe")
+    p_count.add_argument("directory")
+    p_count.add_argument("dimension", choices=FREQUENCIES)
+    p_count.add_argument("value")
+    p_count.add_argument("--service")
+    args = parser.parse_args()
+
+    sketches, used = load_merged(args.directory, args.service)
+    if args.cmd == "count":
+        print(sketches.frequency[args.dimension].estimate(args.value))
+        return
+    print(f"états : {', '.join(used) or '-'}")
+    print(f"tentatives : {sketches.attempts}")
+    for dim in DIMENSIONS:
+        print(f"{dim} distincts : ~{sketches.unique[dim].count()}")
+    for dim in DIMENSIONS:
+        print(f"top {dim} :")
+        for value, count, error in sketches.top[dim].top(args.top):
+            print(f"  {count:10} (±{error})  {value}")
+
+
+if __name__ == "__main__":
+    main()
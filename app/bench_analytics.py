@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Requêtes de log_analytics.py comparées à un parcours complet des logs.
+
+Un dossier temporaire reçoit --events événements répartis entre les logs
+SSH, FTP (USER/PASS) et HTTP, au format des honeypots, puis on mesure :
+
+  - avant : json.loads de chaque ligne + Counter (ce que ferait un script
+            sans index), pour chaque requête,
+  - après : construction du cache en colonnes (une fois), requêtes sur le
+            cache, puis mise à jour après --append nouveaux événements.
+
+Usage : python bench_analytics.py [--events 1000000] [--append 10000]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import log_analytics
+import log_shipper
+
+PASSWORDS = ["123456", "password", "admin", "root", "qwerty", "raspberry", "ubnt", "1234"]
+USERS = ["root", "admin", "pi", "ubuntu", "test", "oracle", "user"]
+
+
+def write_logs(log_dir, count, start, rng):
+    files = {name: open(os.path.join(log_dir, name), "a") for name, _, _ in log_shipper.SOURCES[:3]}
+    for i in range(count):
+        ts = start + timedelta(seconds=i * 0.05)
+        ip = f"10.{rng.randint(0, 3)}.{rng.randint(0, 255)}.{int(rng.paretovariate(1.2)) % 256}"
+        user, password = rng.choice(USERS), rng.choice(PASSWORDS) + str(int(rng.paretovariate(2)) % 50)
+        kind = i % 4
+        if kind < 2:
+            files["honeypot_ssh.log"].write(json.dumps({
+                "timestamp": ts.strftime("%Y-%m-%dT%H:%M:%S+0000"), "honeypot_type": "ssh_real",
+                "event_type": "login_attempt", "source_ip": ip, "username": user, "password": password,
+                "command": None, "message": "", "session_id": f"s{i}", "extra": {}}) + "\n")
+        elif kind == 2:
+            session = f"f{i}"
+            for command in (f"USER {user}", f"PASS {password}"):
+                files["honeypot_ftp.log"].write(json.dumps({
+                    "timestamp": ts.isoformat(), "honeypot_type": "ftp", "event_type": "command",
+                    "source_ip": ip, "session_id": session, "command": command, "extra": {}}) + "\n")
+        else:
+            files["ecom_honeypot.log"].write(json.dumps({
+                "@timestamp": ts.isoformat() + "Z", "honeypot": "ecommerce", "event_type": "login_attempt",
+                "src_ip": ip, "user_agent": "curl/8.0", "method": "POST", "path": "/login", "query": {},
+                "form": {"username": user, "password": password}, "details": {}}) + "\n")
+    for f in files.values():
+        f.close()
+
+
+def scan_top_ips(log_dir):
+    # Parcours naïf : chaque requête relit et décode tous les logs
+    counter = Counter()
+    for name, _, _ in log_shipper.SOURCES[:3]:
+        with open(os.path.join(log_dir, name), "rb") as f:
+            for line in f:
+                doc = json.loads(line)
+                ip = doc.get("source_ip") or doc.get("src_ip")
+                if ip:
+                    counter[ip] += 1
+    return counter.most_common(10)
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache en colonnes vs parcours complet des logs")
+    parser.add_argument("--events", type=int, default=1000000)
+    parser.add_argument("--append", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as log_dir:
+        cache = os.path.join(log_dir, ".analytics")
+        start = datetime(2024, 5, 1)
+        write_logs(log_dir, args.events, start, rng)
+        size = sum(os.path.getsize(os.path.join(log_dir, n)) for n, _, _ in log_shipper.SOURCES[:3])
+        print(f"{args.events} événements, {size / 2**20:.0f} Mio de logs")
+
+        naive, elapsed = timed(scan_top_ips, log_dir)
+        print(f"avant : top IP par parcours complet      {elapsed:8.2f} s")
+
+        table, elapsed = timed(log_analytics.open_table, log_dir, cache)
+        print(f"après : construction du cache            {elapsed:8.2f} s  ({len(table)} lignes)")
+        table, elapsed = timed(log_analytics.open_table, log_dir, cache)
+        print(f"        ouverture (rien de nouveau)      {elapsed:8.3f} s")
+        for label, fn in (("top IP", lambda: table.top("ip", 10)),
+                          ("top user:password", lambda: table.top("cred", 10)),
+                          ("événements / minute / service", lambda: table.timeline(60)),
+                          ("top IP sur une heure", lambda: table.top(
+                              "ip", 10, table.mask(start.timestamp(), start.timestamp() + 3600)))):
+            result, elapsed = timed(fn)
+            print(f"        {label:32} {elapsed * 1000:8.1f} ms")
+        top, _ = timed(table.top, "ip", 10)
+        assert [count for _, count in top] == [count for _, count in naive], (top, naive)
+
+        write_logs(log_dir, args.append, start + timedelta(days=30), rng)
+        table, elapsed = timed(log_analytics.open_table, log_dir, cache)
+        print(f"        mise à jour (+{args.append} événements)  {elapsed:8.3f} s  ({len(table)} lignes)")
+        cache_size = sum(os.path.getsize(os.path.join(root, f))
+                         for root, _, names in os.walk(cache) for f in names)
+        print(f"taille du cache : {cache_size / 2**20:.0f} Mio")
+
+
+if __name__ == "__main__":
+    main()
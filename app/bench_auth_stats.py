@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Précision et coût des sketches d'auth_stats.py sur un flux de tentatives
+ressemblant à celui des bots (mots de passe et IP en loi de Zipf).
+
+  - coût de record() par tentative (histogramme, comme bench_log_event.py),
+  - cardinalités HyperLogLog / valeurs exactes,
+  - top Space-Saving / top exact, fréquences Count-Min / exactes,
+  - --workers états enregistrés puis fusionnés (comme auth_stats.py show),
+  - taille de l'état sur disque et d'un événement auth_rollup.
+
+Usage : python bench_auth_stats.py [-n 500000] [--workers 4]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+import auth_stats
+from bench_log_event import histogram
+
+
+class ListSink:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+
+def attempts(n, rng):
+    passwords = [f"pw{i}" for i in range(200000)]
+    users = ["root", "admin", "pi", "ubuntu", "test", "oracle", "user", "git", "postgres", "ftp"]
+    ips = [f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+           for _ in range(100000)]
+    for _ in range(n):
+        # Quelques scanners très actifs, une longue traîne d'IP vues une fois
+        ip = ips[min(int(rng.paretovariate(0.9)) - 1, len(ips) - 1)] \
+            if rng.random() < 0.8 else f"10.{rng.getrandbits(8)}.{rng.getrandbits(8)}.{rng.getrandbits(8)}"
+        password = passwords[min(int(rng.paretovariate(1.05)) - 1, len(passwords) - 1)] \
+            if rng.random() < 0.7 else f"rand{rng.getrandbits(40):x}"
+        yield ip, users[int(rng.paretovariate(1.5)) % len(users)], password
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Précision et coût des sketches d'authentification")
+    parser.add_argument("-n", type=int, default=500000, help="tentatives")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    stream = list(attempts(args.n, rng))
+    exact = {dim: Counter() for dim in auth_stats.DIMENSIONS}
+    for ip, user, password in stream:
+        for dim, value in zip(auth_stats.DIMENSIONS, (ip, user, password, f"{user}:{password}")):
+            exact[dim][value] += 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        sinks = []
+        workers = []
+        for w in range(args.workers):
+            sink = ListSink()
+            sinks.append(sink)
+            workers.append(auth_stats.AuthStats("ftp", sink, directory, interval=3600).start(str(w)))
+        samples = []
+        for i, (ip, user, password) in enumerate(stream):
+            stats = workers[i % args.workers]
+            t0 = time.perf_counter()
+            stats.record(ip, user, password)
+            samples.append(time.perf_counter() - t0)
+        print(f"record() ({args.n} tentatives, {args.workers} workers) :")
+        print(histogram(samples))
+
+        t0 = time.perf_counter()
+        for stats in workers:
+            stats.close()
+        print(f"rollup + enregistrement des {args.workers} états : {(time.perf_counter() - t0) * 1000:.0f} ms")
+        state_size = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+        rollup = json.dumps(sinks[0].events[-1])
+        merged, used = auth_stats.load_merged(directory, "ftp")
+
+    print(f"état sur disque : {state_size / args.workers / 1024:.0f} Kio par worker, "
+          f"rollup : {len(rollup)} octets")
+    print(f"tentatives fusionnées : {merged.attempts} / {args.n}")
+    for dim in auth_stats.DIMENSIONS:
+        estimate, true = merged.unique[dim].count(), len(exact[dim])
+        print(f"  {dim:10} distincts ~{estimate:9} / {true:9}  ({(estimate - true) / true:+.2%})")
+    for dim in ("password", "credential", "ip"):
+        top, true_top = merged.top[dim].top(10), exact[dim].most_common(10)
+        found = len({v for v, _, _ in top} & {v for v, _ in true_top})
+        worst = max(abs(c - exact[dim][v]) / exact[dim][v] for v, c, _ in top)
+        print(f"  top 10 {dim:10} : {found}/10 exacts, écart max des comptes {worst:.2%}")
+    for dim in auth_stats.FREQUENCIES:
+        cms = merged.frequency[dim]
+        values = [v for v, _ in exact[dim].most_common(1000)]
+        over = max(cms.estimate(v) - exact[dim][v] for v in values)
+        print(f"  Count-Min {dim:8} : excès max {over} sur les 1000 valeurs les plus fréquentes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Requêtes/s du honeypot e-commerce (app.py) sur les pages les plus visitées.
+
+L'application est importée dans un dossier temporaire (copie de
+database.db, log JSON jetable) et interrogée par le client de test Flask
+depuis plusieurs threads : on mesure le coût des vues (SQL + rendu +
+log_event) sans le serveur HTTP.
+
+Usage : python bench_http.py [-n 2000] [--threads 8] [--products 1000]
+            [--routes /,/search?q=Pro,/product?id=1]
+"""
+import argparse
+import importlib
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ROUTES = "/,/search?q=Pro,/product?id=1"
+
+
+def seed_products(path, n):
+    conn = sqlite3.connect(path)
+    rng = random.Random(42)
+    words = ["Laptop", "Phone", "Mouse", "Pro", "Max", "Mini", "Ultra", "Wireless", "Gamer", "Office"]
+    conn.executemany(
+        "INSERT INTO products (name, category, price, description) VALUES (?,?,?,?)",
+        [(" ".join(rng.sample(words, 2)) + f" {i}", rng.choice(["Laptop", "Phone", "Accessory"]),
+          round(rng.uniform(5, 2000), 2), "Produit leurre") for i in range(n)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def load_app(workdir, products):
+    shutil.copy(os.path.join(BASE_DIR, "database.db"), workdir)
+    os.chdir(workdir)
+    os.environ["ECOM_DB_PATH"] = os.path.join(workdir, "database.db")
+    sys.path.insert(0, BASE_DIR)
+    seed_products(os.environ["ECOM_DB_PATH"], products)
+    module = importlib.import_module("app")
+    # Le log JSON du bench ne doit pas polluer logs/ecom_honeypot.log
+    from event_sink import get_sink
+    module.LOG_SINK = get_sink(os.path.join(workdir, "bench.log"), serializer=module.serialize_event)
+    return module
+
+
+def run_route(flask_app, route, n, threads):
+    latencies = []
+    lock = threading.Lock()
+    per_thread = n // threads
+
+    def worker():
+        client = flask_app.test_client()
+        local = []
+        for _ in range(per_thread):
+            t0 = time.perf_counter()
+            resp = client.get(route)
+            local.append(time.perf_counter() - t0)
+            if resp.status_code != 200:
+                raise RuntimeError(f"{route}: HTTP {resp.status_code}")
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "route": route,
+        "req_per_s": len(latencies) / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit des pages du honeypot e-commerce")
+    parser.add_argument("-n", type=int, default=2000, help="requêtes par route")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--products", type=int, default=1000, help="produits leurres ajoutés")
+    parser.add_argument("--routes", default=DEFAULT_ROUTES)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        module = load_app(workdir, args.products)
+        for route in args.routes.split(","):
+            run_route(module.app, route, args.threads * 10, args.threads)      # échauffement
+            r = run_route(module.app, route, args.n, args.threads)
+            print(f"{r['route']:24} {r['req_per_s']:8.0f} req/s  "
+                  f"p50 {r['p50_ms']:6.2f} ms  p99 {r['p99_ms']:6.2f} ms", flush=True)
+
+
+if __name__ == "__main__":
+    main()
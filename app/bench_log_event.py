@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Coût de log_event() vu du thread qui sert la requête (honeypot e-commerce).
+
+  avant : dictionnaire complet (args/form to_dict, horodatage) puis
+          json.dumps(ensure_ascii=False) dans la requête,
+  après : capture de quelques références, mise en forme et JSON (orjson
+          si installé) dans le thread d'écriture d'event_sink.
+
+Affiche l'histogramme des latences de log_event() seul, puis de requêtes
+complètes (client de test Flask) dans chaque mode.
+
+Usage : python bench_log_event.py [-n 20000] [--requests 2000] [--route "/search?q=Pro"]
+"""
+import argparse
+import json
+import tempfile
+import time
+from datetime import datetime
+
+from flask import request
+
+import bench_http
+import event_sink
+
+# Bornes des classes de l'histogramme, en µs
+BUCKETS = [2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+def legacy_log_event(module):
+    def log_event(event_type, details=None):
+        entry = {
+            '@timestamp': datetime.utcnow().isoformat() + 'Z',
+            'honeypot': 'ecommerce',
+            'event_type': event_type,
+            'src_ip': request.remote_addr,
+            'user_agent': request.headers.get('User-Agent', ''),
+            'method': request.method,
+            'path': request.path,
+            'query': request.args.to_dict(),
+            'form': request.form.to_dict() if request.form else {},
+            'details': details or {}
+        }
+        module.LOG_SINK.emit(json.dumps(entry, ensure_ascii=False))
+    return log_event
+
+
+def histogram(samples):
+    samples = sorted(samples)
+    counts = [0] * (len(BUCKETS) + 1)
+    for s in samples:
+        us = s * 1e6
+        i = 0
+        while i < len(BUCKETS) and us > BUCKETS[i]:
+            i += 1
+        counts[i] += 1
+    pct = lambda p: samples[min(len(samples) - 1, int(len(samples) * p))] * 1e6
+    lines = [f"    p50 {pct(0.5):8.1f} µs  p90 {pct(0.9):8.1f} µs  "
+             f"p99 {pct(0.99):8.1f} µs  max {samples[-1] * 1e6:8.1f} µs"]
+    lower = 0
+    for bound, count in zip(BUCKETS + [None], counts):
+        if not count:
+            lower = bound
+            continue
+        label = f"{lower}-{bound}" if bound else f">{lower}"
+        bar = "#" * max(1, round(50 * count / len(samples)))
+        lines.append(f"    {label:>10} µs {count:7} {bar}")
+        lower = bound
+    return "\n".join(lines)
+
+
+def time_log_event(module, log_event, route, n):
+    samples = []
+    with module.app.test_request_context(route, method="POST", data={"username": "admin", "password": "é" * 20},
+                                         headers={"User-Agent": "Mozilla/5.0 (bench)"}):
+        for _ in range(n):
+            t0 = time.perf_counter()
+            log_event("search", {"query": "Pro"})
+            samples.append(time.perf_counter() - t0)
+            if len(samples) % 2000 == 0:
+                module.LOG_SINK.flush()         # la file ne doit pas déborder
+    module.LOG_SINK.flush()
+    return samples
+
+
+def time_requests(module, route, n):
+    client = module.app.test_client()
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        client.get(route)
+        samples.append(time.perf_counter() - t0)
+    module.LOG_SINK.flush()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence de log_event par requête")
+    parser.add_argument("-n", type=int, default=20000, help="appels de log_event par mode")
+    parser.add_argument("--requests", type=int, default=2000, help="requêtes complètes par mode")
+    parser.add_argument("--route", default="/product?id=1&utm_source=bench")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        module = bench_http.load_app(workdir, 100)
+        modes = [("avant", legacy_log_event(module)), ("après", module.log_event)]
+        print(f"JSON : {'orjson' if event_sink.orjson else 'json'}")
+        for name, fn in modes:
+            module.log_event = fn
+            time_log_event(module, fn, args.route, 1000)            # échauffement
+            print(f"log_event() seul, {name} :")
+            print(histogram(time_log_event(module, fn, args.route, args.n)), flush=True)
+        for name, fn in modes:
+            module.log_event = fn
+            time_requests(module, args.route, 200)
+            print(f"GET {args.route}, {name} :")
+            print(histogram(time_requests(module, args.route, args.requests)), flush=True)
+        print(f"événements non sérialisables : {module.LOG_SINK.serialize_errors}, "
+              f"abandonnés : {module.LOG_SINK.dropped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Pages du honeypot e-commerce sur une base volumineuse (après des mois de
+commentaires et de commandes de bots).
+
+La base temporaire est remplie de --products produits, --comments
+commentaires (la moitié sur le produit 1) et --orders commandes (un quart
+pour le compte "bench"), puis chaque route est mesurée :
+
+  - avant : requêtes sans index ni limite (toutes les lignes rendues),
+  - après : index des migrations (db.MIGRATIONS) et pagination keyset.
+
+Le cache des pages (response_cache.py) est désactivé pour mesurer le rendu.
+
+Usage : python bench_pages.py [--products 20000] [--comments 500000]
+            [--orders 200000] [-n 50]
+"""
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+
+import bench_http
+
+
+def seed(path, products, comments, orders):
+    conn = sqlite3.connect(path)
+    rng = random.Random(42)
+    conn.executemany(
+        "INSERT INTO comments (product_id, username, comment) VALUES (?,?,?)",
+        ((1 if i % 2 else rng.randint(2, products), f"bot{i % 997}", "Super produit !!! http://spam.example")
+         for i in range(comments)),
+    )
+    conn.executemany(
+        "INSERT INTO orders (username, products, total, date) VALUES (?,?,?,?)",
+        (("bench" if i % 4 == 0 else f"user{i % 5003}", "1,2,3", 2249.97, "2024-01-01T00:00:00")
+         for i in range(orders)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def legacy_queries(db):
+    # Requêtes d'origine : toutes les lignes, pas de page suivante
+    return {
+        "get_catalog_page": lambda after=None, limit=None: (db.query_all("SELECT * FROM products"), None),
+        "get_comments": lambda pid, after=None, limit=None: (
+            db.query_all("SELECT * FROM comments WHERE product_id=?", (pid,)), None),
+        "get_orders": lambda username, after=None, limit=None: (
+            db.query_all("SELECT * FROM orders WHERE username=?", (username,)), None),
+    }
+
+
+def time_route(client, route, n):
+    client.get(route)                       # échauffement (cartes de l'accueil, pool)
+    samples = []
+    size = 0
+    for _ in range(n):
+        t0 = time.perf_counter()
+        resp = client.get(route)
+        samples.append(time.perf_counter() - t0)
+        if resp.status_code != 200:
+            raise RuntimeError(f"{route}: HTTP {resp.status_code}")
+        size = len(resp.data)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[min(n - 1, int(n * 0.99))] * 1000, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pages du honeypot e-commerce sur une grosse base")
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--comments", type=int, default=500000)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("-n", type=int, default=50, help="requêtes par route")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        module = bench_http.load_app(workdir, args.products)
+        db = module.db
+        module.RESPONSE_CACHE.ttl = 0
+        seed(db.DB_PATH, args.products, args.comments, args.orders)
+        conn = db.connect()
+        deep = conn.execute("SELECT max(id) FROM comments WHERE product_id=1").fetchone()[0] - db.PAGE_SIZE * 2
+        routes = ["/", "/product?id=1", "/product?id=2", f"/product?id=1&after={deep}", "/profile"]
+
+        client = module.app.test_client()
+        with client.session_transaction() as session:
+            session["username"] = "bench"
+        paginated = {name: getattr(db, name) for name in legacy_queries(db)}
+
+        for mode in ("avant", "après"):
+            if mode == "avant":
+                for _version, _description, statements in db.MIGRATIONS:
+                    for sql in statements:
+                        index = sql.split(" ON ")[0].split()[-1]
+                        conn.execute(f"DROP INDEX IF EXISTS {index}")
+                conn.execute("PRAGMA user_version = 0")
+                conn.commit()
+                queries = legacy_queries(db)
+            else:
+                conn.execute("BEGIN IMMEDIATE")
+                applied = db.migrate(conn)
+                conn.commit()
+                print(f"migrations appliquées : {applied}")
+                queries = paginated
+            for name, fn in queries.items():
+                setattr(db, name, fn)
+            module._home_cards = (None, "", None)
+            print(f"{mode} :")
+            for route in routes:
+                p50, p99, size = time_route(client, route, args.n)
+                print(f"  {route:32} p50 {p50:9.2f} ms  p99 {p99:9.2f} ms  {size / 1024:9.0f} Kio", flush=True)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
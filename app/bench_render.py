@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Coût de rendu de la page d'accueil du honeypot e-commerce, par requête.
+
+Compare, dans un contexte de requête Flask et sans SQL ni log :
+
+  - avant    : cartes en f-string += puis render_template_string(BASE),
+               le gabarit étant recompilé à chaque appel,
+  - macro    : cartes via la macro compilée + templates/base.html,
+  - cache    : cartes en cache (version du catalogue inchangée).
+
+Usage : python bench_render.py [--products 10,1000] [-n 200]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from flask import render_template, render_template_string
+
+import bench_http
+
+
+def cards_fstring(products):
+    cards = ""
+    for p in products:
+        cards += f'''
+        <div class="col-md-4 mb-4">
+        <div class="card">
+        <div class="card-body">
+        <h5 class="card-title">{p[1]}</h5>
+        <p class="card-text">{p[4]}</p>
+        <p class="h4 text-success">{p[3]} €</p>
+        <a href="/product?id={p[0]}" class="btn btn-primary">Voir</a>
+        <a href="/cart?add={p[0]}" class="btn btn-success">Ajouter</a>
+        </div></div></div>
+        '''
+    return cards
+
+
+def timed(fn, n):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coût de rendu de la page d'accueil")
+    parser.add_argument("--products", default="10,1000", help="tailles de catalogue")
+    parser.add_argument("-n", type=int, default=200, help="rendus par mesure")
+    args = parser.parse_args()
+
+    sizes = [int(x) for x in args.products.split(",")]
+    with tempfile.TemporaryDirectory() as workdir:
+        module = bench_http.load_app(workdir, 0)
+        with open(os.path.join(bench_http.BASE_DIR, "templates", "base.html")) as f:
+            base_source = f.read()
+        with module.app.test_request_context("/"):
+            all_products = module.db.query_all("SELECT * FROM products")
+            for size in sizes:
+                products = (all_products * (size // len(all_products) + 1))[:size]
+
+                def before():
+                    content = f'<h1>Bienvenue sur E-Shop Pro</h1><div class="row">{cards_fstring(products)}</div>'
+                    return render_template_string(base_source, content=content)
+
+                def macro():
+                    content = f'<h1>Bienvenue sur E-Shop Pro</h1><div class="row">{module.render_cards(products)}</div>'
+                    return render_template("base.html", content=content)
+
+                module._home_cards = (module.db.current_catalog_version(), module.render_cards(products), None)
+
+                def cached():
+                    content = f'<h1>Bienvenue sur E-Shop Pro</h1><div class="row">{module.home_cards()[0]}</div>'
+                    return render_template("base.html", content=content)
+
+                print(f"{size:6} produits : avant {timed(before, args.n):9.0f} µs  "
+                      f"macro {timed(macro, args.n):9.0f} µs  "
+                      f"cache {timed(cached, args.n):7.0f} µs", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark du coût de mise en place par connexion du sandbox FTP.
+
+  avant : SyscallFilter construit + load() à chaque client (filtres empilés)
+  après : filtre chargé une fois par processus, coût par connexion = 0
+
+Mesure aussi la latence connexion -> bannière 220 d'un serveur local.
+
+Usage : python bench_sandbox.py [-n 200] [--port 21299]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+
+import seccomp_config
+
+
+def bench_filter_per_connection(n):
+    """Coût de build_filter()+load() répété n fois (dans un fils jetable)."""
+    if not seccomp_config.seccomp:
+        return None
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        samples = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            seccomp_config.build_filter("ftp_readonly").load()
+            samples.append(time.perf_counter() - t0)
+        os.write(w, json.dumps(samples).encode())
+        os._exit(0)
+    os.close(w)
+    data = b""
+    while chunk := os.read(r, 65536):
+        data += chunk
+    os.close(r)
+    os.waitpid(pid, 0)
+    return json.loads(data) if data else None
+
+
+def bench_greeting(port, n):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        s = socket.create_connection(("127.0.0.1", port))
+        s.recv(128)
+        samples.append(time.perf_counter() - t0)
+        s.sendall(b"QUIT\r\n")
+        s.close()
+    return samples
+
+
+def fmt(samples):
+    if not samples:
+        return "n/a (seccomp indisponible)"
+    return (f"médiane {statistics.median(samples) * 1e6:8.1f} µs   "
+            f"p95 {sorted(samples)[int(len(samples) * 0.95) - 1] * 1e6:8.1f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=200)
+    parser.add_argument("--port", type=int, default=21299)
+    args = parser.parse_args()
+
+    import ftp_honeypot_advanced as ftp
+    ftp.PORT = args.port
+    # Un worker servi dans ce processus (sans le parent pré-fork de start_server)
+    threading.Thread(target=ftp.run_worker, args=(ftp.make_listen_socket(),), daemon=True).start()
+    time.sleep(0.5)
+
+    filt = bench_filter_per_connection(args.n)
+    greet = bench_greeting(args.port, args.n)
+
+    print()
+    print(f"Sandbox par connexion (avant)  : {fmt(filt)}")
+    print("Sandbox par connexion (après)  : 0 (chargé une fois au démarrage du worker)")
+    print(f"Connexion -> 220 (après)       : {fmt(greet)}")
+    if filt:
+        est = [g + f for g, f in zip(greet, filt)]
+        print(f"Connexion -> 220 (avant, est.) : {fmt(est)}")
+
+
+if __name__ == "__main__":
+    main()
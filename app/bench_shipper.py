@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+log_shipper.py face à un faux Elasticsearch local (endpoint _bulk seul).
+
+Le faux serveur répond comme Elasticsearch (items/status/errors), range
+les documents par _index et _id, et peut injecter des pannes :
+  --fail-rate   part des documents refusés en 429 (es_rejected_execution)
+  --drop-rate   part des requêtes dont la connexion est coupée sans réponse
+
+Déroulé, dans un dossier temporaire : --events événements écrits par
+event_sink (avec rotation en segments tous les --rotate-bytes) pendant que
+le shipper les suit, arrêt du shipper au bout de --stop-after s, puis
+redémarrage depuis les points de reprise une fois l'écriture finie (débit
+mesuré sur ce 2e passage) ; chaque événement doit avoir été indexé
+exactement une fois dans le bon index.
+
+Usage : python bench_shipper.py [--events 200000] [--fail-rate 0.01] [--drop-rate 0.02]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import event_sink
+import log_rotation
+import log_shipper
+
+
+class FakeElasticsearch(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fail_rate=0.0, drop_rate=0.0):
+        super().__init__(("127.0.0.1", 0), BulkHandler)
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self.rng = random.Random(7)
+        self.lock = threading.Lock()
+        self.docs = {}              # (index, _id) -> document
+        self.writes = 0
+        self.requests = 0
+        self.connections = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class BulkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            drop = server.rng.random() < server.drop_rate
+            lines = body.splitlines()
+            items = []
+            for action, source in zip(lines[0::2], lines[1::2]):
+                meta = json.loads(action)["index"]
+                if server.rng.random() < server.fail_rate:
+                    items.append({"index": {"_index": meta["_index"], "status": 429,
+                                            "error": {"type": "es_rejected_execution_exception"}}})
+                    continue
+                server.docs[(meta["_index"], meta["_id"])] = json.loads(source)
+                server.writes += 1
+                items.append({"index": {"_index": meta["_index"], "_id": meta["_id"], "status": 201}})
+        if drop:
+            # Documents écrits mais réponse perdue : le shipper renverra le lot
+            self.close_connection = True
+            self.connection.close()
+            return
+        data = json.dumps({"took": 1, "errors": any(i["index"]["status"] != 201 for i in items),
+                           "items": items}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def write_events(path, count, rotate_bytes):
+    sink = event_sink.EventSink(path, rotator=log_rotation.Rotator(path, max_bytes=rotate_bytes, max_age=0))
+    for i in range(count):
+        sink.emit(json.dumps({"timestamp": datetime.now().isoformat(), "event_type": "login_attempt",
+                              "seq": i}))
+        if i % 5000 == 0:
+            sink.flush()
+    sink.close()
+
+
+def run_shipper(url, log_dir, state, stop_after=None):
+    shipper = log_shipper.Shipper(log_shipper.BulkClient(url), log_dir, state)
+    if stop_after is not None:
+        # Suivi en continu, arrêté comme par SIGTERM pendant l'écriture
+        threading.Timer(stop_after, lambda: setattr(shipper, "stopping", True)).start()
+    shipper.run(once=stop_after is None)
+    return shipper
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit et reprise du shipper vers un faux Elasticsearch")
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--rotate-bytes", type=int, default=4 * 1024 * 1024)
+    parser.add_argument("--fail-rate", type=float, default=0.01)
+    parser.add_argument("--drop-rate", type=float, default=0.02)
+    parser.add_argument("--stop-after", type=float, default=1.0, help="arrêt du 1er passage (s)")
+    args = parser.parse_args()
+
+    log_shipper.RETRY_BASE = 0.01
+    log_shipper.POLL_INTERVAL = 0.05
+    es = FakeElasticsearch(args.fail_rate, args.drop_rate)
+    threading.Thread(target=es.serve_forever, daemon=True).start()
+    with tempfile.TemporaryDirectory() as log_dir:
+        path = os.path.join(log_dir, "honeypot_ssh.log")
+        state = os.path.join(log_dir, ".shipper_state.json")
+        writer = threading.Thread(target=write_events, args=(path, args.events, args.rotate_bytes))
+        writer.start()
+        first = run_shipper(es.url, log_dir, state, stop_after=args.stop_after)
+        print(f"1er passage (arrêté après {args.stop_after} s) : {first.shipped} documents, "
+              f"reprise {first.sources[1].checkpoint}")
+        writer.join()
+        t0 = time.perf_counter()
+        second = run_shipper(es.url, log_dir, state)
+        elapsed = time.perf_counter() - t0
+        segments = log_rotation.segment_paths(path)
+
+    seqs = sorted(doc["seq"] for doc in es.docs.values())
+    today = datetime.now(timezone.utc).strftime("%Y.%m.%d")
+    indices = {index for index, _ in es.docs}
+    print(f"segments : {len(segments)}, requêtes _bulk : {es.requests}, connexions : {es.connections}")
+    print(f"écritures : {es.writes} (renvois compris), documents distincts : {len(seqs)}, "
+          f"nouvelles tentatives : {first.retries + second.retries}")
+    print(f"2e passage : {second.shipped} documents en {elapsed:.2f} s, "
+          f"{second.shipped / elapsed:,.0f} documents/s")
+    ok = seqs == list(range(args.events)) and indices == {f"honeypot-ssh_paramiko-{today}"}
+    print("OK : chaque événement indexé une fois" if ok else f"ÉCHEC : index {indices}")
+    es.shutdown()
+
+
+if __name__ == "__main__":
+    main()
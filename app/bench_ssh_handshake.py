@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Coût d'un échange de clés SSH selon la clé d'hôte et l'algorithme de kex.
+
+Pour chaque combinaison, un serveur (mode thread ou asyncio) est lancé
+avec une seule clé d'hôte et un seul kex (SSH_HOST_KEY_TYPES, SSH_KEX) ;
+N clients paramiko font l'échange de clés complet puis se déconnectent,
+sans authentification (cas d'un scanner). On mesure :
+
+  - la latence moyenne d'un handshake côté client,
+  - le temps CPU consommé par le serveur par handshake (/proc/<pid>/stat).
+
+Usage : python bench_ssh_handshake.py [-n 200] [--modes thread,asyncio]
+            [--keys ed25519,ecdsa,rsa]
+            [--kex curve25519-sha256@libssh.org,ecdh-sha2-nistp256,diffie-hellman-group14-sha256]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import paramiko
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+DEFAULT_KEX = ",".join((
+    "curve25519-sha256@libssh.org",
+    "ecdh-sha2-nistp256",
+    "diffie-hellman-group14-sha256",
+    "diffie-hellman-group16-sha512",
+))
+
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        # Le nom du processus peut contenir des espaces : on part de la fin
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK
+
+
+def start_server(mode, port, key_type, kex, key_dir):
+    # Le serveur ne propose que la clé et le kex mesurés
+    env = dict(os.environ, SSH_TTY_RECORD="0", SSH_SHELL_POOL_SIZE="0",
+               SSH_HOST_KEY_TYPES=key_type, SSH_HOST_KEY_DIR=key_dir, SSH_KEX=kex,
+               SSH_IP_RATE="1e9", SSH_IP_BURST="1000000",
+               SSH_NET_RATE="1e9", SSH_NET_BURST="1000000")
+    proc = subprocess.Popen(
+        [sys.executable, "ssh_honeypot.py", "--mode", mode,
+         "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BASE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"le serveur {mode} n'a pas démarré")
+
+
+def handshake(port, kex):
+    sock = socket.create_connection(("127.0.0.1", port), timeout=10)
+    transport = paramiko.Transport(sock)
+    transport.get_security_options().kex = (kex,)
+    try:
+        transport.start_client(timeout=10)
+        return transport.host_key_type
+    finally:
+        transport.close()
+
+
+def run_case(mode, port, key_type, kex, n, key_dir):
+    proc = start_server(mode, port, key_type, kex, key_dir)
+    try:
+        handshake(port, kex)                      # échauffement
+        time.sleep(0.2)
+        cpu0 = cpu_seconds(proc.pid)
+        t0 = time.perf_counter()
+        for _ in range(n):
+            host_key_type = handshake(port, kex)
+        elapsed = time.perf_counter() - t0
+        time.sleep(0.2)
+        cpu = cpu_seconds(proc.pid) - cpu0
+        return {
+            "mode": mode,
+            "host_key": host_key_type,
+            "kex": kex,
+            "handshake_ms": elapsed / n * 1000,
+            "server_cpu_ms": cpu / n * 1000,
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coût des handshakes SSH par algorithme")
+    parser.add_argument("-n", type=int, default=200, help="handshakes par combinaison")
+    parser.add_argument("--modes", default="thread,asyncio")
+    parser.add_argument("--keys", default="ed25519,ecdsa,rsa")
+    parser.add_argument("--kex", default=DEFAULT_KEX)
+    parser.add_argument("--port", type=int, default=22298)
+    args = parser.parse_args()
+
+    # Clés générées une fois dans un dossier jetable, partagées par les cas
+    with tempfile.TemporaryDirectory() as key_dir:
+        for mode in args.modes.split(","):
+            for key_type in args.keys.split(","):
+                for kex in args.kex.split(","):
+                    try:
+                        r = run_case(mode, args.port, key_type, kex, args.n, key_dir)
+                    except (paramiko.SSHException, OSError) as e:
+                        print(f"{mode:8} {key_type:8} {kex:40} échec : {e}", flush=True)
+                        continue
+                    print(f"{r['mode']:8} {r['host_key']:20} {r['kex']:40} "
+                          f"{r['handshake_ms']:7.2f} ms/handshake  "
+                          f"CPU serveur {r['server_cpu_ms']:6.2f} ms", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test de charge du honeypot SSH : mode "thread" (paramiko) contre mode
+"asyncio" (asyncssh).
+
+Pour chaque mode et chaque palier, un serveur est lancé dans un processus
+séparé ; N connexions simultanées échangent la bannière SSH et restent
+ouvertes (cas d'un scanner de masse). On mesure :
+
+  - connexions/s pour établir les N sessions,
+  - RSS et nombre de threads du serveur une fois les N sessions ouvertes.
+
+Usage : python bench_ssh_load.py [--levels 1000,5000] [--modes thread,asyncio]
+"""
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def raise_nofile_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def proc_status(pid):
+    out = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "Threads"):
+                out[key] = int(value.split()[0])
+    return out
+
+
+def start_server(mode, port):
+    # Toutes les connexions viennent de 127.0.0.1 : admission sans limite
+    env = dict(os.environ, SSH_TTY_RECORD="0", SSH_SHELL_POOL_SIZE="0",
+               SSH_IP_RATE="1e9", SSH_IP_BURST="1000000",
+               SSH_NET_RATE="1e9", SSH_NET_BURST="1000000",
+               SSH_MAX_HANDSHAKES="1000000")
+    proc = subprocess.Popen(
+        [sys.executable, "ssh_honeypot.py", "--mode", mode,
+         "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BASE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"le serveur {mode} n'a pas démarré")
+
+
+async def open_sessions(port, n, concurrency=500, timeout=30):
+    sem = asyncio.Semaphore(concurrency)
+    conns = []
+    failures = 0
+
+    async def one():
+        nonlocal failures
+        async with sem:
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection("127.0.0.1", port), timeout)
+                writer.write(b"SSH-2.0-OpenSSH_8.9 bench\r\n")
+                banner = await asyncio.wait_for(reader.readline(), timeout)
+                if not banner.startswith(b"SSH-"):
+                    raise ConnectionError(banner)
+                conns.append(writer)
+            except (OSError, asyncio.TimeoutError, ConnectionError):
+                failures += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(n)))
+    elapsed = time.perf_counter() - t0
+    return conns, failures, elapsed
+
+
+async def run_level(mode, port, n):
+    proc = start_server(mode, port)
+    try:
+        idle = proc_status(proc.pid)
+        conns, failures, elapsed = await open_sessions(port, n)
+        await asyncio.sleep(1.0)
+        loaded = proc_status(proc.pid)
+        for w in conns:
+            w.close()
+        return {
+            "mode": mode,
+            "sessions": n,
+            "ok": len(conns),
+            "failed": failures,
+            "conn_per_s": len(conns) / elapsed if elapsed else 0.0,
+            "rss_idle_mb": idle.get("VmRSS", 0) / 1024,
+            "rss_mb": loaded.get("VmRSS", 0) / 1024,
+            "threads": loaded.get("Threads", 0),
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge du honeypot SSH")
+    parser.add_argument("--levels", default="1000,5000")
+    parser.add_argument("--modes", default="thread,asyncio")
+    parser.add_argument("--port", type=int, default=22299)
+    args = parser.parse_args()
+
+    hard = raise_nofile_limit()
+    levels = [int(x) for x in args.levels.split(",")]
+    if max(levels) * 2 + 100 > hard:
+        print(f"[!] RLIMIT_NOFILE={hard} : les paliers élevés vont échouer", file=sys.stderr)
+
+    rows = []
+    for mode in args.modes.split(","):
+        for n in levels:
+            rows.append(asyncio.run(run_level(mode, args.port, n)))
+            r = rows[-1]
+            print(f"{r['mode']:8} {r['sessions']:6} sessions : ok={r['ok']:6} échecs={r['failed']:5} "
+                  f"{r['conn_per_s']:8.0f} conn/s  RSS {r['rss_idle_mb']:6.1f} -> {r['rss_mb']:7.1f} Mo  "
+                  f"threads={r['threads']}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
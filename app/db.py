@@ -0,0 +1,490 @@
+# db.py
+"""
+Accès SQLite du honeypot e-commerce (app.py).
+
+Au lieu d'un sqlite3.connect() / close() par requête, les connexions sont
+gardées dans un pool et prêtées au thread qui traite la requête (stockées
+dans flask.g, rendues au teardown). Chaque connexion est configurée une
+seule fois :
+
+  - journal WAL : les lectures ne bloquent plus sur les écritures,
+  - synchronous=NORMAL : plus de fsync à chaque commit (sûr en WAL),
+  - busy_timeout : attente au lieu de "database is locked",
+  - cache de requêtes préparées (cached_statements).
+
+Variables d'environnement :
+    ECOM_DB_PATH            fichier SQLite (défaut: database.db)
+    ECOM_DB_POOL_SIZE       connexions gardées au repos (défaut: 16)
+    ECOM_DB_BUSY_TIMEOUT    attente max d'un verrou, en ms (défaut: 5000)
+    ECOM_PRODUCT_CACHE_SIZE produits gardés en mémoire (défaut: 10000)
+    ECOM_SEARCH_LIMIT       résultats max d'une recherche (défaut: 100)
+    ECOM_PAGE_SIZE          commentaires / commandes par page (défaut: 50)
+    ECOM_CATALOG_PAGE_SIZE  produits par page de l'accueil (défaut: 60)
+    ECOM_MAX_PAGE_SIZE      plafond de ?limit= (défaut: 200)
+
+Le schéma évolue par migrations numérotées (MIGRATIONS), la dernière
+version appliquée étant gardée dans PRAGMA user_version.
+"""
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g
+
+DB_PATH = os.environ.get("ECOM_DB_PATH", "database.db")
+POOL_SIZE = int(os.environ.get("ECOM_DB_POOL_SIZE", "16"))
+BUSY_TIMEOUT_MS = int(os.environ.get("ECOM_DB_BUSY_TIMEOUT", "5000"))
+CACHED_STATEMENTS = 256
+PRODUCT_CACHE_SIZE = int(os.environ.get("ECOM_PRODUCT_CACHE_SIZE", "10000"))
+CATALOG_REVALIDATE_INTERVAL = 1.0   # secondes entre deux lectures de catalog_meta
+MAX_SQL_VARS = 500                  # ids par requête IN (...)
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+SEARCH_LIMIT = int(os.environ.get("ECOM_SEARCH_LIMIT", "100"))
+MAX_SEARCH_TERMS = 16
+_WORD_RE = re.compile(r"\w+")
+PAGE_SIZE = int(os.environ.get("ECOM_PAGE_SIZE", "50"))
+CATALOG_PAGE_SIZE = int(os.environ.get("ECOM_CATALOG_PAGE_SIZE", "60"))
+MAX_PAGE_SIZE = int(os.environ.get("ECOM_MAX_PAGE_SIZE", "200"))
+
+
+# ============================================================
+#   POOL DE CONNEXIONS
+# ============================================================
+
+def connect(path=None):
+    """Nouvelle connexion configurée (WAL, synchronous=NORMAL, busy_timeout)."""
+    conn = sqlite3.connect(
+        path or DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=CACHED_STATEMENTS,
+        check_same_thread=False,        # prêtée à un seul thread à la fois
+    )
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+class ConnectionPool:
+    """
+    Pile LIFO de connexions : la plus récemment rendue (cache chaud) est
+    prêtée en premier. Au-delà de `size` connexions au repos, les
+    connexions rendues sont fermées.
+    """
+
+    def __init__(self, path=None, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.opened += 1
+            return connect(self.path)
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self._idle.qsize() >= self.size:
+            conn.close()
+            return
+        self._idle.put_nowait(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _after_fork_in_child(self):
+        # Une connexion SQLite ne doit pas être partagée entre processus :
+        # on oublie (sans les fermer) celles héritées du parent.
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+
+POOL = ConnectionPool()
+os.register_at_fork(after_in_child=POOL._after_fork_in_child)
+
+
+def get_db():
+    """Connexion de la requête en cours (empruntée au pool au premier appel)."""
+    conn = g.get("_db")
+    if conn is None:
+        conn = g._db = POOL.acquire()
+    return conn
+
+
+def release_db(exc=None):
+    conn = g.pop("_db", None)
+    if conn is not None:
+        POOL.release(conn)
+
+
+def init_app(app):
+    app.teardown_appcontext(release_db)
+
+
+# ============================================================
+#   REQUÊTES
+# ============================================================
+
+def query_all(sql, params=()):
+    return get_db().execute(sql, params).fetchall()
+
+
+def query_one(sql, params=()):
+    return get_db().execute(sql, params).fetchone()
+
+
+def execute(sql, params=()):
+    """Écriture + commit ; retourne lastrowid."""
+    conn = get_db()
+    cur = conn.execute(sql, params)
+    conn.commit()
+    return cur.lastrowid
+
+
+# ============================================================
+#   MIGRATIONS DE SCHÉMA
+# ============================================================
+
+# (version, description, instructions). PRAGMA user_version retient la
+# dernière version appliquée : on n'ajoute qu'en fin de liste, sans jamais
+# modifier une migration déjà livrée.
+MIGRATIONS = [
+    (1, "index des commentaires par produit (/product)",
+     ["CREATE INDEX IF NOT EXISTS comments_product_id ON comments(product_id)"]),
+    (2, "index des commandes par client (/profile)",
+     ["CREATE INDEX IF NOT EXISTS orders_username ON orders(username)"]),
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Applique les migrations plus récentes que PRAGMA user_version dans la
+    transaction en cours de `conn` (voir init_db). Retourne les versions
+    appliquées.
+    """
+    current = schema_version(conn)
+    applied = []
+    for version, _description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        for sql in statements:
+            conn.execute(sql)
+        conn.execute(f"PRAGMA user_version = {int(version)}")
+        applied.append(version)
+    return applied
+
+
+# ============================================================
+#   PAGINATION (keyset)
+# ============================================================
+# Les pages sont repérées par le dernier id affiché (?after=) et non par un
+# OFFSET : "id > ? ORDER BY id LIMIT ?" lit au plus une page dans l'index,
+# quelle que soit la profondeur de la page.
+
+def page_size(value, default=PAGE_SIZE):
+    """Taille de page demandée (?limit=), bornée à [1, MAX_PAGE_SIZE]."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def page_cursor(value):
+    """Curseur ?after= : un id entier, sinon None (première page)."""
+    try:
+        after = int(value)
+    except (TypeError, ValueError):
+        return None
+    return after if INT64_MIN <= after <= INT64_MAX else None
+
+
+def _page(sql, params, after, limit):
+    # Une ligne de plus que demandé : indique s'il existe une page suivante
+    if after is not None:
+        sql += " AND id > ?"
+        params = params + (after,)
+    rows = query_all(sql + " ORDER BY id LIMIT ?", params + (limit + 1,))
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1][0]
+    return rows, None
+
+
+def get_catalog_page(after=None, limit=CATALOG_PAGE_SIZE):
+    """(produits, curseur de la page suivante ou None), par id croissant."""
+    return _page("SELECT * FROM products WHERE 1=1", (), after, limit)
+
+
+def get_products(query=None, category=None, limit=None):
+    """Résultats de /search : au plus `limit` produits, même sans `query`."""
+    limit = limit or SEARCH_LIMIT
+    if query:
+        return search_products(query, category, limit)
+    sql = "SELECT * FROM products WHERE 1=1"
+    params = ()
+    if category:
+        sql += " AND category=?"
+        params = (category,)
+    return _page(sql, params, None, limit)[0]
+
+
+# ============================================================
+#   RECHERCHE (FTS5)
+# ============================================================
+
+def create_search_index(conn):
+    """
+    Index FTS5 sur name/description/category, tenu à jour par triggers.
+    Retourne False si SQLite n'a pas FTS5 (la recherche reste en LIKE).
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='products_fts'"
+    ).fetchone()
+    try:
+        conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, description, category,
+            content='products', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )''')
+    except sqlite3.OperationalError:
+        return False
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+    END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+        INSERT INTO products_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END''')
+    if not exists:
+        # Produits déjà présents avant la création de l'index
+        conn.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+    return True
+
+
+_fts_available = None
+
+
+def has_search_index():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = query_one(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='products_fts'"
+        ) is not None
+    return _fts_available
+
+
+def fts_query(text):
+    """
+    Requête FTS5 : chaque mot devient un préfixe entre guillemets, tous
+    requis ("lap pro" -> "lap"* AND "pro"*). La syntaxe FTS5 de l'entrée
+    (guillemets, opérateurs, colonnes) n'est jamais interprétée.
+    """
+    words = _WORD_RE.findall(text)[:MAX_SEARCH_TERMS]
+    return " AND ".join(f'"{w}"*' for w in words)
+
+
+def search_products(query, category=None, limit=None):
+    """Produits correspondant à `query` (au plus `limit`, par id croissant)."""
+    limit = limit or SEARCH_LIMIT
+    match = fts_query(query) if has_search_index() else ""
+    if match:
+        sql = ("SELECT p.* FROM products_fts JOIN products p ON p.id = products_fts.rowid"
+               " WHERE products_fts MATCH ?")
+        params = [match]
+        if category:
+            sql += " AND p.category=?"
+            params.append(category)
+        # Ordre de l'index (= ordre des id, comme avant) : SQLite s'arrête
+        # aux `limit` premières correspondances au lieu de classer toutes
+        # les lignes (bm25 sur 20 000 résultats coûte une seconde).
+        sql += " LIMIT ?"
+        params.append(limit)
+        return query_all(sql, params)
+    # Pas de FTS5, ou requête sans aucun mot (ponctuation seule) : LIKE borné
+    sql = "SELECT * FROM products WHERE name LIKE ?"
+    params = ['%'+query+'%']
+    if category:
+        sql += " AND category=?"
+        params.append(category)
+    sql += " LIMIT ?"
+    params.append(limit)
+    return query_all(sql, params)
+
+
+def get_product(pid):
+    return query_one("SELECT * FROM products WHERE id=?", (pid,))
+
+
+def catalog_version():
+    row = query_one("SELECT version FROM catalog_meta")
+    return row[0] if row else 0
+
+
+_catalog_version = None
+_catalog_checked_at = None
+
+
+def current_catalog_version():
+    """
+    catalog_meta.version relue au plus une fois par seconde : clé
+    d'invalidation des caches dérivés du catalogue (produits, cartes HTML).
+    """
+    global _catalog_version, _catalog_checked_at
+    now = time.monotonic()
+    if _catalog_checked_at is None or now - _catalog_checked_at >= CATALOG_REVALIDATE_INTERVAL:
+        _catalog_version = catalog_version()
+        _catalog_checked_at = now
+    return _catalog_version
+
+
+# ============================================================
+#   CACHE PRODUITS (panier / paiement)
+# ============================================================
+
+def product_key(pid):
+    """
+    Id produit tel que SQLite le compare à la colonne INTEGER (" 1", "01",
+    "1.0" -> 1) ; None si aucune ligne ne peut correspondre.
+    """
+    if isinstance(pid, str):
+        if not pid.isascii() or "_" in pid:
+            return None
+        try:
+            pid = int(pid)
+        except ValueError:
+            try:
+                value = float(pid)
+            except ValueError:
+                return None
+            if not value.is_integer():
+                return None
+            pid = int(value)
+    if not isinstance(pid, int) or not INT64_MIN <= pid <= INT64_MAX:
+        return None
+    return pid
+
+
+class ProductCache:
+    """
+    Lignes products par id (LRU, absences comprises : les bots remplissent
+    le panier d'ids inexistants). Vidé quand catalog_meta.version change ;
+    la version est relue au plus une fois par seconde.
+    """
+
+    def __init__(self, max_entries=PRODUCT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def _revalidate(self):
+        version = current_catalog_version()
+        if version != self._version:
+            with self._lock:
+                self._rows.clear()
+                self._version = version
+
+    def get_many(self, keys):
+        """{id: ligne ou None} pour des ids normalisés (product_key)."""
+        self._revalidate()
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if key in self._rows:
+                    self._rows.move_to_end(key)
+                    found[key] = self._rows[key]
+                else:
+                    missing.append(key)
+            self.hits += len(found)
+            self.misses += len(missing)
+        if not missing:
+            return found
+        fetched = dict.fromkeys(missing)
+        for i in range(0, len(missing), MAX_SQL_VARS):
+            chunk = missing[i:i + MAX_SQL_VARS]
+            marks = ",".join("?" * len(chunk))
+            for row in query_all(f"SELECT * FROM products WHERE id IN ({marks})", chunk):
+                fetched[row[0]] = row
+        with self._lock:
+            for key, row in fetched.items():
+                self._rows[key] = row
+            while len(self._rows) > self.max_entries:
+                self._rows.popitem(last=False)
+        found.update(fetched)
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+PRODUCT_CACHE = ProductCache()
+
+
+def get_products_by_ids(pids):
+    """
+    Lignes des produits d'un panier, dans l'ordre et avec les doublons ;
+    les ids inconnus sont ignorés. Une requête par bloc d'ids distincts au
+    lieu d'une par article.
+    """
+    keys = [product_key(pid) for pid in pids]
+    unique = list(dict.fromkeys(k for k in keys if k is not None))
+    rows = PRODUCT_CACHE.get_many(unique) if unique else {}
+    return [rows[k] for k in keys if k is not None and rows[k] is not None]
+
+
+def get_comments(pid, after=None, limit=PAGE_SIZE):
+    """(commentaires du produit, curseur de la page suivante ou None)."""
+    return _page("SELECT * FROM comments WHERE product_id=?", (pid,), after, limit)
+
+
+def add_comment(pid, username, comment):
+    return execute("INSERT INTO comments(product_id,username,comment) VALUES(?,?,?)",
+                   (pid, username, comment))
+
+
+def get_user(username, password):
+    return query_one("SELECT * FROM users WHERE username=? AND password=?", (username, password))
+
+
+def create_user(username, password):
+    """Lève sqlite3.IntegrityError si le nom est déjà pris."""
+    return execute("INSERT INTO users(username,password) VALUES(?,?)", (username, password))
+
+
+def get_orders(username, after=None, limit=PAGE_SIZE):
+    """(commandes du client, curseur de la page suivante ou None)."""
+    return _page("SELECT * FROM orders WHERE username=?", (username,), after, limit)
+
+
+def create_order(username, products, total, date):
+    return execute("INSERT INTO orders(username,products,total,date) VALUES(?,?,?,?)",
+                   (username, products, total, date))
@@ -0,0 +1,496 @@
+# event_sink.py
+"""
+Écrivain d'événements JSON asynchrone et par lots, partagé par les
+honeypots HTTP, SSH et FTP.
+
+Les services déposent des lignes JSON dans une file bornée en mémoire ;
+un thread de fond les regroupe et les écrit avec un seul write() par lot
+(déclenché par la taille du lot ou par un délai). Si la file est pleine,
+l'événement est abandonné et compté plutôt que de bloquer le service.
+
+Les événements peuvent être des lignes déjà sérialisées (str ou bytes) ou des
+objets bruts : ceux-ci sont transformés en JSON par le thread d'écriture
+(`serializer`, par défaut dumps(), qui utilise orjson s'il est installé),
+pour que le thread qui sert la requête ne paie pas la sérialisation.
+
+Plusieurs processus peuvent écrire dans le même fichier (workers
+gunicorn) : chaque lot est écrit sous un verrou POSIX (lockf) sur le
+fichier, donc les lignes de deux processus ne se mélangent jamais, même si
+un write() est partiel. Sous ce même verrou, le fichier est renommé en
+segment quand il devient trop gros ou trop vieux (voir log_rotation.py) ;
+chaque processus rouvre alors le nouveau fichier actif.
+
+Un processus sandboxé, qui ne pourrait pas faire tourner le fichier
+(workers FTP), envoie ses lots dans un tube (forward_to()) ; le parent les
+recopie dans le fichier avec relay().
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import queue
+import signal
+import threading
+import time
+
+import log_rotation
+
+DEFAULT_MAX_QUEUE = 10000       # événements en attente avant abandon
+DEFAULT_BATCH_SIZE = 512        # flush dès que le lot atteint cette taille
+DEFAULT_FLUSH_INTERVAL = 0.5    # ... ou au plus tard après ce délai (s)
+SERIALIZE_SLICE = 32            # objets sérialisés entre deux cessions du GIL
+RELAY_CHUNK = 64 * 1024         # lecture d'un tube de forward_to() par relay()
+ROTATE_CHECK_INTERVAL = 5.0     # vérification de rotation sans événement (s)
+
+_STOP = object()
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """JSON d'une ligne (UTF-8, non-ASCII conservé) ; orjson si disponible."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass                    # ex. entier > 64 bits : json le gère
+    return json.dumps(obj, ensure_ascii=False)
+
+
+class _FlushRequest:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class EventSink:
+    """
+    File bornée + thread d'écriture pour un fichier de log JSON (une ligne
+    par événement). Le fichier reste ouvert en O_APPEND, et n'est rouvert
+    qu'après une rotation.
+    """
+
+    def __init__(self, path,
+                 max_queue=DEFAULT_MAX_QUEUE,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 serializer=dumps,
+                 rotator=None):
+        self.path = path
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.serializer = serializer
+        self.rotator = rotator
+
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._pid = None
+        self._fd = None
+        self._forward = False       # _fd est un tube vers le parent (forward_to)
+        self._closed = False
+
+        # Compteurs (lus par stats())
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self.serialize_errors = 0
+        self.flushes = 0
+
+    # ------------------------------------------------------------
+    #   Cycle de vie
+    # ------------------------------------------------------------
+
+    def start(self):
+        """Démarre le thread d'écriture (idempotent, sûr après fork())."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._closed = False
+            # Ouverture immédiate : un service peut ensuite se sandboxer
+            # (seccomp) sans perdre l'accès à son log.
+            try:
+                self._open()
+            except OSError as e:
+                logging.error("Impossible d'ouvrir le log %s: %s", self.path, e)
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f"event-sink:{os.path.basename(self.path)}",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def forward_to(self, fd):
+        """
+        Écrit les lots dans `fd` (tube lu par relay() dans le parent) au lieu
+        du fichier : ni verrou ni rotation dans ce processus. À appeler dans
+        l'enfant, avant start() ; le descripteur du fichier hérité est fermé.
+        """
+        with self._lock:
+            if self._fd is not None and self._fd != fd:
+                try:
+                    os.close(self._fd)
+                except OSError:
+                    pass
+            self._fd = fd
+            self._forward = True
+            self.rotator = None
+
+    def relay(self, fd):
+        """
+        Recopie dans le fichier les lignes reçues sur `fd` (tube d'un enfant
+        en forward_to()) jusqu'à sa fermeture, depuis un thread de fond.
+        Retourne ce thread.
+        """
+        thread = threading.Thread(
+            target=self._relay, args=(fd,),
+            name=f"event-relay:{os.path.basename(self.path)}",
+            daemon=True,
+        )
+        thread.start()
+        return thread
+
+    def emit(self, line):
+        """
+        Dépose une ligne JSON (sans '\\n'), ou un objet que `serializer`
+        transformera en JSON, dans la file. Ne bloque jamais : retourne
+        False si l'événement a été abandonné.
+        """
+        if self._closed:
+            self.dropped += 1
+            return False
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def flush(self, timeout=5.0):
+        """Force l'écriture de tout ce qui est en file et attend la fin."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        req = _FlushRequest()
+        try:
+            self._queue.put(req, timeout=timeout)
+        except queue.Full:
+            return
+        req.done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Vide la file, écrit le dernier lot puis ferme le fichier."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            thread.join(timeout)
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+        if self.rotator is not None:
+            self.rotator.close(timeout)
+
+    def _after_fork_in_child(self):
+        # Le thread et la file du parent n'existent plus dans l'enfant : on
+        # repart d'un état propre. Le descripteur O_APPEND hérité reste
+        # utilisable tel quel.
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._thread = None
+        self._pid = None
+        if self.rotator is not None:
+            self.rotator.after_fork_in_child()
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "write_errors": self.write_errors,
+            "serialize_errors": self.serialize_errors,
+            "flushes": self.flushes,
+            "rotations": self.rotator.rotations if self.rotator is not None else 0,
+        }
+
+    # ------------------------------------------------------------
+    #   Thread d'écriture
+    # ------------------------------------------------------------
+
+    def _run(self):
+        q = self._queue
+        # Sans événement, on se réveille quand même pour la rotation par âge
+        # (ex. parent FTP, qui n'écrit rien mais n'est pas sandboxé)
+        idle_timeout = ROTATE_CHECK_INTERVAL if self.rotator is not None else None
+        while True:
+            try:
+                item = q.get(timeout=idle_timeout)
+            except queue.Empty:
+                self._check_rotation()
+                continue
+            if item is _STOP:
+                return
+            if isinstance(item, _FlushRequest):
+                item.done.set()
+                continue
+
+            batch = [item]
+            pending = []
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                if isinstance(item, _FlushRequest):
+                    pending.append(item)
+                    break
+                batch.append(item)
+
+            self._write_batch(batch)
+            for req in pending:
+                req.done.set()
+            if stop:
+                # Vider ce qui reste avant de sortir
+                rest = []
+                while True:
+                    try:
+                        item = q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, _FlushRequest):
+                        item.done.set()
+                    elif item is not _STOP:
+                        rest.append(item)
+                if rest:
+                    self._write_batch(rest)
+                return
+
+    def _relay(self, fd):
+        rest = b""
+        try:
+            while True:
+                try:
+                    data = os.read(fd, RELAY_CHUNK)
+                except InterruptedError:
+                    continue
+                if not data:
+                    break
+                end = data.rfind(b"\n")
+                if end < 0:
+                    rest += data
+                    continue
+                # Bloc de lignes complètes (sans le dernier \n), écrit tel quel
+                self._put_block(rest + data[:end])
+                rest = data[end + 1:]
+        except OSError as e:
+            logging.error("Relais du log %s interrompu : %s", self.path, e)
+        finally:
+            os.close(fd)
+        if rest:
+            self._put_block(rest)
+
+    def _put_block(self, block):
+        # Pas d'abandon ici : l'enfant attend sur son tube si le fichier est lent
+        while not self._closed:
+            try:
+                self._queue.put(block, timeout=1.0)
+            except queue.Full:
+                continue
+            self.enqueued += block.count(b"\n") + 1
+            return
+        self.dropped += block.count(b"\n") + 1
+
+    def _open(self):
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _reopen(self):
+        # Fichier renommé par une rotation : fermé (ce qui libère son verrou),
+        # le prochain _open() crée le nouveau fichier actif
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+        self._fd = None
+
+    def _lock_current(self):
+        """
+        (descripteur du fichier actif, verrouillé ?). Un autre processus a pu
+        faire tourner le fichier pendant l'attente du verrou : le descripteur
+        pointe alors sur le segment, on rouvre le nouveau fichier.
+        """
+        while True:
+            fd = self._open()
+            if self._forward or not self._lock_file(fd):
+                return fd, False
+            try:
+                current = os.stat(self.path).st_ino == os.fstat(fd).st_ino
+            except FileNotFoundError:
+                current = False
+            if current:
+                return fd, True
+            self._reopen()
+
+    def _encode(self, batch):
+        lines = []
+        for i, item in enumerate(batch):
+            if i % SERIALIZE_SLICE == SERIALIZE_SLICE - 1:
+                # Rend le GIL aux threads qui servent les requêtes plutôt
+                # que de sérialiser tout un lot d'une traite
+                time.sleep(0)
+            if not isinstance(item, (str, bytes)):
+                try:
+                    item = self.serializer(item)
+                except Exception as e:
+                    self.serialize_errors += 1
+                    logging.error("Événement non sérialisable pour %s: %s", self.path, e)
+                    continue
+            if isinstance(item, str):
+                item = item.encode("utf-8", errors="replace")
+            lines.append(item)
+        return lines
+
+    def _write_batch(self, batch):
+        batch = self._encode(batch)
+        if not batch:
+            return
+        data = b"\n".join(batch) + b"\n"
+        rotated = False
+        try:
+            fd, locked = self._lock_current()
+            try:
+                view = memoryview(data)
+                while view:
+                    n = os.write(fd, view)
+                    view = view[n:]
+                rotated = self.rotator is not None and locked and self.rotator.check(fd)
+            finally:
+                if locked:
+                    fcntl.lockf(fd, fcntl.LOCK_UN, 0, 0, os.SEEK_SET)
+            if rotated:
+                self._reopen()
+                self._open()
+        except OSError as e:
+            self.write_errors += data.count(b"\n")
+            logging.error("Erreur d'écriture du log %s: %s", self.path, e)
+            return
+        # Un élément relayé (bytes) peut contenir plusieurs lignes
+        self.written += data.count(b"\n")
+        self.flushes += 1
+
+    def _check_rotation(self):
+        if self._fd is None or not self.rotator.enabled:
+            return
+        try:
+            fd, locked = self._lock_current()
+        except OSError as e:
+            logging.error("Rotation de %s : réouverture impossible : %s", self.path, e)
+            return
+        if not locked:
+            return
+        try:
+            rotated = self.rotator.check(fd)
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN, 0, 0, os.SEEK_SET)
+        if rotated:
+            self._reopen()
+            try:
+                self._open()
+            except OSError as e:
+                logging.error("Impossible d'ouvrir le log %s: %s", self.path, e)
+
+    @staticmethod
+    def _lock_file(fd):
+        # Verrou par processus (et non par descripteur) : valable même si
+        # le descripteur a été hérité d'un parent commun.
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX, 0, 0, os.SEEK_SET)
+        except OSError:
+            return False            # système de fichiers sans verrous
+        return True
+
+
+# ============================================================
+#   REGISTRE PARTAGÉ
+# ============================================================
+
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+
+def get_sink(path, **kwargs):
+    """
+    Retourne l'EventSink associé à `path` (créé et démarré au premier
+    appel). Un seul écrivain par fichier et par processus.
+    """
+    path = os.path.abspath(path)
+    with _sinks_lock:
+        sink = _sinks.get(path)
+        if sink is None:
+            kwargs.setdefault("rotator", log_rotation.Rotator(path))
+            sink = EventSink(path, **kwargs)
+            _sinks[path] = sink
+    sink.start()
+    return sink
+
+
+def close_all():
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+    for sink in sinks:
+        sink.close()
+
+
+def flush_on_sigterm():
+    """
+    Transforme SIGTERM en sortie normale pour que les lots en attente
+    soient écrits (atexit) quand stop_honeypot.sh tue le processus.
+    """
+    def _handler(signum, frame):
+        raise SystemExit(0)
+
+    try:
+        signal.signal(signal.SIGTERM, _handler)
+    except ValueError:
+        # Pas dans le thread principal (ex: serveur WSGI) : on laisse faire.
+        pass
+
+
+def _reset_sinks_after_fork():
+    global _sinks_lock
+    _sinks_lock = threading.Lock()
+    for sink in _sinks.values():
+        sink._after_fork_in_child()
+
+
+atexit.register(close_all)
+os.register_at_fork(after_in_child=_reset_sinks_after_fork)
@@ -0,0 +1,282 @@
+# ftp_fs.py
+"""
+Accès au répertoire servi par le honeypot FTP.
+
+HoneypotFS expose HONEYPOT_DIR comme une arborescence virtuelle confinée
+(CWD / LIST / NLST / MLSD / RETR). Les listings de chaque répertoire sont
+pré-encodés et mis en cache (ListingCache).
+
+FileCache garde en mémoire le contenu des petits fichiers appâts
+(flag.txt & co) que les bots téléchargent en boucle : un RETR répété est
+servi depuis la RAM sans open()/read(). Les gros fichiers ne sont pas mis
+en cache et partent par sendfile() (zéro copie).
+"""
+import os
+import posixpath
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+SMALL_FILE_MAX = 64 * 1024          # au-delà : sendfile(), pas de cache
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_BYTES = 8 * 1024 * 1024
+REVALIDATE_INTERVAL = 1.0           # secondes entre deux stat() d'une entrée
+
+
+class FileCache:
+    """
+    Cache LRU {chemin: contenu} invalidé par (mtime, taille). Une entrée
+    n'est re-stat()ée qu'au plus une fois par REVALIDATE_INTERVAL.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                 small_file_max=SMALL_FILE_MAX, revalidate=REVALIDATE_INTERVAL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.small_file_max = small_file_max
+        self.revalidate = revalidate
+        self._entries = OrderedDict()   # path -> [mtime_ns, size, data, checked_at]
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, path):
+        """
+        Retourne (data, size) :
+          - data = bytes si le fichier est petit (servi depuis le cache),
+          - data = None si le fichier doit être envoyé par sendfile().
+        Lève FileNotFoundError si le chemin n'est pas un fichier régulier.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and now - entry[3] < self.revalidate:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[2], entry[1]
+
+        st = os.stat(path)
+        if not stat.S_ISREG(st.st_mode):
+            raise FileNotFoundError(path)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                entry[3] = now
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[2], entry[1]
+
+        self.misses += 1
+        if st.st_size > self.small_file_max:
+            self.invalidate(path)
+            return None, st.st_size
+
+        with open(path, "rb") as f:
+            data = f.read()
+        self._store(path, st.st_mtime_ns, data, now)
+        return data, len(data)
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._bytes -= len(entry[2])
+
+    def _store(self, path, mtime_ns, data, now):
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self._bytes -= len(old[2])
+            self._entries[path] = [mtime_ns, len(data), data, now]
+            self._bytes += len(data)
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[2])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# ============================================================
+#   LISTINGS DE RÉPERTOIRES
+# ============================================================
+
+class DirListing:
+    """Réponses LIST / NLST / MLSD d'un répertoire, déjà encodées."""
+
+    __slots__ = ("list_bytes", "nlst_bytes", "mlsd_bytes", "mtime_ns", "checked_at")
+
+    def __init__(self, list_bytes, nlst_bytes, mlsd_bytes, mtime_ns, checked_at):
+        self.list_bytes = list_bytes
+        self.nlst_bytes = nlst_bytes
+        self.mlsd_bytes = mlsd_bytes
+        self.mtime_ns = mtime_ns
+        self.checked_at = checked_at
+
+
+def _ls_date(mtime, now):
+    # Même règle que `ls -l` : l'heure pour les fichiers de moins de 6 mois,
+    # l'année au-delà.
+    if now - mtime < 182 * 86400:
+        return time.strftime("%b %d %H:%M", time.localtime(mtime))
+    return time.strftime("%b %d  %Y", time.localtime(mtime))
+
+
+def build_listing(real_dir, now=None):
+    """Construit les trois formats en un seul passage os.scandir()."""
+    st_dir = os.stat(real_dir)
+    wall = time.time()
+    ls_lines = []
+    names = []
+    mlsd_lines = []
+    with os.scandir(real_dir) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    for entry in entries:
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        is_dir = stat.S_ISDIR(st.st_mode)
+        ls_lines.append(
+            f"{stat.filemode(st.st_mode)} {st.st_nlink:>3} root     root     "
+            f"{st.st_size:>10} {_ls_date(st.st_mtime, wall)} {entry.name}\r\n"
+        )
+        names.append(f"{entry.name}\r\n")
+        modify = time.strftime("%Y%m%d%H%M%S", time.gmtime(st.st_mtime))
+        if is_dir:
+            facts = f"type=dir;modify={modify};perm=el;"
+        else:
+            facts = f"type=file;size={st.st_size};modify={modify};perm=r;"
+        mlsd_lines.append(f"{facts} {entry.name}\r\n")
+    return DirListing(
+        "".join(ls_lines).encode("utf-8", errors="replace"),
+        "".join(names).encode("utf-8", errors="replace"),
+        "".join(mlsd_lines).encode("utf-8", errors="replace"),
+        st_dir.st_mtime_ns,
+        time.monotonic() if now is None else now,
+    )
+
+
+class ListingCache:
+    """
+    Listings pré-encodés par répertoire, invalidés par le mtime du
+    répertoire (création / suppression / renommage d'une entrée). Comme pour
+    FileCache, le mtime n'est revérifié qu'une fois par REVALIDATE_INTERVAL :
+    un flood de LIST coûte une recherche dans un dict.
+
+    Note : le mtime d'un répertoire ne bouge pas quand un fichier existant
+    change de taille ; dans ce cas appeler invalidate().
+    """
+
+    def __init__(self, revalidate=REVALIDATE_INTERVAL):
+        self.revalidate = revalidate
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.rebuilds = 0
+
+    def get(self, real_dir):
+        now = time.monotonic()
+        listing = self._entries.get(real_dir)
+        if listing is not None:
+            if now - listing.checked_at < self.revalidate:
+                self.hits += 1
+                return listing
+            st = os.stat(real_dir)
+            if st.st_mtime_ns == listing.mtime_ns:
+                listing.checked_at = now
+                self.hits += 1
+                return listing
+
+        listing = build_listing(real_dir, now)
+        with self._lock:
+            self._entries[real_dir] = listing
+        self.rebuilds += 1
+        return listing
+
+    def invalidate(self, real_dir=None):
+        with self._lock:
+            if real_dir is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(real_dir, None)
+
+    def stats(self):
+        return {"directories": len(self._entries), "hits": self.hits, "rebuilds": self.rebuilds}
+
+
+# ============================================================
+#   ARBORESCENCE VIRTUELLE
+# ============================================================
+
+# Arborescence appât créée (si absente) sous la racine FTP pour que le
+# serveur ressemble à une vraie machine. Chemin relatif -> contenu.
+DECOY_TREE = {
+    "pub/README": "Public FTP area. Uploads are reviewed daily.\n",
+    "pub/releases/app-2.3.1.tar.gz.sha256":
+        "9f2c6a1e0d5b7c4e8a3f1b2d6e9c0a7b5d4e3f2a1b0c9d8e7f6a5b4c3d2e1f0a  app-2.3.1.tar.gz\n",
+    "backup/db_backup_2024-11-02.sql":
+        "-- MySQL dump 10.13\n-- Host: localhost    Database: shop\n"
+        "INSERT INTO users VALUES (1,'admin','5f4dcc3b5aa765d61d8327deb882cf99');\n",
+    "backup/config.bak": "DB_HOST=10.0.0.12\nDB_USER=shop\nDB_PASS=Sh0p!2024\n",
+    "home/admin/.bash_history": "ls -la\ncd /var/www\nmysql -u root -p\nexit\n",
+    "home/admin/notes.txt": "TODO: rotate the FTP password before the audit.\n",
+    "etc/vsftpd.conf": "anonymous_enable=YES\nlocal_enable=YES\nwrite_enable=NO\n",
+}
+
+
+def populate_decoy_tree(root, tree=DECOY_TREE):
+    """Crée les fichiers appâts manquants (n'écrase jamais l'existant)."""
+    for rel, content in tree.items():
+        path = os.path.join(root, rel)
+        if os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+
+class HoneypotFS:
+    """
+    Vue FTP d'un répertoire réel : chemins virtuels confinés sous `root`,
+    listings et petits fichiers servis depuis les caches.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.files = FileCache()
+        self.listings = ListingCache()
+
+    def resolve(self, cwd, arg=None):
+        """
+        Retourne (chemin virtuel, chemin réel). `..` ne peut pas remonter
+        au-dessus de la racine virtuelle "/".
+        """
+        vpath = posixpath.normpath(posixpath.join("/", cwd, arg or "."))
+        rel = vpath.lstrip("/")
+        vpath = "/" + rel
+        real = os.path.join(self.root, rel) if rel else self.root
+        return vpath, real
+
+    def is_dir(self, real):
+        return os.path.isdir(real)
+
+    def listing(self, real_dir):
+        return self.listings.get(real_dir)
+
+    def read_small(self, real):
+        return self.files.lookup(real)
@@ -1,76 +1,76 @@
+import asyncio
 import socket
-import threading
 import os
 import datetime
 import json
 import errno
-
-# ===================== SECCOMP FIX (Block only STOR) =====================
-try:
-    from pyseccomp import SyscallFilter, ALLOW, ERRNO
-    SECCOMP_AVAILABLE = True
-except:
-    print("[!] pyseccomp non installé — seccomp désactivé")
-    SECCOMP_AVAILABLE = False
-
-
+import resource
+import signal
+import sys
+import time
+import traceback
+
+import auth_stats
+import seccomp_config
+from event_sink import get_sink, flush_on_sigterm, close_all
+from ftp_fs import HoneypotFS, populate_decoy_tree
+from ftp_pasv import PassivePortPool
+
+# ===================== SECCOMP (Block only STOR) =====================
 def enable_seccomp_block_put():
     """
-    Version compatible avec toutes les versions pyseccomp.
+    Sandbox du processus (profil "ftp_readonly" de seccomp_config) : aucun
+    fichier ne peut être créé ni modifié. Chargé une seule fois par
+    processus, avant de servir le moindre client.
     """
-    if not SECCOMP_AVAILABLE:
-        print("[!] Seccomp non actif")
-        return
-
-    try:
-        flt = SyscallFilter(default=ALLOW)
-    except TypeError:
-        try:
-            flt = SyscallFilter()
-        except Exception as e:
-            print(f"[!] Version pyseccomp incompatible → seccomp OFF ({e})")
-            return
-
-    # Syscalls interdits → impossible d’écrire un fichier (PUT / STOR)
-    blocked = [
-        "write",
-        "pwrite64",
-        "truncate",
-        "unlink",
-        "rename",
-        "openat",
-        "creat"
-    ]
-
-    for sc in blocked:
-        try:
-            flt.add_rule(ERRNO(errno.EACCES), sc)
-        except Exception as e:
-            print(f"[!] Impossible de bloquer {sc}: {e}")
-
-    try:
-        flt.load()
+    if seccomp_config.apply_profile("ftp_readonly", errno.EACCES):
         print("[+] Seccomp actif : ÉCRITURE bloquée → PUT interdit")
-    except Exception as e:
-        print(f"[!] Seccomp load() échec : {e}")
+    else:
+        print("[!] Seccomp non actif")
 
 
 # ===================== CONFIG =====================
 HOST = "0.0.0.0"
 PORT = 2121
 
-LOG_DIR = "/home/kali/Downloads/projet_honeypot-elk-integration/logs/"
-HONEYPOT_DIR = "/home/kali/Downloads/projet_honeypot-elk-integration/app/honeypot"
+# Limites du moteur asyncio (surchargeables par variables d'environnement)
+BACKLOG = int(os.environ.get("FTP_BACKLOG", "4096"))
+IDLE_TIMEOUT = float(os.environ.get("FTP_IDLE_TIMEOUT", "300"))
+MAX_SESSIONS = int(os.environ.get("FTP_MAX_SESSIONS", "20000"))
+MAX_LINE = 8192  # une commande FTP sans CRLF au-delà de cette taille = abus
+
+# Ports passifs pré-ouverts (voir ftp_pasv.py)
+PASV_PORT_MIN = int(os.environ.get("FTP_PASV_PORT_MIN", "30000"))
+PASV_PORT_MAX = int(os.environ.get("FTP_PASV_PORT_MAX", "30999"))
+PASV_ACCEPT_TIMEOUT = float(os.environ.get("FTP_PASV_ACCEPT_TIMEOUT", "30"))
+
+# Processus serveurs pré-forkés (toujours au moins un : le parent, non
+# sandboxé, garde le log et sa rotation)
+WORKERS = int(os.environ.get("FTP_WORKERS", "1"))
+
+# Copie de chaque événement sur la console (débogage uniquement : coûteux sous charge)
+DEBUG = os.environ.get("FTP_DEBUG", "0") == "1"
+
+LOG_DIR = os.environ.get("FTP_LOG_DIR", "/home/kali/Downloads/projet_honeypot-elk-integration/logs/")
+HONEYPOT_DIR = os.environ.get("FTP_HONEYPOT_DIR", "/home/kali/Downloads/projet_honeypot-elk-integration/app/honeypot")
 
 os.makedirs(LOG_DIR, exist_ok=True)
 os.makedirs(HONEYPOT_DIR, exist_ok=True)
 
 LOG_FILE = os.path.join(LOG_DIR, "honeypot_ftp.log")
+LOG_SINK = get_sink(LOG_FILE)
+
+# Sketches des tentatives USER/PASS + rollups (voir auth_stats.py), un état par worker
+AUTH_STATS = auth_stats.AuthStats("ftp", LOG_SINK, os.path.join(LOG_DIR, "auth_stats"))
 
 FLAG = os.path.join(HONEYPOT_DIR, "flag.txt")
 with open(FLAG, "w") as f:
     f.write("FLAG{FTP_HONEYPOT_OK}\n")
 
+# Arborescence servie : fichiers appâts + listings gardés en cache (voir ftp_fs.py)
+populate_decoy_tree(HONEYPOT_DIR)
+FS = HoneypotFS(HONEYPOT_DIR)
+
 
 # ===================== LOG =====================
 def log_event(event_type, session, ip, command=None, extra=None):
@@ -83,16 +83,21 @@ def log_event(event_type, session, ip, command=None, extra=None):
         "command": command,
         "extra": extra or {}
     }
-    with open(LOG_FILE, "a") as f:
-        f.write(json.dumps(event) + "\n")
-    print(json.dumps(event, indent=2))
+    line = json.dumps(event)
+    LOG_SINK.emit(line)
+    if DEBUG:
+        print(line)
 
 
 # ===================== PASV =====================
+PASV_POOL = None  # ouvert par run_worker() (une part de la plage par worker)
+
+
 def passive_socket(ip, session):
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.bind((HOST, 0))
-    s.listen(1)
+    s = PASV_POOL.acquire()
+    if s is None:
+        log_event("pasv_exhausted", session, ip, extra=PASV_POOL.stats())
+        return None, "425 Could not open passive connection\r\n"
     port = s.getsockname()[1]
 
     ip_format = "127,0,0,1"
@@ -103,148 +108,358 @@ def passive_socket(ip, session):
     return s, f"227 Entering Passive Mode ({ip_format},{p1},{p2})\r\n"
 
 
+async def accept_data(pasv_sock, session, ip, reply):
+    """Connexion de données du client, ou None (425 envoyé) après le délai."""
+    try:
+        return await PASV_POOL.accept(pasv_sock, ip)
+    except asyncio.TimeoutError:
+        log_event("pasv_timeout", session, ip, extra={"timeout": PASV_POOL.accept_timeout})
+        await reply(b"425 Failed to establish connection.\r\n")
+        return None
+
+
 # ===================== CLIENT HANDLER =====================
-def handle_client(conn, addr):
+active_sessions = 0
+
+
+async def handle_client(reader, writer):
+    global active_sessions
+
+    addr = writer.get_extra_info("peername") or ("?", 0)
     session = os.urandom(8).hex()
     ip_client = addr[0]
+    loop = asyncio.get_running_loop()
 
-    log_event("connection_opened", session, ip_client)
-    conn.sendall(b"220 FakeFTP Honeypot Ready\r\n")
+    async def reply(msg):
+        writer.write(msg)
+        await writer.drain()
 
+    if active_sessions >= MAX_SESSIONS:
+        log_event("connection_rejected", session, ip_client,
+                  extra={"reason": "max_sessions", "active": active_sessions})
+        try:
+            writer.write(b"421 Too many users, try again later\r\n")
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+        return
+
+    active_sessions += 1
     pasv_sock = None
     buffer_cmd = ""
+    cwd = "/"
+    username = None
 
-    # ACTIVER SECCOMP
-    enable_seccomp_block_put()
+    try:
+        log_event("connection_opened", session, ip_client)
+        await reply(b"220 FakeFTP Honeypot Ready\r\n")
+
+        while True:
+            try:
+                data = await asyncio.wait_for(reader.read(4096), IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                log_event("connection_timeout", session, ip_client,
+                          extra={"idle_timeout": IDLE_TIMEOUT})
+                writer.write(b"421 Timeout\r\n")
+                break
+            except ConnectionError:
+                break
+
+            if not data:
+                break
+
+            buffer_cmd += data.decode(errors="ignore")
+            if len(buffer_cmd) > MAX_LINE and "\r\n" not in buffer_cmd:
+                log_event("line_too_long", session, ip_client,
+                          extra={"size": len(buffer_cmd)})
+                writer.write(b"500 Line too long\r\n")
+                break
+
+            while "\r\n" in buffer_cmd:
+                line, buffer_cmd = buffer_cmd.split("\r\n", 1)
+                line = line.strip()
+                if not line:
+                    continue
 
-    while True:
-        try:
-            data = conn.recv(4096).decode(errors="ignore")
-        except:
-            break
+                parts = line.split(" ")
+                cmd = parts[0].upper()
+                arg = " ".join(parts[1:]) if len(parts) > 1 else None
 
-        if not data:
-            break
+                if cmd not in ["STOR", "RETR"]:
+                    log_event("command", session, ip_client, command=line)
+
+                # AUTH
+                if cmd == "USER":
+                    username = arg
+                    await reply(b"331 Password required\r\n")
+                    continue
+
+                if cmd == "PASS":
+                    AUTH_STATS.record(ip_client, username, arg)
+                    await reply(b"230 Login OK\r\n")
+                    continue
 
-        buffer_cmd += data
-
-        while "\r\n" in buffer_cmd:
-            line, buffer_cmd = buffer_cmd.split("\r\n", 1)
-            line = line.strip()
-            if not line:
-                continue
-
-            parts = line.split(" ")
-            cmd = parts[0].upper()
-            arg = " ".join(parts[1:]) if len(parts) > 1 else None
-
-            if cmd not in ["STOR", "RETR"]:
-                log_event("command", session, ip_client, command=line)
-
-            # AUTH
-            if cmd == "USER":
-                conn.sendall(b"331 Password required\r\n")
-                continue
-
-            if cmd == "PASS":
-                conn.sendall(b"230 Login OK\r\n")
-                continue
-
-            if cmd == "TYPE":
-                conn.sendall(b"200 Type set\r\n")
-                continue
-
-            if cmd == "PWD":
-                conn.sendall(b'257 "/" is the current directory\r\n')
-                continue
-
-            # PASV
-            if cmd == "PASV":
-                if pasv_sock:
-                    pasv_sock.close()
-                pasv_sock, response = passive_socket(ip_client, session)
-                conn.sendall(response.encode())
-                continue
-
-            # LIST
-            if cmd == "LIST":
-                if not pasv_sock:
-                    conn.sendall(b"425 Use PASV first.\r\n")
+                if cmd == "TYPE":
+                    await reply(b"200 Type set\r\n")
                     continue
 
-                conn.sendall(b"150 OK\r\n")
-                data_conn, _ = pasv_sock.accept()
+                if cmd == "PWD":
+                    await reply(f'257 "{cwd}" is the current directory\r\n'.encode())
+                    continue
 
-                listing = ""
-                for f in os.listdir(HONEYPOT_DIR):
-                    fp = os.path.join(HONEYPOT_DIR, f)
-                    size = os.path.getsize(fp)
-                    listing += f"-rw-r--r-- 1 root root {size} Jan 1 00:00 {f}\r\n"
+                if cmd in ("CWD", "CDUP"):
+                    vpath, real = FS.resolve(cwd, ".." if cmd == "CDUP" else arg)
+                    if not FS.is_dir(real):
+                        await reply(b"550 Failed to change directory.\r\n")
+                        continue
+                    cwd = vpath
+                    await reply(b"250 Directory successfully changed.\r\n")
+                    continue
 
-                data_conn.sendall(listing.encode())
-                data_conn.close()
+                # PASV
+                if cmd == "PASV":
+                    PASV_POOL.release(pasv_sock)
+                    pasv_sock, response = passive_socket(ip_client, session)
+                    await reply(response.encode())
+                    continue
 
-                pasv_sock.close()
-                pasv_sock = None
-                conn.sendall(b"226 List complete\r\n")
-                continue
+                # LIST / NLST / MLSD
+                if cmd in ("LIST", "NLST", "MLSD"):
+                    if not pasv_sock:
+                        await reply(b"425 Use PASV first.\r\n")
+                        continue
+
+                    # "LIST -la" : les options de ls sont ignorées
+                    target = None
+                    if arg:
+                        target = " ".join(p for p in arg.split(" ") if not p.startswith("-")) or None
+                    _, real = FS.resolve(cwd, target)
+                    try:
+                        listing = FS.listing(real)
+                    except (NotADirectoryError, FileNotFoundError):
+                        await reply(b"550 No such directory\r\n")
+                        continue
+
+                    if cmd == "LIST":
+                        payload = listing.list_bytes
+                    elif cmd == "NLST":
+                        payload = listing.nlst_bytes
+                    else:
+                        payload = listing.mlsd_bytes
+
+                    await reply(b"150 OK\r\n")
+                    data_conn = await accept_data(pasv_sock, session, ip_client, reply)
+                    PASV_POOL.release(pasv_sock)
+                    pasv_sock = None
+                    if data_conn is None:
+                        continue
+                    try:
+                        await loop.sock_sendall(data_conn, payload)
+                    finally:
+                        data_conn.close()
+
+                    await reply(b"226 List complete\r\n")
+                    continue
 
-            # RETR (GET)
-            if cmd == "RETR":
-                if not pasv_sock:
-                    conn.sendall(b"425 Use PASV first.\r\n")
+                # RETR (GET)
+                if cmd == "RETR":
+                    if not pasv_sock:
+                        await reply(b"425 Use PASV first.\r\n")
+                        continue
+
+                    _, fp = FS.resolve(cwd, arg)
+                    try:
+                        content, size = FS.read_small(fp)
+                    except OSError:
+                        await reply(b"550 File not found\r\n")
+                        continue
+
+                    await reply(b"150 Opening data connection\r\n")
+                    data_conn = await accept_data(pasv_sock, session, ip_client, reply)
+                    PASV_POOL.release(pasv_sock)
+                    pasv_sock = None
+                    if data_conn is None:
+                        continue
+
+                    try:
+                        if content is not None:
+                            # Petit fichier appât : servi depuis la RAM
+                            await loop.sock_sendall(data_conn, content)
+                        else:
+                            # Gros fichier : os.sendfile() noyau -> socket
+                            with open(fp, "rb") as f:
+                                await loop.sock_sendfile(data_conn, f)
+                    finally:
+                        data_conn.close()
+
+                    await reply(b"226 Transfer complete\r\n")
+                    log_event("get", session, ip_client, extra={"file": arg})
                     continue
 
-                fp = os.path.join(HONEYPOT_DIR, arg or "")
-                if not os.path.exists(fp):
-                    conn.sendall(b"550 File not found\r\n")
+                # ===================== STOR BLOQUÉ =====================
+                if cmd == "STOR":
+                    await reply(b"550 Permission denied (seccomp)\r\n")
+                    log_event("put_blocked", session, ip_client, extra={"file": arg})
                     continue
 
-                conn.sendall(b"150 Opening data connection\r\n")
-                data_conn, _ = pasv_sock.accept()
+                # QUIT
+                if cmd == "QUIT":
+                    await reply(b"221 Goodbye\r\n")
+                    log_event("connection_closed", session, ip_client)
+                    return
 
-                with open(fp, "rb") as f:
-                    while chunk := f.read(4096):
-                        data_conn.sendall(chunk)
+                await reply(b"502 Command not implemented\r\n")
 
-                data_conn.close()
-                pasv_sock.close()
-                pasv_sock = None
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        active_sessions -= 1
+        PASV_POOL.release(pasv_sock)
+        writer.close()
 
-                conn.sendall(b"226 Transfer complete\r\n")
-                log_event("get", session, ip_client, extra={"file": arg})
-                continue
 
-            # ===================== STOR BLOQUÉ =====================
-            if cmd == "STOR":
-                print("⛔ STOR reçu, blocage seccomp :", arg)
-                conn.sendall(b"550 Permission denied (seccomp)\r\n")
-                log_event("put_blocked", session, ip_client, extra={"file": arg})
-                continue
+# ===================== SERVER =====================
+def raise_nofile_limit():
+    """Chaque session consomme un descripteur : on monte la limite au maximum."""
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError):
+        pass
 
-            # QUIT
-            if cmd == "QUIT":
-                conn.sendall(b"221 Goodbye\r\n")
-                log_event("connection_closed", session, ip_client)
-                conn.close()
-                return
 
-            conn.sendall(b"502 Command not implemented\r\n")
+def make_listen_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HOST, PORT))
+    sock.listen(BACKLOG)
+    sock.setblocking(False)
+    return sock
 
 
-# ===================== SERVER =====================
-def start_server():
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server.bind((HOST, PORT))
-    server.listen(5)
+def pasv_range(worker, workers):
+    """Part de la plage PASV réservée à un worker (pas de port partagé)."""
+    total = PASV_PORT_MAX - PASV_PORT_MIN + 1
+    if total < max(workers, 1):
+        raise ValueError(
+            f"plage PASV {PASV_PORT_MIN}-{PASV_PORT_MAX} ({max(total, 0)} ports) "
+            f"trop petite pour {workers} workers (FTP_PASV_PORT_MIN/MAX, FTP_WORKERS)")
+    per_worker = total // workers
+    lo = PASV_PORT_MIN + worker * per_worker
+    hi = PASV_PORT_MAX if worker == workers - 1 else lo + per_worker - 1
+    return lo, hi
+
 
-    print(f"[+] FTP Honeypot running on port {PORT}")
+async def serve(listen_sock, worker=0):
+    server = await asyncio.start_server(handle_client, sock=listen_sock)
+
+    print(f"[+] FTP Honeypot running on port {PORT} "
+          f"(asyncio, worker={worker} pid={os.getpid()}, backlog={BACKLOG}, "
+          f"max_sessions={MAX_SESSIONS}, idle_timeout={IDLE_TIMEOUT}s)")
+
+    async with server:
+        await server.serve_forever()
+
+
+def run_worker(listen_sock, worker=0, workers=1):
+    """
+    Corps d'un processus serveur : ressources ouvertes d'abord, sandbox
+    ensuite (une fois), puis boucle asyncio.
+    """
+    global PASV_POOL
+
+    lo, hi = pasv_range(worker, workers)
+    PASV_POOL = PassivePortPool(HOST, lo, hi, PASV_ACCEPT_TIMEOUT).open()
+    print(f"[+] Pool PASV : {PASV_POOL.stats()['size']} ports "
+          f"({lo}-{hi}), accept_timeout={PASV_ACCEPT_TIMEOUT}s")
+
+    # Le tube vers le parent (forward_to) et le thread d'écriture doivent
+    # exister avant le filtre : il interdit toute nouvelle ouverture en écriture.
+    LOG_SINK.start()
+    AUTH_STATS.start(str(worker))
+    enable_seccomp_block_put()
+
+    asyncio.run(serve(listen_sock, worker))
+
+
+def start_server(workers=None):
+    workers = max(WORKERS if workers is None else workers, 1)
+    try:
+        pasv_range(0, workers)              # au moins un port PASV par worker
+    except ValueError as e:
+        sys.exit(f"[-] ERREUR: {e}")
+    raise_nofile_limit()
+    listen_sock = make_listen_socket()
+
+    # ---------- Pré-fork : le parent ne sert aucun client ----------
+    # Même avec un seul worker : les workers sandboxés ne peuvent ni créer
+    # de segment ni tronquer le log, ils envoient leurs événements au parent
+    # par un tube et c'est lui qui écrit le fichier et le fait tourner.
+    children = {}
+    relays = []
+    stopping = False
+
+    def spawn(worker):
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                os.close(r)
+                LOG_SINK.forward_to(w)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                flush_on_sigterm()
+                run_worker(listen_sock, worker, workers)
+            except (SystemExit, KeyboardInterrupt):
+                pass
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                auth_stats.close_all()      # os._exit : pas d'atexit
+                close_all()
+                os._exit(code)
+        os.close(w)
+        relays.append(LOG_SINK.relay(r))
+        children[pid] = worker
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for worker in range(workers):
+        spawn(worker)
+    print(f"[+] {workers} workers FTP pré-forkés : {sorted(children)}")
+    LOG_SINK.start()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        worker = children.pop(pid, None)
+        if worker is None or stopping:
+            continue
+        print(f"[!] Worker FTP {worker} (pid {pid}) terminé (status {status}), relance",
+              file=sys.stderr)
+        time.sleep(0.5)
+        spawn(worker)
 
-    while True:
-        conn, addr = server.accept()
-        threading.Thread(target=handle_client, args=(conn, addr)).start()
+    # Dernières lignes des workers arrêtés, avant la fermeture du log (atexit)
+    for relay in relays:
+        relay.join(5.0)
 
 
 if __name__ == "__main__":
+    flush_on_sigterm()
     start_server()
@@ -0,0 +1,122 @@
+# ftp_pasv.py
+"""
+Pool de ports passifs pré-ouverts pour le honeypot FTP.
+
+Au démarrage, chaque port de la plage configurée est bindé et mis en
+écoute une seule fois ; un PASV emprunte un socket au pool et le rend
+après le transfert (ou à la fin de la session). Plus de socket/bind/listen
+par commande, et l'attente du client sur le port de données est bornée.
+"""
+import asyncio
+import logging
+import socket
+from collections import deque
+
+DEFAULT_ACCEPT_TIMEOUT = 30.0
+
+
+class PassivePortPool:
+    def __init__(self, host, port_min, port_max, accept_timeout=DEFAULT_ACCEPT_TIMEOUT):
+        self.host = host
+        self.port_min = port_min
+        self.port_max = port_max
+        self.accept_timeout = accept_timeout
+        self._free = deque()
+        self._all = {}
+        # Métriques
+        self.acquired = 0
+        self.exhausted = 0
+        self.accept_timeouts = 0
+        self.foreign_rejected = 0
+        self.bind_failures = 0
+
+    # ------------------------------------------------------------
+    #   Ouverture / fermeture
+    # ------------------------------------------------------------
+
+    def open(self):
+        """Bind + listen de toute la plage (les ports occupés sont ignorés)."""
+        for port in range(self.port_min, self.port_max + 1):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                s.bind((self.host, port))
+                s.listen(8)
+                s.setblocking(False)
+            except OSError as e:
+                s.close()
+                self.bind_failures += 1
+                logging.debug("Port passif %d indisponible: %s", port, e)
+                continue
+            self._all[s.fileno()] = s
+            self._free.append(s)
+        if not self._all:
+            raise OSError(f"aucun port passif disponible dans {self.port_min}-{self.port_max}")
+        return self
+
+    def close(self):
+        for s in self._all.values():
+            s.close()
+        self._all.clear()
+        self._free.clear()
+
+    # ------------------------------------------------------------
+    #   Emprunt / restitution
+    # ------------------------------------------------------------
+
+    def acquire(self):
+        """Retourne un socket d'écoute libre, ou None si le pool est épuisé."""
+        if not self._free:
+            self.exhausted += 1
+            return None
+        self.acquired += 1
+        return self._free.popleft()
+
+    def release(self, sock):
+        """Rend un socket au pool après avoir jeté les connexions en attente."""
+        if sock is None or sock.fileno() not in self._all:
+            return
+        while True:
+            try:
+                stray, _ = sock.accept()
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break
+            stray.close()
+        self._free.append(sock)
+
+    async def accept(self, sock, client_ip):
+        """
+        Attend la connexion de données du client (au plus accept_timeout).
+        Les connexions venant d'une autre IP que celle de la session de
+        contrôle sont refusées (vol de connexion passive).
+        Lève asyncio.TimeoutError si le client ne vient pas.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.accept_timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self.accept_timeouts += 1
+                raise asyncio.TimeoutError
+            try:
+                conn, addr = await asyncio.wait_for(loop.sock_accept(sock), remaining)
+            except asyncio.TimeoutError:
+                self.accept_timeouts += 1
+                raise
+            if addr[0] == client_ip:
+                return conn
+            self.foreign_rejected += 1
+            conn.close()
+
+    def stats(self):
+        return {
+            "size": len(self._all),
+            "free": len(self._free),
+            "acquired": self.acquired,
+            "exhausted": self.exhausted,
+            "accept_timeouts": self.accept_timeouts,
+            "foreign_rejected": self.foreign_rejected,
+            "bind_failures": self.bind_failures,
+        }
@@ -0,0 +1,42 @@
+# gunicorn.conf.py
+"""
+Configuration gunicorn du honeypot e-commerce (app.py via wsgi.py).
+
+Modèle pré-fork : un maître qui importe l'application une seule fois
+(preload_app) puis forke ECOM_WORKERS workers, chacun servant
+ECOM_THREADS requêtes en parallèle (worker gthread). Chaque worker a son
+propre pool SQLite (db.py) et son propre thread d'écriture du log JSON
+(event_sink.py, écritures verrouillées entre processus).
+"""
+import multiprocessing
+import os
+
+import event_sink
+
+bind = os.environ.get("ECOM_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("ECOM_WORKERS", str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class = "gthread"
+threads = int(os.environ.get("ECOM_THREADS", "4"))
+keepalive = int(os.environ.get("ECOM_KEEPALIVE", "5"))          # secondes
+backlog = int(os.environ.get("ECOM_BACKLOG", "2048"))
+timeout = int(os.environ.get("ECOM_WORKER_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("ECOM_GRACEFUL_TIMEOUT", "10"))
+
+# Recyclage des workers (0 = jamais) avec un peu d'aléa pour qu'ils ne
+# redémarrent pas tous en même temps
+max_requests = int(os.environ.get("ECOM_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+# init_db() et l'ouverture du log se font une fois dans le maître
+preload_app = True
+
+# Les accès sont déjà tracés en JSON par l'application
+accesslog = None
+errorlog = "-"
+loglevel = os.environ.get("ECOM_LOG_LEVEL", "info")
+proc_name = "ecom-honeypot"
+
+
+def worker_exit(server, worker):
+    # Écrit les derniers lots du worker avant sa sortie
+    event_sink.close_all()
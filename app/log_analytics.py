@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+# log_analytics.py
+"""
+Statistiques hors ligne sur les logs JSON des honeypots, sans la stack ELK.
+
+Les logs (mêmes fichiers que logstash.conf / log_shipper.py) sont lus une
+fois et rangés dans un cache en colonnes, un dossier par service :
+
+    logs/.analytics/ssh_paramiko/meta.json      lignes, position de lecture
+    logs/.analytics/ssh_paramiko/ts.f8          horodatages (epoch, float64)
+    logs/.analytics/ssh_paramiko/ip.u4          codes (uint32) ...
+    logs/.analytics/ssh_paramiko/ip.dict        ... et leur dictionnaire (JSON, une valeur par ligne)
+
+Colonnes codées : event (event_type / eventid), ip, user, password ; le
+code 0 est la valeur absente. Chaque exécution n'ajoute que les octets
+écrits depuis la précédente (points de reprise de log_shipper.Source,
+rotations comprises) ; au premier passage, les segments déjà tournés
+(log_rotation.py) sont lus aussi. Les requêtes (top, timeline) sont des
+bincount / unique NumPy sur les colonnes chargées en mémoire.
+
+Usage :
+    python log_analytics.py update
+    python log_analytics.py top ip|user|password|cred|event [-k 20] [--service ssh_paramiko]
+    python log_analytics.py timeline [--bucket 60] [--event login_attempt]
+    python log_analytics.py stats
+Options communes : --logs DOSSIER, --cache DOSSIER, --since / --until (ISO 8601), --no-update
+
+Variables d'environnement :
+    ANALYTICS_CACHE    dossier du cache en colonnes (défaut: <logs>/.analytics)
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+import log_rotation
+import log_shipper
+
+CACHE_DIR = os.environ.get("ANALYTICS_CACHE", os.path.join(log_shipper.LOG_DIR, ".analytics"))
+CODED = ("event", "ip", "user", "password")
+CHUNK_ROWS = 100000         # lignes converties en tableaux puis ajoutées au cache d'un coup
+FTP_SESSIONS_KEPT = 10000   # USER en attente de leur PASS, gardés d'une exécution à l'autre
+
+loads = log_shipper.loads
+
+
+# ============================================================
+#   EXTRACTION DES CHAMPS
+# ============================================================
+
+def _text(value):
+    if value is None or value == "":
+        return None
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def extract(doc, ftp_users):
+    """(ts, event, ip, user, password) d'un événement, quel que soit le honeypot."""
+    raw = doc.get("@timestamp") or doc.get("timestamp")
+    ts = log_rotation.parse_time(raw) if isinstance(raw, str) else None
+    event = doc.get("event_type") or doc.get("eventid")
+    ip = doc.get("source_ip") or doc.get("src_ip")
+    user = doc.get("username")
+    password = doc.get("password")
+    form = doc.get("form")
+    if user is None and isinstance(form, dict):
+        # Honeypot HTTP : identifiants saisis dans les formulaires
+        user = form.get("username")
+        password = form.get("password")
+    command = doc.get("command")
+    if doc.get("honeypot_type") == "ftp" and isinstance(command, str):
+        # FTP : USER puis PASS sur deux lignes, reliés par la session ; seule
+        # la ligne PASS porte l'identifiant (un USER sans PASS n'est pas une tentative)
+        verb, _, arg = command.partition(" ")
+        verb = verb.upper()
+        session = doc.get("session_id")
+        if verb == "USER":
+            user = None
+            ftp_users[session] = arg
+        elif verb == "PASS":
+            user = ftp_users.pop(session, None)
+            password = arg
+    return (ts if ts is not None else np.nan, _text(event), _text(ip), _text(user), _text(password))
+
+
+# ============================================================
+#   CACHE EN COLONNES (un dossier par service)
+# ============================================================
+
+class Dictionary:
+    """Valeurs distinctes d'une colonne ; code = rang d'apparition (0 = absent)."""
+
+    def __init__(self, path, size=1):
+        self.path = path
+        self.values = [None]
+        self.codes = {}
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    if len(self.values) >= size:
+                        break
+                    value = loads(line)
+                    self.codes[value] = len(self.values)
+                    self.values.append(value)
+        self._new = []
+
+    def encode(self, value):
+        if value is None:
+            return 0
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+            self._new.append(value)
+        return code
+
+    def save(self):
+        if self._new:
+            with open(self.path, "ab") as f:
+                f.write(b"".join(json.dumps(v, ensure_ascii=False).encode("utf-8") + b"\n"
+                                 for v in self._new))
+            self._new = []
+
+
+class ColumnStore:
+    """
+    Cache d'une source. Les colonnes sont écrites avant meta.json : après
+    une interruption, ce qui dépasse le nombre de lignes de meta.json est
+    coupé au chargement, puis relu depuis le point de reprise.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.meta = self._load_meta()
+        rows = self.meta["rows"]
+        self._truncate("ts.f8", rows * 8)
+        for name in CODED:
+            self._truncate(name + ".u4", rows * 4)
+        self.dicts = {name: Dictionary(self._path(name + ".dict"), self.meta["dict_sizes"].get(name, 1))
+                      for name in CODED}
+        for name, d in self.dicts.items():
+            self._rewrite_dict(name, d)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load_meta(self):
+        try:
+            with open(self._path("meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"rows": 0, "checkpoint": None, "started": False, "dict_sizes": {}, "ftp_users": {}}
+
+    def _truncate(self, name, size):
+        path = self._path(name)
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            os.truncate(path, size)
+
+    def _rewrite_dict(self, name, d):
+        # Valeurs ajoutées par une exécution interrompue avant meta.json
+        expected = self.meta["dict_sizes"].get(name, 1) - 1
+        with open(d.path, "ab+") as f:
+            f.seek(0)
+            count = sum(1 for _ in f)
+        if count > expected:
+            with open(d.path, "wb") as f:
+                f.write(b"".join(json.dumps(v, ensure_ascii=False).encode("utf-8") + b"\n"
+                                 for v in d.values[1:]))
+
+    def append(self, rows):
+        """rows : [(ts, event, ip, user, password)] ; rien n'est visible avant commit()."""
+        if not rows:
+            return
+        ts = np.fromiter((r[0] for r in rows), dtype=np.float64, count=len(rows))
+        with open(self._path("ts.f8"), "ab") as f:
+            f.write(ts.tobytes())
+        for i, name in enumerate(CODED, start=1):
+            encode = self.dicts[name].encode
+            codes = np.fromiter((encode(r[i]) for r in rows), dtype=np.uint32, count=len(rows))
+            with open(self._path(name + ".u4"), "ab") as f:
+                f.write(codes.tobytes())
+        self.meta["rows"] += len(rows)
+
+    def commit(self, checkpoint, ftp_users):
+        for d in self.dicts.values():
+            d.save()
+        self.meta["checkpoint"] = checkpoint
+        self.meta["started"] = True
+        self.meta["dict_sizes"] = {name: len(d.values) for name, d in self.dicts.items()}
+        self.meta["ftp_users"] = dict(list(ftp_users.items())[-FTP_SESSIONS_KEPT:])
+        tmp = self._path("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self._path("meta.json"))
+
+    def load(self):
+        """{"ts": float64[], "event": uint32[], ...} (mmap en lecture seule) et dictionnaires."""
+        rows = self.meta["rows"]
+        columns = {"ts": self._map("ts.f8", np.float64, rows)}
+        for name in CODED:
+            columns[name] = self._map(name + ".u4", np.uint32, rows)
+        return columns, {name: d.values for name, d in self.dicts.items()}
+
+    def _map(self, name, dtype, rows):
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._path(name), dtype=dtype, mode="r", shape=(rows,))
+
+
+def _segment_lines(path):
+    for _number, segment in log_rotation.segment_paths(path):
+        with log_rotation.open_segment(segment) as f:
+            yield from f
+
+
+def update_source(log_path, store):
+    """Ajoute au cache les lignes écrites depuis le dernier passage ; retourne leur nombre."""
+    meta = store.meta
+    ftp_users = dict(meta.get("ftp_users") or {})
+    checkpoint = meta["checkpoint"]
+    added = 0
+    rows = []
+
+    def parse(line):
+        try:
+            doc = loads(line)
+        except ValueError:
+            return None
+        return extract(doc, ftp_users) if isinstance(doc, dict) else None
+
+    if not meta["started"]:
+        # Premier passage : l'historique déjà tourné, puis le fichier actif
+        # à partir du dernier segment vu maintenant
+        segments = log_rotation.segment_paths(log_path)
+        try:
+            inode = os.stat(log_path).st_ino
+        except FileNotFoundError:
+            inode = None
+        for line in _segment_lines(log_path):
+            row = parse(line)
+            if row is not None:
+                rows.append(row)
+            if len(rows) >= CHUNK_ROWS:
+                store.append(rows)
+                added += len(rows)
+                rows = []
+        # inode None : fichier actif pas encore recréé après une rotation
+        checkpoint = {"inode": inode, "segment": segments[-1][0] if segments else 0, "offset": 0}
+
+    source = log_shipper.Source(log_path, None, None, checkpoint)
+    while True:
+        lines = source.read(log_shipper.READ_CHUNK, CHUNK_ROWS)
+        if not lines:
+            break
+        for line, position in lines:
+            row = parse(line)
+            if row is not None:
+                rows.append(row)
+            checkpoint = position
+        if len(rows) >= CHUNK_ROWS:
+            store.append(rows)
+            added += len(rows)
+            rows = []
+            store.commit(checkpoint, ftp_users)
+    if source.skipped:
+        logging.warning("%s : %d lignes de plus de %d octets ignorées",
+                        log_path, source.skipped, log_shipper.MAX_LINE)
+    if source.cursor is not None:
+        # Tout ce qui a été lu est traité : la reprise passe aussi les lignes ignorées
+        checkpoint = dict(source.cursor)
+    store.append(rows)
+    added += len(rows)
+    store.commit(checkpoint, ftp_users)
+    return added
+
+
+# ============================================================
+#   REQUÊTES
+# ============================================================
+
+class Table:
+    """Colonnes de plusieurs services concaténées, dictionnaires fusionnés."""
+
+    def __init__(self, stores):
+        self.services = list(stores)
+        self.values = {name: [None] for name in CODED}
+        parts = {name: [] for name in ("ts", "service") + CODED}
+        codes = {name: {} for name in CODED}
+        for number, (service, store) in enumerate(stores.items()):
+            columns, dicts = store.load()
+            parts["ts"].append(columns["ts"])
+            parts["service"].append(np.full(len(columns["ts"]), number, dtype=np.uint8))
+            for name in CODED:
+                # Codes du service -> codes communs (table de correspondance vectorisée)
+                remap = np.zeros(len(dicts[name]), dtype=np.uint32)
+                merged, values = codes[name], self.values[name]
+                for code, value in enumerate(dicts[name][1:], start=1):
+                    target = merged.get(value)
+                    if target is None:
+                        target = merged[value] = len(values)
+                        values.append(value)
+                    remap[code] = target
+                parts[name].append(remap[columns[name]])
+        self.columns = {name: np.concatenate(arrays) if arrays else np.empty(0)
+                        for name, arrays in parts.items()}
+
+    def __len__(self):
+        return len(self.columns["ts"])
+
+    def mask(self, since=None, until=None, services=None, event=None):
+        ts = self.columns["ts"]
+        mask = np.ones(len(ts), dtype=bool)
+        if since is not None:
+            mask &= ts >= since
+        if until is not None:
+            mask &= ts < until
+        if services:
+            wanted = [self.services.index(s) for s in services if s in self.services]
+            mask &= np.isin(self.columns["service"], wanted)
+        if event is not None:
+            try:
+                mask &= self.columns["event"] == self.values["event"].index(event)
+            except ValueError:
+                mask[:] = False
+        return mask
+
+    def top(self, field, k=10, mask=None):
+        """[(valeur, nombre)] des k valeurs les plus fréquentes (field="cred" : couples user:password)."""
+        if field == "cred":
+            user, password = self.columns["user"], self.columns["password"]
+            keep = (user != 0) & (password != 0)
+            if mask is not None:
+                keep &= mask
+            pairs = (user[keep].astype(np.uint64) << np.uint64(32)) | password[keep]
+            keys, counts = np.unique(pairs, return_counts=True)
+            top = []
+            for i in _top_indices(counts, k):
+                key = int(keys[i])
+                top.append((f"{self.values['user'][key >> 32]}:{self.values['password'][key & 0xFFFFFFFF]}",
+                            int(counts[i])))
+            return top
+        codes = self.columns[field] if mask is None else self.columns[field][mask]
+        counts = np.bincount(codes, minlength=len(self.values[field]))
+        counts[0] = 0
+        return [(self.values[field][i], int(counts[i])) for i in _top_indices(counts, k) if counts[i]]
+
+    def timeline(self, bucket=60, mask=None):
+        """(début des tranches, {service: nombre d'événements par tranche})."""
+        ts, service = self.columns["ts"], self.columns["service"]
+        keep = ~np.isnan(ts)
+        if mask is not None:
+            keep &= mask
+        slots = (ts[keep] // bucket).astype(np.int64)
+        if not len(slots):
+            return np.empty(0), {}
+        first = slots.min()
+        width = int(slots.max() - first) + 1
+        counts = np.bincount((slots - first) * len(self.services) + service[keep],
+                             minlength=width * len(self.services)).reshape(width, len(self.services))
+        starts = (np.arange(width) + first) * bucket
+        used = counts.any(axis=1)
+        return starts[used], {s: counts[used, i] for i, s in enumerate(self.services) if counts[:, i].any()}
+
+
+def _top_indices(counts, k):
+    if len(counts) > k:
+        candidates = np.argpartition(counts, -k)[-k:]
+    else:
+        candidates = np.arange(len(counts))
+    return candidates[np.argsort(counts[candidates], kind="stable")[::-1]]
+
+
+def open_table(log_dir=log_shipper.LOG_DIR, cache_dir=CACHE_DIR, services=None, update=True):
+    """Table des services demandés (tous par défaut), après mise à jour du cache."""
+    stores = {}
+    for name, service, _tag in log_shipper.SOURCES:
+        if services and service not in services:
+            continue
+        log_path = os.path.join(log_dir, name)
+        directory = os.path.join(cache_dir, service)
+        if not os.path.exists(directory) and not os.path.exists(log_path) \
+                and not log_rotation.segment_paths(log_path):
+            continue
+        store = ColumnStore(directory)
+        if update:
+            added = update_source(log_path, store)
+            if added:
+                logging.info("%s : %d événements ajoutés au cache", service, added)
+        stores[service] = store
+    return Table(stores)
+
+
+# ============================================================
+#   CLI
+# ============================================================
+
+def _epoch(text):
+    if text is None:
+        return None
+    ts = log_rotation.parse_time(text)
+    if ts is None:
+        raise SystemExit(f"date invalide : {text}")
+    return ts
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Statistiques en colonnes sur les logs des honeypots")
+    parser.add_argument("--logs", default=log_shipper.LOG_DIR)
+    parser.add_argument("--cache", default=CACHE_DIR)
+    parser.add_argument("--no-update", action="store_true", help="interroger le cache sans lire les logs")
+    parser.add_argument("--service", action="append", help="ftp, ssh_paramiko, http_ecom, ssh_cowrie")
+    parser.add_argument("--since")
+    parser.add_argument("--until")
+    parser.add_argument("--event", help="ne garder qu'un type d'événement")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("update")
+    sub.add_parser("stats")
+    p_top = sub.add_parser("top")
+    p_top.add_argument("field", choices=CODED + ("cred",))
+    p_top.add_argument("-k", type=int, default=10)
+    p_timeline = sub.add_parser("timeline")
+    p_timeline.add_argument("--bucket", type=int, default=60, help="taille des tranches en secondes")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+
+    table = open_table(args.logs, args.cache, args.service, update=not args.no_update)
+    mask = table.mask(_epoch(args.since), _epoch(args.until), args.service, args.event)
+
+    if args.cmd == "update":
+        print(f"{len(table)} événements en cache ({', '.join(table.services)})")
+    elif args.cmd == "stats":
+        for number, service in enumerate(table.services):
+            keep = mask & (table.columns["service"] == number)
+            ts = table.columns["ts"][keep]
+            ts = ts[~np.isnan(ts)]
+            span = f"{_iso(ts.min())} -> {_iso(ts.max())}" if len(ts) else "-"
+            ips = len(np.unique(table.columns["ip"][keep]))
+            print(f"{service:14} {int(keep.sum()):10} événements  {ips:8} IP  {span}")
+    elif args.cmd == "top":
+        for value, count in table.top(args.field, args.k, mask):
+            print(f"{count:10}  {value}")
+    else:
+        starts, series = table.timeline(args.bucket, mask)
+        print("tranche".ljust(21) + "".join(f"{s:>14}" for s in series))
+        for i, start in enumerate(starts):
+            print(_iso(start).ljust(21) + "".join(f"{counts[i]:14}" for counts in series.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# log_rotation.py
+"""
+Rotation des logs JSON des honeypots (écrits par event_sink.py) en
+segments numérotés compressés, avec un index pour lire une plage horaire.
+
+    logs/honeypot_ssh.log              fichier actif (suivi par Logstash)
+    logs/honeypot_ssh.log.000001       segment fermé, pas encore compressé
+    logs/honeypot_ssh.log.000001.gz    segments fermés (gzip multi-membres)
+    logs/honeypot_ssh.log.index        une ligne JSON par segment
+
+Rotation : dès que le fichier actif dépasse LOG_ROTATE_BYTES ou que la
+dernière rotation date de plus de LOG_ROTATE_SECONDS, il est renommé en
+segment suivant, sous le verrou lockf des écrivains ; chaque écrivain
+(event_sink.py) rouvre alors un nouveau fichier actif. Rien n'est copié ni
+tronqué : un lecteur qui suit le fichier par son inode (Logstash, qui
+surveille aussi les segments bruts, log_shipper.py) finit de lire les
+lignes qu'il n'avait pas encore lues dans le segment. Les workers FTP
+sandboxés, qui ne peuvent pas rouvrir de fichier, passent par leur parent
+(EventSink.forward_to).
+
+Compression : LOG_COMPRESS_DELAY secondes après la rotation (le temps que
+Logstash finisse le segment brut), un thread de fond réécrit chaque
+segment en gzip, un membre par bloc de LOG_INDEX_EVERY événements. L'index note pour chaque bloc son
+offset dans le .gz et ses horodatages min/max : une lecture par plage
+horaire ne décompresse que les blocs concernés (gzip -dc lit toujours le
+segment entier).
+
+Format d'une ligne de l'index :
+    {"segment": "honeypot_ssh.log.000001.gz", "events": 52000,
+     "bytes": 16777216, "first": 1714557600.0, "last": 1714561200.0,
+     "blocks": [[offset_gz, n° du 1er événement, ts min, ts max], ...]}
+
+Lecture :
+    python log_rotation.py list ../logs/honeypot_ssh.log
+    python log_rotation.py cat  ../logs/honeypot_ssh.log [--since 2024-05-01T10:00] [--until ...]
+"""
+import argparse
+import errno
+import fcntl
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+ROTATE_BYTES = int(os.environ.get("LOG_ROTATE_BYTES", str(64 * 1024 * 1024)))     # 0 = pas de limite
+ROTATE_SECONDS = float(os.environ.get("LOG_ROTATE_SECONDS", "86400"))             # 0 = pas de limite
+INDEX_EVERY = int(os.environ.get("LOG_INDEX_EVERY", "1000"))
+COMPRESS_DELAY = float(os.environ.get("LOG_COMPRESS_DELAY", "60"))
+COMPRESS_LEVEL = 6
+
+_TS_RE = re.compile(rb'"@?timestamp"\s*:\s*"([^"]+)"')
+
+
+def parse_ts(line):
+    """Horodatage (epoch) du champ "@timestamp"/"timestamp" d'une ligne JSON, ou None."""
+    m = _TS_RE.search(line)
+    if m is None:
+        return None
+    return parse_time(m.group(1).decode("ascii", errors="replace"))
+
+
+def parse_time(text):
+    """ISO 8601 ("Z", "+0000", "+00:00" ou heure locale) -> epoch, ou None."""
+    if text.endswith("Z"):
+        text = text[:-1] + "+00:00"
+    try:
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        return None
+
+
+def segment_paths(path):
+    """[(numéro, chemin)] des segments existants (compressés ou non), triés."""
+    directory = os.path.dirname(path) or "."
+    pattern = re.compile(re.escape(os.path.basename(path)) + r"\.(\d{6})(\.gz)?$")
+    found = {}
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        m = pattern.match(name)
+        if m:
+            number = int(m.group(1))
+            # Un segment compressé remplace sa version brute
+            if m.group(2) or number not in found:
+                found[number] = os.path.join(directory, name)
+    return sorted(found.items())
+
+
+# ============================================================
+#   ROTATION (appelée par event_sink sous le verrou du fichier)
+# ============================================================
+
+class Rotator:
+    def __init__(self, path, max_bytes=ROTATE_BYTES, max_age=ROTATE_SECONDS, index_every=INDEX_EVERY,
+                 compress_delay=COMPRESS_DELAY):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.index_every = index_every
+        self.compress_delay = compress_delay
+        self.enabled = max_bytes > 0 or max_age > 0
+        self.marker = path + ".rotated"         # mtime = dernière rotation
+        self.index_path = path + ".index"
+        self._queue = queue.Queue()
+        self._thread = None
+        self._closing = threading.Event()   # close() : plus d'attente avant compression
+        self.rotations = 0
+        self.compressed = 0
+
+    def check(self, fd):
+        """
+        Fait tourner le fichier si nécessaire ; True si `fd` n'est plus le
+        fichier actif (à rouvrir). L'appelant tient le verrou lockf sur `fd`,
+        qui est le fichier actif.
+        """
+        if not self.enabled:
+            return False
+        try:
+            if not self._due(fd):
+                return False
+            self._rotate(fd)
+        except OSError as e:
+            if e.errno in (errno.EPERM, errno.EACCES, errno.EROFS):
+                # Processus sandboxé ou dossier en lecture seule : un autre
+                # processus (ex. le parent FTP) s'en charge
+                self.enabled = False
+                logging.info("Rotation de %s désactivée dans ce processus : %s", self.path, e)
+            else:
+                logging.error("Rotation de %s impossible : %s", self.path, e)
+            return False
+        return True
+
+    def _due(self, fd):
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return False
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        return bool(self.max_age) and time.time() - self._last_rotation() >= self.max_age
+
+    def _last_rotation(self):
+        try:
+            return os.stat(self.marker).st_mtime
+        except FileNotFoundError:
+            # Premier démarrage : la durée se compte à partir de maintenant
+            with open(self.marker, "a"):
+                pass
+            return time.time()
+
+    def _rotate(self, fd):
+        numbers = [n for n, _ in segment_paths(self.path)]
+        segment = f"{self.path}.{(max(numbers) if numbers else 0) + 1:06d}"
+        # Le fichier actif devient le segment (même inode) : les lignes pas
+        # encore lues par Logstash y restent, à leur offset
+        os.rename(self.path, segment)
+        with open(self.marker, "a"):
+            pass
+        os.utime(self.marker)
+        self.rotations += 1
+        self._compress_later(segment)
+
+    # ------------------------------------------------------------
+    #   Compression en arrière-plan
+    # ------------------------------------------------------------
+
+    def _compress_later(self, segment):
+        if self._thread is None or not self._thread.is_alive():
+            # Segments laissés bruts par un processus arrêté avant la fin
+            for _, path in segment_paths(self.path):
+                if not path.endswith(".gz") and path != segment:
+                    self._queue.put(path)
+            self._thread = threading.Thread(
+                target=self._run,
+                name=f"log-compress:{os.path.basename(self.path)}",
+                daemon=True,
+            )
+            self._thread.start()
+        self._queue.put(segment)
+
+    def _run(self):
+        while True:
+            segment = self._queue.get()
+            if segment is None:
+                return
+            try:
+                # Délai compté depuis la dernière écriture dans le segment
+                wait = os.stat(segment).st_mtime + self.compress_delay - time.time()
+            except FileNotFoundError:
+                wait = 0                # déjà compressé par un autre processus
+            if wait > 0:
+                self._closing.wait(wait)
+            try:
+                if compress_segment(segment, self.index_path, self.index_every):
+                    self.compressed += 1
+            except OSError as e:
+                logging.error("Compression de %s impossible : %s", segment, e)
+
+    def close(self, timeout=10.0):
+        """Laisse au thread de compression le temps de finir la file."""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._closing.set()
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def after_fork_in_child(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._closing = threading.Event()
+
+
+def compress_segment(segment, index_path, index_every=INDEX_EVERY):
+    """
+    Réécrit `segment` en `segment`.gz (un membre gzip par bloc) et ajoute sa
+    ligne à l'index. Retourne False si un autre processus s'en occupe.
+    """
+    gz_path = segment + ".gz"
+    part = gz_path + ".part"
+    with open(part, "ab") as out:
+        try:
+            # Verrou libéré si le processus meurt : pas de .part orphelin bloquant
+            fcntl.lockf(out.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        if os.path.exists(gz_path) or not os.path.exists(segment):
+            # Déjà compressé (peut-être par un processus arrêté avant d'effacer le brut)
+            os.unlink(part)
+            _unlink_quiet(segment)
+            return False
+        out.truncate(0)
+        blocks, events, raw = [], 0, 0
+        with open(segment, "rb") as src:
+            block = []
+            for line in src:
+                block.append(line)
+                if len(block) >= index_every:
+                    blocks.append(_write_block(out, block, events))
+                    events += len(block)
+                    raw += sum(map(len, block))
+                    block = []
+                    time.sleep(0)       # rend le GIL aux threads de service
+            if block:
+                blocks.append(_write_block(out, block, events))
+                events += len(block)
+                raw += sum(map(len, block))
+        stamps = [b[i] for b in blocks for i in (2, 3) if b[i] is not None]
+        entry = {
+            "segment": os.path.basename(gz_path),
+            "events": events,
+            "bytes": raw,
+            "first": min(stamps) if stamps else None,
+            "last": max(stamps) if stamps else None,
+            "blocks": blocks,
+        }
+        with open(index_path, "a") as index:
+            index.write(json.dumps(entry) + "\n")
+        os.rename(part, gz_path)
+    _unlink_quiet(segment)
+    return True
+
+
+def _unlink_quiet(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _write_block(out, lines, first_event):
+    stamps = [ts for ts in map(parse_ts, lines) if ts is not None]
+    offset = out.tell()
+    out.write(gzip.compress(b"".join(lines), compresslevel=COMPRESS_LEVEL))
+    return [offset, first_event,
+            min(stamps) if stamps else None,
+            max(stamps) if stamps else None]
+
+
+# ============================================================
+#   LECTURE
+# ============================================================
+
+def open_segment(segment):
+    """
+    Ouvre un segment en lecture (bytes, décompressé s'il est en .gz). Un
+    segment brut compressé entre segment_paths() et l'ouverture est relu
+    dans son .gz.
+    """
+    if segment.endswith(".gz"):
+        return gzip.open(segment, "rb")
+    try:
+        return open(segment, "rb")
+    except FileNotFoundError:
+        return gzip.open(segment + ".gz", "rb")
+
+
+def read_index(path):
+    """Entrées de l'index des segments compressés existants, par numéro de segment."""
+    entries = {}
+    try:
+        with open(path + ".index") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue            # ligne tronquée
+                entries[entry["segment"]] = entry       # la dernière l'emporte
+    except FileNotFoundError:
+        return []
+    directory = os.path.dirname(path) or "."
+    return [entries[name] for name in sorted(entries)
+            if os.path.exists(os.path.join(directory, name))]
+
+
+def _overlaps(lo, hi, since, until):
+    if lo is None:
+        return True                     # horodatages illisibles : on lit
+    return (since is None or hi >= since) and (until is None or lo <= until)
+
+
+def _in_range(line, since, until):
+    if since is None and until is None:
+        return True
+    ts = parse_ts(line)
+    return ts is None or ((since is None or ts >= since) and (until is None or ts <= until))
+
+
+def iter_lines(path, since=None, until=None):
+    """
+    Lignes (bytes) des segments puis du fichier actif, limitées à
+    [since, until] (epoch) ; seuls les blocs qui chevauchent la plage sont
+    décompressés. Les segments pas encore compressés sont lus en clair.
+    """
+    directory = os.path.dirname(path) or "."
+    indexed = {e["segment"]: e for e in read_index(path)}
+    for _, segment in segment_paths(path):
+        entry = indexed.get(os.path.basename(segment))
+        if entry is None:
+            with open_segment(segment) as f:
+                for line in f:
+                    if _in_range(line, since, until):
+                        yield line
+            continue
+        if not _overlaps(entry["first"], entry["last"], since, until):
+            continue
+        blocks = entry["blocks"]
+        with open(os.path.join(directory, entry["segment"]), "rb") as f:
+            for i, (offset, _first, lo, hi) in enumerate(blocks):
+                if not _overlaps(lo, hi, since, until):
+                    continue
+                end = blocks[i + 1][0] if i + 1 < len(blocks) else None
+                f.seek(offset)
+                data = f.read(end - offset) if end is not None else f.read()
+                for line in gzip.decompress(data).splitlines(keepends=True):
+                    if _in_range(line, since, until):
+                        yield line
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                if _in_range(line, since, until):
+                    yield line
+    except FileNotFoundError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Segments des logs JSON des honeypots")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_list = sub.add_parser("list", help="segments et leur plage horaire")
+    p_list.add_argument("log")
+    p_cat = sub.add_parser("cat", help="événements d'une plage horaire")
+    p_cat.add_argument("log")
+    p_cat.add_argument("--since", help="ISO 8601, ex. 2024-05-01T10:00")
+    p_cat.add_argument("--until")
+    args = parser.parse_args()
+
+    if args.cmd == "list":
+        fmt = lambda ts: datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts is not None else "?"
+        for entry in read_index(args.log):
+            print(f"{entry['segment']:40} {entry['events']:9} évts  {entry['bytes'] / 1048576:8.1f} Mio  "
+                  f"{fmt(entry['first'])} -> {fmt(entry['last'])}  ({len(entry['blocks'])} blocs)")
+        return
+    since = parse_time(args.since) if args.since else None
+    until = parse_time(args.until) if args.until else None
+    out = sys.stdout.buffer
+    for line in iter_lines(args.log, since, until):
+        out.write(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+# log_shipper.py
+"""
+Expéditeur des logs JSON des honeypots vers Elasticsearch, sans Logstash.
+
+Suit les mêmes fichiers que logstash.conf et produit les mêmes documents
+(champs "type" et "tags", index honeypot-<type>-AAAA.MM.jj) :
+
+  - points de reprise persistés (inode + offset + dernier segment vu) dans
+    SHIPPER_STATE, avancés seulement après l'accusé de réception
+    d'Elasticsearch : un redémarrage ne perd ni ne renvoie rien ;
+  - rotation : si le fichier a été renommé en segment (log_rotation.py), la
+    fin non envoyée est relue dans le segment (.gz compris) ; si le fichier
+    a été renommé sans segment (Cowrie), dans l'ancien inode retrouvé dans
+    le dossier ;
+  - requêtes _bulk limitées en octets et en documents, sur une connexion
+    HTTP keep-alive réutilisée ;
+  - nouvelles tentatives avec attente exponentielle (erreur réseau, 429,
+    5xx, et documents refusés temporairement dans la réponse _bulk) ; le
+    _id de chaque document est tiré de sa position dans le fichier, un lot
+    renvoyé après une coupure ne crée donc pas de doublons.
+
+À utiliser à la place de Logstash, pas en plus (chaque événement serait
+indexé deux fois).
+
+Usage :
+    python log_shipper.py [--es http://localhost:9200] [--once]
+
+Variables d'environnement :
+    SHIPPER_ES_URL          URL d'Elasticsearch (défaut: http://elasticsearch:9200),
+                            identifiants possibles : http://elastic:motdepasse@hôte:9200
+    SHIPPER_LOG_DIR         dossier des logs (défaut: ../logs)
+    SHIPPER_STATE           fichier des points de reprise (défaut: <logs>/.shipper_state.json)
+    SHIPPER_BULK_BYTES      taille max d'une requête _bulk (défaut: 5242880)
+    SHIPPER_BULK_DOCS       documents max par requête _bulk (défaut: 1000)
+    SHIPPER_FLUSH_INTERVAL  envoi d'un lot incomplet après ce délai, en s (défaut: 2)
+    SHIPPER_POLL_INTERVAL   attente quand tous les fichiers sont lus, en s (défaut: 0.5)
+    SHIPPER_MAX_LINE        ligne plus longue ignorée (comptée dans skipped), en octets (défaut: 1048576)
+"""
+import argparse
+import base64
+import http.client
+import io
+import itertools
+import json
+import logging
+import os
+import signal
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import event_sink
+import log_rotation
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = os.environ.get("SHIPPER_LOG_DIR", os.path.join(os.path.dirname(BASE_DIR), "logs"))
+ES_URL = os.environ.get("SHIPPER_ES_URL", "http://elasticsearch:9200")
+STATE_FILE = os.environ.get("SHIPPER_STATE", os.path.join(LOG_DIR, ".shipper_state.json"))
+BULK_BYTES = int(os.environ.get("SHIPPER_BULK_BYTES", str(5 * 1024 * 1024)))
+BULK_DOCS = int(os.environ.get("SHIPPER_BULK_DOCS", "1000"))
+FLUSH_INTERVAL = float(os.environ.get("SHIPPER_FLUSH_INTERVAL", "2"))
+POLL_INTERVAL = float(os.environ.get("SHIPPER_POLL_INTERVAL", "0.5"))
+HTTP_TIMEOUT = 30.0
+READ_CHUNK = 256 * 1024
+MAX_LINE = int(os.environ.get("SHIPPER_MAX_LINE", str(1024 * 1024)))
+RETRY_BASE = 0.5            # première attente (s), doublée à chaque échec
+RETRY_MAX = 30.0
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+loads = event_sink.orjson.loads if event_sink.orjson is not None else json.loads
+
+# (fichier, type, tag) : mêmes valeurs que logstash.conf
+SOURCES = [
+    ("honeypot_ftp.log", "ftp", "ftp_honeypot"),
+    ("honeypot_ssh.log", "ssh_paramiko", "ssh_honeypot"),
+    ("ecom_honeypot.log", "http_ecom", "http_honeypot"),
+    ("cowrie.json", "ssh_cowrie", "cowrie"),
+]
+
+
+# ============================================================
+#   LECTURE DES FICHIERS (avec reprise)
+# ============================================================
+#
+# Une position est {"inode", "segment", "offset"} : inode du fichier lu,
+# numéro du dernier segment existant à ce moment, offset après la dernière
+# ligne lue. Après une rotation par segment, la suite des lignes de la
+# position (segment=N, offset=X) est dans le segment N+1 à partir de X.
+# Après la lecture des segments, "inode" vaut None jusqu'à la lecture du
+# nouveau fichier actif : seul le numéro de segment le désigne.
+
+class Source:
+    """Un fichier suivi : `cursor` est la position de lecture, en avance sur la reprise."""
+
+    def __init__(self, path, doc_type, tag, checkpoint=None):
+        self.path = path
+        self.type = doc_type
+        self.tag = tag
+        self.checkpoint = checkpoint
+        self.cursor = dict(checkpoint) if checkpoint else None
+        self._backlog = None        # générateur des lignes restées dans un segment / ancien inode
+        self.skipped = 0            # lignes de plus de MAX_LINE octets, ignorées
+
+    def _latest_segment(self):
+        segments = log_rotation.segment_paths(self.path)
+        return segments[-1][0] if segments else 0
+
+    def read(self, max_bytes, max_lines):
+        """[(ligne, position après la ligne)] — lignes complètes uniquement."""
+        if self._backlog is not None:
+            lines = list(itertools.islice(self._backlog, max_lines))
+            if lines:
+                return lines
+            self._backlog = None
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None               # renommé en segment, pas encore recréé
+        # Segments listés après le stat : une rotation entre les deux est vue
+        # comme un nouveau segment, jamais comme un simple changement d'inode
+        segment = self._latest_segment()
+        cur = self.cursor
+        if cur is not None and segment > cur["segment"]:
+            # Renommé en un ou plusieurs segments (log_rotation.py)
+            self._backlog = self._drain_segments(cur, segment)
+            self.cursor = {"inode": None, "segment": segment, "offset": 0}
+            return self.read(max_bytes, max_lines)
+        if st is None:
+            return []
+        if cur is None:
+            # Fichier jamais lu : depuis le début (start_position => "beginning")
+            cur = self.cursor = {"inode": st.st_ino, "segment": segment, "offset": 0}
+        elif cur["inode"] is None:
+            cur["inode"] = st.st_ino
+        elif cur["inode"] != st.st_ino:
+            # Renommé puis recréé sans segment (rotation de Cowrie) : finir l'ancien inode
+            self._backlog = self._drain_renamed(cur)
+            self.cursor = {"inode": st.st_ino, "segment": segment, "offset": 0}
+            return self.read(max_bytes, max_lines)
+        if st.st_size < cur["offset"]:
+            logging.warning("%s tronqué sans segment : reprise au début", self.path)
+            cur["offset"] = 0
+        if st.st_size == cur["offset"]:
+            return []
+
+        size = min(max_bytes, READ_CHUNK)
+        long_line = None
+        with open(self.path, "rb") as f:
+            f.seek(cur["offset"])
+            data = f.read(size)
+            end = data.rfind(b"\n")
+            if end < 0 and len(data) == size:
+                # Ligne plus longue qu'un bloc : lue jusqu'à son \n
+                long_line = self._read_long_line(f, cur["offset"])
+        if self._latest_segment() != segment:
+            return []               # rotation pendant la lecture : repris depuis le segment
+        if long_line is not None:
+            line, offset = long_line
+            if line is None:
+                self._skip(offset - cur["offset"])
+                cur["offset"] = offset
+                return self.read(max_bytes, max_lines)
+            cur["offset"] = offset
+            return [(line, {"inode": st.st_ino, "segment": segment, "offset": offset})]
+        if end < 0:
+            return []               # ligne en cours d'écriture
+        lines = []
+        offset = cur["offset"]
+        for line in itertools.islice(io.BytesIO(memoryview(data)[:end + 1]), max_lines):
+            offset += len(line)
+            lines.append((line, {"inode": st.st_ino, "segment": segment, "offset": offset}))
+        cur["offset"] = offset
+        return lines
+
+    def _read_long_line(self, f, start):
+        """
+        (ligne, offset après elle) pour une ligne commençant à `start`, avec
+        ligne = None si elle dépasse MAX_LINE ; None si son \\n n'est pas
+        encore écrit. Une ligne trop longue n'est pas gardée en mémoire.
+        """
+        f.seek(start)
+        parts = []
+        size = 0
+        while True:
+            block = f.read(READ_CHUNK)
+            if not block:
+                return None
+            newline = block.find(b"\n")
+            if newline >= 0:
+                block = block[:newline + 1]
+            size += len(block)
+            if size <= MAX_LINE:
+                parts.append(block)
+            else:
+                parts = None
+            if newline >= 0:
+                return (b"".join(parts) if parts is not None else None), start + size
+
+    def _skip(self, size):
+        self.skipped += 1
+        logging.warning("%s : ligne de %d octets ignorée (SHIPPER_MAX_LINE=%d)", self.path, size, MAX_LINE)
+
+    def _complete_lines(self, f, offset, position):
+        """(ligne, position) des lignes complètes de `f` à partir de `offset`."""
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            offset += len(line)
+            if len(line) > MAX_LINE:
+                self._skip(len(line))
+                continue
+            yield line, dict(position, offset=offset)
+
+    def _drain_segments(self, cur, latest):
+        for number, path in log_rotation.segment_paths(self.path):
+            if number <= cur["segment"] or number > latest:
+                continue
+            offset = cur["offset"] if number == cur["segment"] + 1 else 0
+            with log_rotation.open_segment(path) as f:
+                f.seek(offset)
+                yield from self._complete_lines(f, offset, {"inode": cur["inode"], "segment": number - 1})
+
+    def _drain_renamed(self, cur):
+        directory = os.path.dirname(self.path) or "."
+        prefix = os.path.basename(self.path)
+        for entry in os.scandir(directory):
+            if entry.name.startswith(prefix) and entry.is_file() and entry.inode() == cur["inode"]:
+                with open(entry.path, "rb") as f:
+                    f.seek(cur["offset"])
+                    yield from self._complete_lines(f, cur["offset"], {"inode": cur["inode"], "segment": cur["segment"]})
+                return
+        logging.warning("%s : ancien fichier (inode %s) introuvable", self.path, cur["inode"])
+
+
+# ============================================================
+#   DOCUMENTS ET INDEX
+# ============================================================
+
+def make_document(line, source):
+    """(index, document) d'une ligne JSON, comme le codec json de Logstash."""
+    try:
+        doc = loads(line)
+        if not isinstance(doc, dict):
+            raise ValueError("pas un objet JSON")
+        tags = []
+    except ValueError:
+        doc = {"message": line.decode("utf-8", errors="replace").rstrip("\n")}
+        tags = ["_jsonparsefailure"]
+    ts = None
+    for field in ("@timestamp", "timestamp"):
+        if ts is None and isinstance(doc.get(field), str):
+            ts = log_rotation.parse_time(doc[field])
+    when = datetime.fromtimestamp(ts if ts is not None else time.time(), timezone.utc)
+    doc["@timestamp"] = when.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+    doc["type"] = source.type
+    previous = doc.get("tags")
+    doc["tags"] = (previous if isinstance(previous, list) else []) + tags + [source.tag]
+    return f"honeypot-{source.type}-{when:%Y.%m.%d}", doc
+
+
+def document_id(source, position):
+    # Identifiant tiré de la position : renvoyer un lot après une coupure
+    # réécrit les mêmes documents au lieu de les dupliquer.
+    return f"{source.type}-{position['inode']:x}-{position['segment']}-{position['offset']:x}"
+
+
+def _encode(obj):
+    data = event_sink.dumps(obj)
+    return data.encode("utf-8") if isinstance(data, str) else data
+
+
+class Batch:
+    def __init__(self):
+        self.items = []             # [corps NDJSON, source, position, acquitté]
+        self.size = 0
+        self.started = None
+
+    def add(self, line, source, position):
+        index, doc = make_document(line, source)
+        action = {"index": {"_index": index, "_id": document_id(source, position)}}
+        body = b"%s\n%s\n" % (_encode(action), _encode(doc))
+        if not self.items:
+            self.started = time.monotonic()
+        self.items.append([body, source, position, False])
+        self.size += len(body)
+
+    def full(self):
+        return len(self.items) >= BULK_DOCS or self.size >= BULK_BYTES
+
+    def due(self):
+        return bool(self.items) and time.monotonic() - self.started >= FLUSH_INTERVAL
+
+
+# ============================================================
+#   CLIENT _bulk
+# ============================================================
+
+class BulkClient:
+    """Une connexion HTTP(S) keep-alive vers Elasticsearch, rouverte après une erreur."""
+
+    def __init__(self, url, timeout=HTTP_TIMEOUT):
+        parts = urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 9200)
+        self.path = parts.path.rstrip("/") + "/_bulk"
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/x-ndjson"}
+        if parts.username:
+            token = base64.b64encode(f"{parts.username}:{parts.password or ''}".encode()).decode()
+            self.headers["Authorization"] = "Basic " + token
+        self._conn = None
+        # Métriques
+        self.requests = 0
+        self.connections = 0
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def bulk(self, body):
+        """(statut HTTP, réponse JSON ou None). Lève OSError / HTTPException."""
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self._conn = cls(self.host, self.port, timeout=self.timeout)
+            self.connections += 1
+        try:
+            self._conn.request("POST", self.path, body=body, headers=self.headers)
+            resp = self._conn.getresponse()
+            data = resp.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        self.requests += 1
+        if resp.will_close:
+            self.close()
+        try:
+            return resp.status, json.loads(data)
+        except ValueError:
+            return resp.status, None
+
+
+# ============================================================
+#   BOUCLE PRINCIPALE
+# ============================================================
+
+class Shipper:
+    def __init__(self, client, log_dir=LOG_DIR, state_file=STATE_FILE, sources=SOURCES):
+        self.client = client
+        self.state_file = state_file
+        state = self._load_state()
+        self.sources = [Source(os.path.join(log_dir, name), doc_type, tag, state.get(name))
+                        for name, doc_type, tag in sources]
+        self.batch = Batch()
+        self.stopping = False
+        # Métriques
+        self.shipped = 0
+        self.rejected = 0
+        self.retries = 0
+
+    def _load_state(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logging.error("Points de reprise illisibles (%s) : relecture depuis le début", self.state_file)
+            return {}
+
+    def _save_state(self):
+        state = {os.path.basename(s.path): s.checkpoint for s in self.sources if s.checkpoint}
+        tmp = self.state_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_file)
+
+    def poll(self):
+        """Met en lot ce qui est lisible ; retourne le nombre de lignes lues."""
+        total = 0
+        for source in self.sources:
+            while not self.stopping:
+                room = BULK_DOCS - len(self.batch.items)
+                lines = source.read(max(BULK_BYTES - self.batch.size, 64 * 1024), room)
+                if not lines:
+                    break
+                total += len(lines)
+                for line, position in lines:
+                    self.batch.add(line, source, position)
+                if self.batch.full():
+                    self.flush()
+        return total
+
+    def flush(self):
+        """Envoie le lot jusqu'à son acceptation, puis enregistre les reprises."""
+        items = self.batch.items
+        self.batch = Batch()
+        delay = RETRY_BASE
+        while not self.stopping:
+            pending = [item for item in items if not item[3]]
+            if not pending:
+                break
+            try:
+                status, resp = self.client.bulk(b"".join(item[0] for item in pending))
+            except (OSError, http.client.HTTPException) as e:
+                status, resp = None, None
+                logging.warning("Elasticsearch injoignable : %s", e)
+            if status == 200 and isinstance(resp, dict):
+                self._acknowledge(pending, resp)
+            elif status is not None and status < 500 and status not in RETRYABLE_STATUS:
+                # Requête refusée en bloc (400, 401, 413...) : la renvoyer n'y changera rien
+                logging.error("_bulk refusé (HTTP %s) : %d documents abandonnés", status, len(pending))
+                self.rejected += len(pending)
+                for item in pending:
+                    item[3] = True
+            else:
+                self.retries += 1
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX)
+                continue
+            if any(not item[3] for item in pending):
+                # Refus temporaires dans la réponse : seuls ceux-là sont renvoyés
+                self.retries += 1
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX)
+        self._advance(items)
+        self._save_state()
+
+    def _acknowledge(self, pending, resp):
+        results = resp.get("items") or []
+        if not resp.get("errors") and len(results) == len(pending):
+            self.shipped += len(pending)
+            for item in pending:
+                item[3] = True
+            return
+        for item, result in zip(pending, results):
+            outcome = next(iter(result.values()), {})
+            status = outcome.get("status", 500)
+            if status in RETRYABLE_STATUS or status >= 500:
+                continue
+            if status >= 300:
+                self.rejected += 1
+                logging.error("Document refusé (HTTP %s) : %s", status, outcome.get("error"))
+            else:
+                self.shipped += 1
+            item[3] = True
+
+    @staticmethod
+    def _advance(items):
+        # Par source, la reprise avance jusqu'au dernier document acquitté
+        # qui précède le premier document encore en attente.
+        blocked = set()
+        for _, source, position, acked in items:
+            if not acked:
+                blocked.add(source)
+            elif source not in blocked:
+                source.checkpoint = position
+
+    def run(self, once=False):
+        while not self.stopping:
+            read = self.poll()
+            if self.batch.due() or (not read and once and self.batch.items):
+                self.flush()
+            if not read:
+                if once and not self.batch.items:
+                    break
+                time.sleep(POLL_INTERVAL)
+        self.client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Envoi des logs des honeypots vers Elasticsearch")
+    parser.add_argument("--es", default=ES_URL, help="URL d'Elasticsearch")
+    parser.add_argument("--log-dir", default=LOG_DIR)
+    parser.add_argument("--state", default=STATE_FILE)
+    parser.add_argument("--once", action="store_true", help="envoie ce qui existe déjà puis s'arrête")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    shipper = Shipper(BulkClient(args.es), args.log_dir, args.state)
+
+    def stop(signum, frame):
+        shipper.stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    shipper.run(once=args.once)
+    logging.info("Arrêt : %d documents envoyés, %d refusés, %d nouvelles tentatives, %d lignes trop longues",
+                 shipper.shipped, shipper.rejected, shipper.retries, sum(s.skipped for s in shipper.sources))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# response_cache.py
+"""
+Cache des pages rendues pour les visiteurs anonymes du honeypot
+e-commerce (app.py) : / et /product sont les pages que les robots
+parcourent le plus.
+
+  - clé = chemin + query string, valeur = corps HTML + ETag,
+  - expiration (TTL) et éviction LRU bornée en nombre et en octets,
+  - chaque entrée retient la version du catalogue (catalog_meta) et des
+    étiquettes (ex. ("product", 3)) pour une invalidation explicite
+    (nouveau commentaire, écriture sur products).
+
+Le cache est propre à chaque processus ; le TTL borne la durée pendant
+laquelle un autre worker peut servir une page périmée.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 30.0
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class Entry:
+    __slots__ = ("body", "etag", "expires", "version", "tags")
+
+    def __init__(self, body, expires, version, tags):
+        self.body = body
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.expires = expires
+        self.version = version
+        self.tags = tags
+
+
+class ResponseCache:
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._by_tag = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Métriques
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key, version=None):
+        """Entrée valide pour `key` (même version de catalogue), sinon None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires <= now or entry.version != version:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, version=None, tags=()):
+        entry = Entry(body, time.monotonic() + self.ttl, version, tuple(tags))
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+        return entry
+
+    def invalidate_tag(self, tag):
+        with self._lock:
+            keys = self._by_tag.pop(tag, ())
+            for key in list(keys):
+                self._remove(key)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
@@ -1,13 +1,110 @@
 # seccomp_config.py
 import logging
 import errno
+import os
+import threading
 
 try:
     import seccomp
 except ImportError:
-    logging.error("La bibliothèque 'seccomp' n'est pas installée. Le filtre ne sera pas appliqué.")
-    logging.error("Installez-la avec : pip install seccomp")
-    seccomp = None
+    try:
+        # Implémentation ctypes compatible (même API que les bindings libseccomp)
+        import pyseccomp as seccomp
+    except ImportError:
+        logging.error("La bibliothèque 'seccomp' n'est pas installée. Le filtre ne sera pas appliqué.")
+        logging.error("Installez-la avec : pip install seccomp")
+        seccomp = None
+
+
+# ============================================================
+#   PROFILS
+# ============================================================
+
+# Syscalls bloqués sans condition, par profil.
+PROFILES = {
+    # On bloque l'exécution de commandes, la création de processus,
+    # et les changements de privilèges.
+    "blacklist": [
+        'execve', 'execveat',
+        'fork', 'vfork', 'clone',
+        'setuid', 'setgid', 'setreuid', 'setregid',
+        'kill', 'ptrace', 'bpf', 'mount', 'reboot'
+    ],
+    # Honeypot FTP : aucun fichier ne peut être créé, modifié ou supprimé
+    # (PUT / STOR impossible). Les ouvertures en écriture sont filtrées sur
+    # leurs drapeaux (voir WRITE_OPEN_FLAGS) pour que les lectures (RETR,
+    # LIST) et les descripteurs déjà ouverts (logs, sockets) restent utilisables.
+    "ftp_readonly": [
+        'creat', 'truncate', 'ftruncate',
+        'unlink', 'unlinkat', 'rename', 'renameat', 'renameat2',
+        'mkdir', 'mkdirat', 'rmdir', 'link', 'linkat', 'symlink', 'symlinkat',
+        'openat2',
+    ],
+}
+
+# open()/openat() refusés dès qu'un de ces drapeaux est présent.
+WRITE_OPEN_FLAGS = (os.O_WRONLY, os.O_RDWR, os.O_CREAT, os.O_TRUNC, os.O_APPEND)
+WRITE_OPEN_PROFILES = {"ftp_readonly"}
+
+_applied = set()
+_applied_lock = threading.Lock()
+
+
+def build_filter(profile, err=errno.EPERM):
+    """Construit (sans le charger) le SyscallFilter d'un profil."""
+    f = seccomp.SyscallFilter(defaction=seccomp.ALLOW)
+
+    for syscall_name in PROFILES[profile]:
+        try:
+            f.add_rule(seccomp.ERRNO(err), syscall_name)
+        except Exception:
+            # Ignorer si le syscall n'existe pas sur cette architecture
+            logging.debug(f"Impossible d'ajouter la règle seccomp pour: {syscall_name}")
+
+    if profile in WRITE_OPEN_PROFILES:
+        # Index de l'argument "flags" : open(path, flags) / openat(dirfd, path, flags)
+        for syscall_name, flags_arg in (('open', 1), ('openat', 2)):
+            for flag in WRITE_OPEN_FLAGS:
+                try:
+                    f.add_rule(seccomp.ERRNO(err), syscall_name,
+                               seccomp.Arg(flags_arg, seccomp.MASKED_EQ, flag, flag))
+                except Exception:
+                    logging.debug(f"Impossible de filtrer {syscall_name} (flag {flag:#o})")
+
+    try:
+        # Le filtre s'applique à tous les threads du processus, pas seulement
+        # à l'appelant.
+        f.set_attr(seccomp.Attr.CTL_TSYNC, 1)
+    except Exception:
+        logging.debug("TSYNC indisponible : le filtre ne couvre que le thread appelant et ses enfants")
+    return f
+
+
+def apply_profile(profile, err=errno.EPERM):
+    """
+    Charge le profil une seule fois par processus (les appels suivants ne
+    font rien). Retourne True si le filtre est actif.
+    """
+    if not seccomp:
+        logging.warning("Module seccomp non disponible. Le sandboxing des syscalls est désactivé.")
+        return False
+
+    pid = os.getpid()
+    with _applied_lock:
+        if (pid, profile) in _applied:
+            return True
+        try:
+            build_filter(profile, err).load()
+        except Exception as e:
+            logging.error(f"Erreur critique lors de l'application du filtre seccomp ({profile}): {e}")
+            # En production, vous pourriez vouloir quitter si le filtre échoue
+            # exit(1)
+            return False
+        _applied.add((pid, profile))
+
+    logging.info(f"Filtre seccomp '{profile}' chargé pour le processus {pid}.")
+    return True
+
 
 def apply_seccomp_blacklist():
     """
@@ -15,38 +112,20 @@ def apply_seccomp_blacklist():
     les plus dangereux (exec, fork, etc.) afin de limiter les dégâts
     en cas de RCE.
     """
-    if not seccomp:
-        logging.warning("Module seccomp non disponible. Le sandboxing des syscalls est désactivé.")
-        return
-
-    try:
-        # Liste des syscalls à bloquer.
-        # On bloque l'exécution de commandes, la création de processus,
-        # et les changements de privilèges.
-        blacklist = [
-            'execve', 'execveat',
-            'fork', 'vfork', 'clone',
-            'setuid', 'setgid', 'setreuid', 'setregid',
-            'kill', 'ptrace', 'bpf', 'mount', 'reboot'
-        ]
-
-        # On autorise tout par défaut (defaction=ALLOW)
-        # et on bloque spécifiquement la blacklist.
-        f = seccomp.SyscallFilter(defaction=seccomp.ALLOW)
-
-        for syscall_name in blacklist:
-            try:
-                # On retourne une erreur "Operation Not Permitted"
-                # si l'un de ces appels est tenté.
-                f.add_rule(seccomp.ERRNO(errno.EPERM), syscall_name)
-            except seccomp.SyscallFilterError:
-                # Ignorer si le syscall n'existe pas sur cette architecture
-                logging.debug(f"Impossible d'ajouter la règle seccomp pour: {syscall_name}")
-
-        f.load()
+    if apply_profile("blacklist"):
         logging.info("Filtre seccomp (blacklist) chargé avec succès. Les syscalls dangereux sont bloqués.")
 
-    except Exception as e:
-        logging.error(f"Erreur critique lors de l'application du filtre seccomp: {e}")
-        # En production, vous pourriez vouloir quitter si le filtre échoue
-        # exit(1)
+
+def apply_from_env(default="off"):
+    """
+    Applique le profil désigné par la variable SECCOMP_MODE
+    ("off", "blacklist", "ftp_readonly"...).
+    """
+    mode = os.environ.get("SECCOMP_MODE", default).strip().lower()
+    if mode in ("", "off", "none", "0"):
+        logging.info("SECCOMP_MODE=off : aucun filtre seccomp appliqué.")
+        return False
+    if mode not in PROFILES:
+        logging.error(f"SECCOMP_MODE inconnu: {mode} (profils: {', '.join(PROFILES)})")
+        return False
+    return apply_profile(mode)
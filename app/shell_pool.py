@@ -0,0 +1,232 @@
+# shell_pool.py
+"""
+Pool de shells /bin/bash pré-lancés dans des PTY pour le honeypot SSH.
+
+Le pty.fork() + execve() est fait à l'avance par un thread de
+remplissage : à l'ouverture d'un shell, l'attaquant récupère un bash déjà
+prêt (latence constante même en rafale). Un shell utilisé n'est jamais
+réutilisé (état laissé par l'attaquant) : il est détruit et remplacé.
+Le nombre de shells actifs est plafonné.
+"""
+import fcntl
+import logging
+import os
+import pty
+import signal
+import struct
+import termios
+import threading
+import time
+from collections import deque
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_MAX_SHELLS = 50
+
+
+def honeypot_env():
+    # Environnement "propre" de faux root
+    env = os.environ.copy()
+    env["HOME"] = "/root"
+    env["USER"] = "root"
+    env["LOGNAME"] = "root"
+    env["SHELL"] = "/bin/bash"
+    env["TERM"] = "xterm"
+    env["PATH"] = "/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
+
+    # Prompt explicite pour ne pas confondre avec ton vrai Kali
+    # \w = répertoire courant
+    env["PS1"] = "root@ssh-honeypot:\\w# "
+    return env
+
+
+class Shell:
+    __slots__ = ("pid", "fd", "created_at", "reaped")
+
+    def __init__(self, pid, fd):
+        self.pid = pid
+        self.fd = fd
+        self.created_at = time.monotonic()
+        self.reaped = False  # bash déjà récolté : son pid a pu être réattribué
+
+    def resize(self, cols, rows):
+        """Applique la taille de terminal demandée par le client SSH."""
+        try:
+            fcntl.ioctl(self.fd, termios.TIOCSWINSZ, struct.pack("HHHH", rows, cols, 0, 0))
+        except OSError:
+            pass
+
+    def alive(self):
+        if self.reaped:
+            return False
+        try:
+            pid, _ = os.waitpid(self.pid, os.WNOHANG)
+        except ChildProcessError:
+            pid = self.pid
+        if pid != 0:
+            self.reaped = True
+        return not self.reaped
+
+    def _close_fd(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+        self.fd = -1
+
+    def destroy(self):
+        if self.reaped:
+            # Ni kill ni waitpid sur un pid qui n'est plus le nôtre
+            self._close_fd()
+            return
+        for sig in (signal.SIGHUP, signal.SIGKILL):
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                break
+        self._close_fd()
+        try:
+            os.waitpid(self.pid, 0)
+        except ChildProcessError:
+            pass
+        self.reaped = True
+
+
+def spawn_bash(env):
+    """
+    Lance /bin/bash interactif dans un PTY local, avec cwd = "/" et l'ENV
+    du honeypot. Retourne un Shell côté parent.
+    """
+    pid, master_fd = pty.fork()
+
+    if pid == 0:
+        # ==============================
+        #   PROCESSUS ENFANT (SHELL)
+        # ==============================
+        try:
+            os.chdir("/")
+        except Exception:
+            pass
+        try:
+            # --noprofile/--norc pour éviter ton .bashrc/.profile réels
+            os.execve(
+                "/bin/bash",
+                ["/bin/bash", "--noprofile", "--norc", "-i"],
+                env
+            )
+        except Exception as e:
+            os.write(1, f"Erreur execve /bin/bash: {e}\n".encode())
+        os._exit(1)
+
+    return Shell(pid, master_fd)
+
+
+class ShellPool:
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_shells=DEFAULT_MAX_SHELLS):
+        self.size = size
+        self.max_shells = max_shells
+        self._env = honeypot_env()
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_shells)
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopped = False
+        # Métriques
+        self.active = 0
+        self.served_warm = 0
+        self.served_cold = 0
+        self.rejected = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refill_loop, name="shell-pool", daemon=True)
+            self._thread.start()
+            self._wakeup.set()
+        return self
+
+    def acquire(self, timeout=0):
+        """
+        Retourne un Shell prêt, ou None si le plafond de shells actifs est
+        atteint (après `timeout` secondes d'attente).
+        """
+        if timeout:
+            got = self._slots.acquire(timeout=timeout)
+        else:
+            got = self._slots.acquire(blocking=False)
+        if not got:
+            self.rejected += 1
+            return None
+
+        shell = None
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.popleft()
+                if candidate.alive():
+                    shell = candidate
+                    break
+                candidate.destroy()
+            self.active += 1
+        self._wakeup.set()
+
+        if shell is not None:
+            self.served_warm += 1
+            return shell
+        # Pool vide (rafale) : fork à la demande
+        try:
+            shell = spawn_bash(self._env)
+        except OSError:
+            with self._lock:
+                self.active -= 1
+            self._slots.release()
+            raise
+        self.served_cold += 1
+        return shell
+
+    def release(self, shell):
+        """Détruit un shell utilisé et libère sa place."""
+        try:
+            shell.destroy()
+        finally:
+            with self._lock:
+                self.active -= 1
+            self._slots.release()
+            self._wakeup.set()
+
+    def close(self):
+        self._stopped = True
+        self._wakeup.set()
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for shell in idle:
+            shell.destroy()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "active": self.active,
+                "max_shells": self.max_shells,
+                "served_warm": self.served_warm,
+                "served_cold": self.served_cold,
+                "rejected": self.rejected,
+            }
+
+    def _refill_loop(self):
+        while not self._stopped:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while not self._stopped:
+                with self._lock:
+                    # Pas de shell en réserve au-delà de ce que le plafond permet
+                    missing = min(self.size - len(self._idle),
+                                  self.max_shells - self.active - len(self._idle))
+                if missing <= 0:
+                    break
+                try:
+                    shell = spawn_bash(self._env)
+                except OSError as e:
+                    logging.error("Pool de shells : fork impossible (%s)", e)
+                    time.sleep(1)
+                    break
+                with self._lock:
+                    self._idle.append(shell)
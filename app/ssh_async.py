@@ -0,0 +1,309 @@
+# ssh_async.py
+"""
+Mode de service "asyncio" du honeypot SSH (python ssh_honeypot.py --mode asyncio).
+
+Toutes les connexions sont servies par une seule boucle d'événements
+asyncssh au lieu d'un thread + un thread Transport paramiko par client.
+La sémantique est celle de SSHHoneypot (authentification par mot de passe
+toujours acceptée, canal "session" + PTY + shell uniquement) et les
+événements JSON sont identiques : les fonctions de log, le pool de shells
+et l'enregistrement TTY sont ceux de ssh_honeypot.py.
+"""
+import asyncio
+import os
+import socket
+import uuid
+
+import ssh_crypto
+
+# Au-delà, on n'attend plus de nouvelles données du client tant que le shell
+# n'a pas lu son entrée (la fenêtre SSH du canal fait le reste)
+SHELL_WRITE_HIGH_WATER = 64 * 1024
+
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
+
+
+def _make_server_class(hp):
+    class AsyncSSHHoneypot(asyncssh.SSHServer):
+        def __init__(self, slot=None):
+            self.slot = slot
+            self.conn = None
+            self.addr = ("?", 0)
+            self.session_id = str(uuid.uuid4())
+            self.username = None
+
+        def connection_made(self, conn):
+            self.conn = conn
+            self.addr = conn.get_extra_info("peername")[:2]
+            conn.set_extra_info(honeypot=self)
+            hp.log_event(
+                "connection_established", self.addr[0],
+                message="Nouvelle connexion SSH entrante",
+                session_id=self.session_id,
+                local_port=self.addr[1]
+            )
+
+        def connection_lost(self, exc):
+            self._end_handshake()
+            # Déconnexion du client = fin normale, comme en mode thread
+            if exc is None or isinstance(exc, asyncssh.ConnectionLost):
+                hp.log_event(
+                    "connection_closed", self.addr[0],
+                    message="Connexion SSH fermée",
+                    session_id=self.session_id,
+                    local_port=self.addr[1]
+                )
+            else:
+                hp.log_event(
+                    "connection_error", self.addr[0],
+                    message=f"Erreur gestion connexion: {exc}",
+                    session_id=self.session_id,
+                    local_port=self.addr[1]
+                )
+
+        def _end_handshake(self):
+            if self.slot is not None:
+                self.slot.release()
+
+        def begin_auth(self, username):
+            # Échange de clés terminé : la place de handshake est rendue
+            self._end_handshake()
+            return True
+
+        def password_auth_supported(self):
+            return True
+
+        def validate_password(self, username, password):
+            self.username = username
+            hp.log_event(
+                "login_attempt", self.addr[0],
+                username=username, password=password,
+                message="Tentative d'authentification par mot de passe",
+                session_id=self.session_id,
+                local_port=self.addr[1]
+            )
+            hp.AUTH_STATS.record(self.addr[0], username, password)
+            return True
+
+    return AsyncSSHHoneypot
+
+
+async def _bridge_shell(hp, process):
+    """Équivalent asyncio de interactive_bash_shell()."""
+    server = process.get_extra_info("honeypot")
+    addr, session_id = server.addr, server.session_id
+    loop = asyncio.get_running_loop()
+
+    if process.command is not None or process.get_terminal_type() is None:
+        # SSHHoneypot n'accepte que shell + PTY (pas d'exec)
+        process.exit(1)
+        return
+
+    cols, rows = process.get_terminal_size()[:2]
+    pty_size = (cols or 80, rows or 24)
+    shell = None
+    recorder = None
+    assembler = hp.InputAssembler()
+
+    try:
+        process.stdout.write(
+            b"Welcome to the SSH Honeypot (REAL SHELL)\r\n"
+            b"WARNING: Everything is logged.\r\n"
+        )
+
+        shell = await loop.run_in_executor(None, hp.SHELL_POOL.acquire, hp.SHELL_ACQUIRE_TIMEOUT)
+        if shell is None:
+            hp.log_event(
+                "shell_rejected", addr[0],
+                message="Plafond de shells simultanés atteint",
+                session_id=session_id,
+                local_port=addr[1],
+                extra=hp.SHELL_POOL.stats()
+            )
+            process.stdout.write(b"-bash: fork: retry: Resource temporarily unavailable\r\n")
+            return
+        shell.resize(*pty_size)
+        os.set_blocking(shell.fd, False)
+
+        if hp.TTY_RECORD:
+            recorder = hp.Recorder(
+                os.path.join(hp.TTY_RECORD_DIR, f"{session_id}.hptty"),
+                cols=pty_size[0], rows=pty_size[1]
+            )
+
+        shell_done = loop.create_future()
+        to_shell = bytearray()      # entrée du client pas encore acceptée par le PTY
+        drained = asyncio.Event()
+        drained.set()
+
+        def on_shell_output():
+            try:
+                out = os.read(shell.fd, 4096)
+            except BlockingIOError:
+                return
+            except OSError:
+                out = b""
+            if not out:
+                loop.remove_reader(shell.fd)
+                if not shell_done.done():
+                    shell_done.set_result(None)
+                return
+            process.stdout.write(out)
+            if recorder is not None:
+                recorder.output(out)
+
+        def flush_to_shell():
+            # PTY non bloquant : écritures partielles et EAGAIN possibles
+            try:
+                while to_shell:
+                    del to_shell[:os.write(shell.fd, to_shell)]
+            except BlockingIOError:
+                pass
+            except OSError:
+                to_shell.clear()
+                if not shell_done.done():
+                    shell_done.set_result(None)
+            if to_shell:
+                if drained.is_set():
+                    drained.clear()
+                    loop.add_writer(shell.fd, flush_to_shell)
+            elif not drained.is_set():
+                loop.remove_writer(shell.fd)
+                drained.set()
+
+        loop.add_reader(shell.fd, on_shell_output)
+        try:
+            while not shell_done.done():
+                read = asyncio.ensure_future(process.stdin.read(1024))
+                await asyncio.wait({read, shell_done}, return_when=asyncio.FIRST_COMPLETED)
+                if not read.done():
+                    read.cancel()
+                    break
+                try:
+                    data = read.result()
+                except asyncssh.TerminalSizeChanged as resize:
+                    if resize.width and resize.height:
+                        shell.resize(resize.width, resize.height)
+                        if recorder is not None:
+                            recorder.resize(resize.width, resize.height)
+                    continue
+                if not data:
+                    break
+                to_shell += data
+                if drained.is_set():
+                    flush_to_shell()
+                if len(to_shell) > SHELL_WRITE_HIGH_WATER:
+                    wait = asyncio.ensure_future(drained.wait())
+                    await asyncio.wait({wait, shell_done}, return_when=asyncio.FIRST_COMPLETED)
+                    wait.cancel()
+                if recorder is not None:
+                    recorder.input(data)
+                for line in assembler.feed(data):
+                    hp.log_command(line, addr, session_id)
+                if assembler.summary_due():
+                    hp.log_keystroke_summary(assembler, addr, session_id)
+        finally:
+            loop.remove_reader(shell.fd)
+            loop.remove_writer(shell.fd)
+
+    except (asyncssh.Error, OSError) as e:
+        hp.log_event(
+            "session_error", addr[0],
+            message=f"Erreur interactive_bash_shell: {e}",
+            session_id=session_id,
+            local_port=addr[1]
+        )
+    finally:
+        line = assembler.pending()
+        if line is not None:
+            hp.log_command(line, addr, session_id)
+        if assembler.summary_due(final=True):
+            hp.log_keystroke_summary(assembler, addr, session_id)
+        if recorder is not None:
+            await loop.run_in_executor(None, recorder.close)
+            hp.log_event(
+                "tty_recording", addr[0],
+                message="Enregistrement TTY de la session",
+                session_id=session_id,
+                local_port=addr[1],
+                extra={"file": recorder.path}
+            )
+        if shell is not None:
+            await loop.run_in_executor(None, hp.SHELL_POOL.release, shell)
+        process.exit(0)
+
+
+def _make_listen_socket(host, port, backlog):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+async def _run_connection(hp, conn, addr, options, server_class):
+    slot = hp.ADMISSION.begin_handshake()
+    if slot is None:
+        hp.reject_connection(conn, addr, "handshake_concurrency")
+        return
+    try:
+        # Les options sont préparées une seule fois ; seule la fabrique du
+        # serveur (qui porte la place de handshake) change par connexion.
+        await asyncssh.run_server(
+            conn, options=options,
+            server_factory=lambda: server_class(slot)
+        )
+    except (asyncssh.Error, OSError, asyncio.TimeoutError):
+        # Déjà journalisé par connection_lost()
+        pass
+    finally:
+        slot.release()
+
+
+async def serve(hp, host, port, host_key_paths, backlog=4096):
+    server_class = _make_server_class(hp)
+
+    async def process_factory(process):
+        await _bridge_shell(hp, process)
+
+    options = asyncssh.SSHServerConnectionOptions(
+        server_host_keys=[asyncssh.read_private_key(p) for p in host_key_paths],
+        **ssh_crypto.asyncssh_kex_options(),
+        process_factory=process_factory,
+        encoding=None,
+        line_editor=False,
+        allow_pty=True,
+        agent_forwarding=False,
+        x11_forwarding=False,
+    )
+
+    loop = asyncio.get_running_loop()
+    listen_sock = _make_listen_socket(host, port, backlog)
+    print(f"[*] SSH Honeypot réel (asyncio) en écoute sur {host}:{port}")
+
+    tasks = set()
+    while True:
+        conn, addr = await loop.sock_accept(listen_sock)
+        # Refus au plus tôt : ni objet connexion, ni bannière, ni tâche
+        reason = hp.ADMISSION.admit(addr[0])
+        if reason is not None:
+            hp.reject_connection(conn, addr, reason)
+            continue
+        task = asyncio.create_task(_run_connection(hp, conn, addr[:2], options, server_class))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+
+def start_async_ssh_honeypot(hp, host="0.0.0.0", port=2222, host_key_paths=None):
+    """
+    `hp` est le module ssh_honeypot (log_event, SHELL_POOL, ...) : les deux
+    modes partagent exactement le même schéma d'événements.
+    """
+    if asyncssh is None:
+        raise RuntimeError("Le mode asyncio nécessite asyncssh (pip install asyncssh)")
+    hp.SHELL_POOL.start()
+    asyncio.run(serve(hp, host, port, host_key_paths or ssh_crypto.host_key_paths()))
@@ -0,0 +1,132 @@
+# ssh_crypto.py
+"""
+Clés d'hôte et paramètres cryptographiques du honeypot SSH, préparés une
+seule fois au démarrage et partagés par toutes les connexions.
+
+  - Plusieurs clés d'hôte (Ed25519 et ECDSA en tête : une signature
+    Ed25519 coûte une fraction d'une signature RSA 2048) ; le client
+    choisit parmi celles proposées, les scanners anciens gardent RSA.
+  - Les clés absentes sont générées au premier démarrage (format OpenSSH,
+    lisible par paramiko et asyncssh).
+  - HoneypotTransport : sous-classe de paramiko.Transport dont les listes
+    d'algorithmes sont des attributs de classe, calculés une fois.
+
+Variables d'environnement :
+    SSH_HOST_KEY_TYPES   ordre et choix des clés (défaut: ed25519,ecdsa,rsa)
+    SSH_HOST_KEY_DIR     dossier des fichiers host_<type>.key
+    SSH_KEX              algorithmes d'échange de clés proposés (liste ;
+                         défaut : ceux de la bibliothèque, moins les
+                         groupes DH ≥ 4096 bits en mode thread)
+
+Mesures : python bench_ssh_handshake.py
+"""
+import logging
+import os
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+import paramiko
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_KEY_TYPES = "ed25519,ecdsa,rsa"
+RSA_BITS = 2048
+
+HOST_KEY_TYPES = [
+    t.strip() for t in os.environ.get("SSH_HOST_KEY_TYPES", DEFAULT_KEY_TYPES).split(",") if t.strip()
+]
+HOST_KEY_DIR = os.environ.get("SSH_HOST_KEY_DIR", BASE_DIR)
+# DH 4096/8192 bits : ~100 ms de CPU par handshake dans paramiko (Python pur),
+# contre ~3 ms pour curve25519 ; les clients qui les proposent proposent aussi
+# group14 ou une courbe elliptique.
+PARAMIKO_SLOW_KEX = ("diffie-hellman-group16-sha512", "diffie-hellman-group18-sha512")
+
+KEX = [k.strip() for k in os.environ.get("SSH_KEX", "").split(",") if k.strip()]
+
+# type -> (classe paramiko, génération cryptography)
+KEY_TYPES = {
+    "ed25519": (paramiko.Ed25519Key, ed25519.Ed25519PrivateKey.generate),
+    "ecdsa": (paramiko.ECDSAKey, lambda: ec.generate_private_key(ec.SECP256R1())),
+    "rsa": (paramiko.RSAKey, lambda: rsa.generate_private_key(65537, RSA_BITS)),
+}
+
+
+# ============================================================
+#   CLÉS D'HÔTE
+# ============================================================
+
+def host_key_path(key_type, key_dir=None):
+    return os.path.join(key_dir or HOST_KEY_DIR, f"host_{key_type}.key")
+
+
+def generate_host_key(key_type, path):
+    """Écrit une nouvelle clé privée (format OpenSSH, mode 600)."""
+    key = KEY_TYPES[key_type][1]()
+    data = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.OpenSSH,
+        serialization.NoEncryption(),
+    )
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    logging.info("Clé d'hôte %s générée : %s", key_type, path)
+
+
+def host_key_paths(key_types=None, key_dir=None):
+    """
+    Chemins des clés d'hôte à servir, dans l'ordre de préférence ; les clés
+    manquantes sont générées.
+    """
+    paths = []
+    for key_type in key_types or HOST_KEY_TYPES:
+        if key_type not in KEY_TYPES:
+            raise ValueError(f"type de clé d'hôte inconnu : {key_type}")
+        path = host_key_path(key_type, key_dir)
+        if not os.path.exists(path):
+            generate_host_key(key_type, path)
+        paths.append(path)
+    return paths
+
+
+def load_paramiko_keys(key_types=None, key_dir=None):
+    """Clés paramiko chargées une fois pour toutes les connexions."""
+    key_types = key_types or HOST_KEY_TYPES
+    return [
+        KEY_TYPES[key_type][0](filename=path)
+        for key_type, path in zip(key_types, host_key_paths(key_types, key_dir))
+    ]
+
+
+# ============================================================
+#   TRANSPORT PARAMIKO
+# ============================================================
+
+def make_transport_class(host_keys, kex=None):
+    """
+    Sous-classe de Transport avec les préférences calculées une fois :
+    types de clés d'hôte limités à celles chargées (dans leur ordre) et
+    échanges de clés sans les groupes DH les plus coûteux (ou `kex`).
+    """
+    offered = []
+    for key in host_keys:
+        name = key.get_name()
+        if name == "ssh-rsa":
+            offered += ["rsa-sha2-512", "rsa-sha2-256", "ssh-rsa"]
+        else:
+            offered.append(name)
+    if kex:
+        unknown = set(kex) - set(paramiko.Transport._kex_info)
+        if unknown:
+            raise ValueError(f"échange de clés non supporté par paramiko : {', '.join(sorted(unknown))}")
+    else:
+        kex = [k for k in paramiko.Transport._preferred_kex if k not in PARAMIKO_SLOW_KEX]
+    attrs = {"_preferred_keys": tuple(offered), "_preferred_kex": tuple(kex)}
+    return type("HoneypotTransport", (paramiko.Transport,), attrs)
+
+
+def asyncssh_kex_options(kex=None):
+    """Options asyncssh équivalentes (à passer à SSHServerConnectionOptions)."""
+    kex = kex if kex is not None else KEX
+    return {"kex_algs": list(kex)} if kex else {}
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -- coding: utf-8 --
 
+import argparse
 import os
 import paramiko
 import threading
@@ -11,20 +12,50 @@ import sys
 import uuid
 import select
 import logging
-import pty
 
 import seccomp_config
+from admission import AdmissionController
+from auth_stats import AuthStats
+from event_sink import get_sink, flush_on_sigterm
+from shell_pool import ShellPool
+from ssh_crypto import HOST_KEY_TYPES, KEX, load_paramiko_keys, make_transport_class
+from tty_capture import InputAssembler
+from tty_record import Recorder
 
 # ============================================================
 #   CONFIG & CHEMINS
 # ============================================================
 
-BASE_DIR = os.path.dirname(os.path.abspath(_file_))
-LOG_DIR = os.path.join(os.path.dirname(BASE_DIR), "logs")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+LOG_DIR = os.environ.get("SSH_LOG_DIR", os.path.join(os.path.dirname(BASE_DIR), "logs"))
 os.makedirs(LOG_DIR, exist_ok=True)
 
 SSH_LOG_FILE = os.path.join(LOG_DIR, "honeypot_ssh.log")
-HOST_KEY_PATH = os.path.join(BASE_DIR, "host_rsa.key")
+SSH_SINK = get_sink(SSH_LOG_FILE)
+
+# Sketches des tentatives d'authentification + rollups (voir auth_stats.py)
+AUTH_STATS = AuthStats("ssh_real", SSH_SINK, os.path.join(LOG_DIR, "auth_stats"))
+
+# Shells bash pré-lancés (voir shell_pool.py)
+SHELL_POOL_SIZE = int(os.environ.get("SSH_SHELL_POOL_SIZE", "4"))
+MAX_SHELLS = int(os.environ.get("SSH_MAX_SHELLS", "50"))
+SHELL_ACQUIRE_TIMEOUT = float(os.environ.get("SSH_SHELL_ACQUIRE_TIMEOUT", "5"))
+SHELL_REQUEST_TIMEOUT = 10  # s entre l'ouverture du canal et la demande de shell
+SHELL_POOL = ShellPool(SHELL_POOL_SIZE, MAX_SHELLS)
+
+# Enregistrement binaire des sessions TTY (voir tty_record.py)
+TTY_RECORD = os.environ.get("SSH_TTY_RECORD", "1") != "0"
+TTY_RECORD_DIR = os.environ.get("SSH_TTY_RECORD_DIR", os.path.join(LOG_DIR, "tty"))
+
+# Contrôle d'admission avant l'échange de clés (voir admission.py)
+SSH_IP_RATE = float(os.environ.get("SSH_IP_RATE", "2"))
+SSH_IP_BURST = int(os.environ.get("SSH_IP_BURST", "10"))
+SSH_NET_RATE = float(os.environ.get("SSH_NET_RATE", "10"))
+SSH_NET_BURST = int(os.environ.get("SSH_NET_BURST", "50"))
+SSH_MAX_HANDSHAKES = int(os.environ.get("SSH_MAX_HANDSHAKES", "64"))
+ADMISSION = AdmissionController(
+    SSH_IP_RATE, SSH_IP_BURST, SSH_NET_RATE, SSH_NET_BURST, SSH_MAX_HANDSHAKES
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -60,11 +91,7 @@ def log_event(
         "raw_data": raw_data,
         "extra": extra or {},
     }
-    try:
-        with open(SSH_LOG_FILE, "a") as f:
-            f.write(json.dumps(entry) + "\n")
-    except Exception as e:
-        logging.error("Erreur d'écriture log SSH: %s", e)
+    SSH_SINK.emit(json.dumps(entry))
 
 
 # ============================================================
@@ -72,11 +99,15 @@ def log_event(
 # ============================================================
 
 class SSHHoneypot(paramiko.ServerInterface):
-    def _init_(self, addr, session_id):
+    def __init__(self, addr, session_id):
         self.event = threading.Event()
         self.addr = addr
         self.session_id = session_id
         self.username = None
+        self.pty_size = (80, 24)
+        # Shell et enregistreur de la session, pour suivre la taille du terminal
+        self.shell = None
+        self.recorder = None
 
     def check_auth_password(self, username, password):
         self.username = username
@@ -87,6 +118,7 @@ class SSHHoneypot(paramiko.ServerInterface):
             session_id=self.session_id,
             local_port=self.addr[1]
         )
+        AUTH_STATS.record(self.addr[0], username, password)
         return paramiko.AUTH_SUCCESSFUL
 
     def get_allowed_auths(self, username):
@@ -102,6 +134,18 @@ class SSHHoneypot(paramiko.ServerInterface):
         return True
 
     def check_channel_pty_request(self, channel, term, w, h, pw, ph, modes):
+        if w and h:
+            self.pty_size = (w, h)
+        return True
+
+    def check_channel_window_change_request(self, channel, w, h, pw, ph):
+        if w and h:
+            self.pty_size = (w, h)
+            shell, recorder = self.shell, self.recorder
+            if shell is not None:
+                shell.resize(w, h)
+            if recorder is not None:
+                recorder.resize(w, h)
         return True
 
 
@@ -109,13 +153,37 @@ class SSHHoneypot(paramiko.ServerInterface):
 #   SHELL RÉEL AVEC PTY (PROMPT HONEYPOT)
 # ============================================================
 
-def interactive_bash_shell(chan, client_addr, session_id):
+def log_command(line, client_addr, session_id):
+    log_event(
+        "command", client_addr[0],
+        command=line.text,
+        session_id=session_id,
+        local_port=client_addr[1],
+        raw_data=line.raw,
+        extra=line.flags
+    )
+
+
+def log_keystroke_summary(assembler, client_addr, session_id):
+    log_event(
+        "keystroke_summary", client_addr[0],
+        message="Résumé du rythme de frappe",
+        session_id=session_id,
+        local_port=client_addr[1],
+        extra=assembler.summary()
+    )
+
+
+def interactive_bash_shell(chan, client_addr, session_id, pty_size=(80, 24), server=None):
     """
-    Lance /bin/bash interactif dans un PTY local, avec cwd = "/",
-    ENV et PS1 customisés pour ressembler à un vrai SSH
-    root@ssh-honeypot:/# (et pas ton prompt Kali).
+    Branche le canal SSH sur un /bin/bash interactif pré-lancé dans un PTY
+    local (cwd = "/", ENV et PS1 customisés pour ressembler à un vrai SSH
+    root@ssh-honeypot:/#, voir shell_pool.py). `server` (SSHHoneypot) reçoit
+    le shell et l'enregistreur pour les changements de taille du terminal.
     """
-    master_fd = None
+    shell = None
+    recorder = None
+    assembler = InputAssembler()
     try:
         banner = (
             "Welcome to the SSH Honeypot (REAL SHELL)\r\n"
@@ -123,44 +191,35 @@ def interactive_bash_shell(chan, client_addr, session_id):
         )
         chan.send(banner.encode("utf-8", errors="ignore"))
 
-        # fork un pseudo-terminal
-        pid, master_fd = pty.fork()
-
-        if pid == 0:
-            # ==============================
-            #   PROCESSUS ENFANT (SHELL)
-            # ==============================
-            try:
-                os.chdir("/")
-            except Exception:
-                pass
-
-            # Environnement "propre" de faux root
-            env = os.environ.copy()
-            env["HOME"] = "/root"
-            env["USER"] = "root"
-            env["LOGNAME"] = "root"
-            env["SHELL"] = "/bin/bash"
-            env["TERM"] = "xterm"
-            env["PATH"] = "/usr/local/sbin:/usr/local/bin:/usr/sbin:/usr/bin:/sbin:/bin"
-
-            # Prompt explicite pour ne pas confondre avec ton vrai Kali
-            # \w = répertoire courant
-            env["PS1"] = "root@ssh-honeypot:\\w# "
-
-            try:
-                # --noprofile/--norc pour éviter ton .bashrc/.profile réels
-                os.execve(
-                    "/bin/bash",
-                    ["/bin/bash", "--noprofile", "--norc", "-i"],
-                    env
-                )
-            except Exception as e:
-                os.write(1, f"Erreur execve /bin/bash: {e}\n".encode())
-                os._exit(1)
+        shell = SHELL_POOL.acquire(timeout=SHELL_ACQUIRE_TIMEOUT)
+        if shell is None:
+            log_event(
+                "shell_rejected", client_addr[0],
+                message="Plafond de shells simultanés atteint",
+                session_id=session_id,
+                local_port=client_addr[1],
+                extra=SHELL_POOL.stats()
+            )
+            chan.send(b"-bash: fork: retry: Resource temporarily unavailable\r\n")
+            return
+        master_fd = shell.fd
+        shell.resize(*pty_size)
+
+        if TTY_RECORD:
+            recorder = Recorder(
+                os.path.join(TTY_RECORD_DIR, f"{session_id}.hptty"),
+                cols=pty_size[0], rows=pty_size[1]
+            )
+        if server is not None:
+            server.shell, server.recorder = shell, recorder
+            if server.pty_size != pty_size:
+                # Redimensionné entre la demande de shell et l'acquisition
+                shell.resize(*server.pty_size)
+                if recorder is not None:
+                    recorder.resize(*server.pty_size)
 
         # ==============================
-        #   PROCESSUS PARENT (PONT)
+        #   PONT CANAL SSH <-> PTY
         # ==============================
         while True:
             r, _, _ = select.select([chan, master_fd], [], [])
@@ -171,26 +230,27 @@ def interactive_bash_shell(chan, client_addr, session_id):
                 if not data:
                     break
 
+                os.write(master_fd, data)
+                if recorder is not None:
+                    recorder.input(data)
+
+                # Une ligne reconstituée = un événement (et non une frappe)
                 try:
-                    decoded = data.decode("utf-8", errors="ignore")
-                    if decoded.strip():
-                        log_event(
-                            "raw_input", client_addr[0],
-                            message=decoded,
-                            session_id=session_id,
-                            local_port=client_addr[1]
-                        )
+                    for line in assembler.feed(data):
+                        log_command(line, client_addr, session_id)
+                    if assembler.summary_due():
+                        log_keystroke_summary(assembler, client_addr, session_id)
                 except Exception:
                     pass
 
-                os.write(master_fd, data)
-
             # Données venant du shell local
             if master_fd in r:
                 out = os.read(master_fd, 1024)
                 if not out:
                     break
                 chan.send(out)
+                if recorder is not None:
+                    recorder.output(out)
 
     except Exception as e:
         log_event(
@@ -200,11 +260,27 @@ def interactive_bash_shell(chan, client_addr, session_id):
             local_port=client_addr[1]
         )
     finally:
+        if server is not None:
+            server.shell = server.recorder = None
         try:
-            if master_fd is not None:
-                os.close(master_fd)
+            line = assembler.pending()
+            if line is not None:
+                log_command(line, client_addr, session_id)
+            if assembler.summary_due(final=True):
+                log_keystroke_summary(assembler, client_addr, session_id)
         except Exception:
             pass
+        if recorder is not None:
+            recorder.close()
+            log_event(
+                "tty_recording", client_addr[0],
+                message="Enregistrement TTY de la session",
+                session_id=session_id,
+                local_port=client_addr[1],
+                extra={"file": recorder.path}
+            )
+        if shell is not None:
+            SHELL_POOL.release(shell)
         try:
             chan.close()
         except Exception:
@@ -215,12 +291,33 @@ def interactive_bash_shell(chan, client_addr, session_id):
 #   GESTION DES CONNEXIONS
 # ============================================================
 
-def handle_ssh_connection(conn, addr, host_key):
-    session_id = str(uuid.uuid4())
-    transport = paramiko.Transport(conn)
-    transport.add_server_key(host_key)
+def reject_connection(conn, addr, reason):
+    """Refus avant tout échange SSH : un événement, puis close()."""
+    log_event(
+        "connection_throttled", addr[0],
+        message="Connexion refusée par le contrôle d'admission",
+        local_port=addr[1],
+        extra={"reason": reason}
+    )
+    try:
+        conn.close()
+    except OSError:
+        pass
+
 
+def handle_ssh_connection(conn, addr, host_keys, transport_class=paramiko.Transport):
+    slot = ADMISSION.begin_handshake()
+    if slot is None:
+        reject_connection(conn, addr, "handshake_concurrency")
+        return
+
+    session_id = str(uuid.uuid4())
+    transport = None
     try:
+        transport = transport_class(conn)
+        for host_key in host_keys:
+            transport.add_server_key(host_key)
+
         log_event(
             "connection_established", addr[0],
             message="Nouvelle connexion SSH entrante",
@@ -230,6 +327,7 @@ def handle_ssh_connection(conn, addr, host_key):
 
         server = SSHHoneypot(addr, session_id)
         transport.start_server(server=server)
+        slot.release()
 
         chan = transport.accept(20)
         if chan is None:
@@ -241,7 +339,17 @@ def handle_ssh_connection(conn, addr, host_key):
             )
             return
 
-        interactive_bash_shell(chan, addr, session_id)
+        # Attendre la demande de shell : la taille du PTY arrive avant elle
+        if not server.event.wait(SHELL_REQUEST_TIMEOUT):
+            log_event(
+                "connection_error", addr[0],
+                message="Timeout demande de shell",
+                session_id=session_id,
+                local_port=addr[1]
+            )
+            return
+
+        interactive_bash_shell(chan, addr, session_id, server.pty_size, server)
 
         log_event(
             "connection_closed", addr[0],
@@ -258,8 +366,10 @@ def handle_ssh_connection(conn, addr, host_key):
             local_port=addr[1]
         )
     finally:
+        slot.release()
         try:
-            transport.close()
+            # Transport non construit : fermer la socket nous-mêmes
+            (transport or conn).close()
         except Exception:
             pass
 
@@ -270,27 +380,35 @@ def handle_ssh_connection(conn, addr, host_key):
 
 def start_ssh_honeypot(host="0.0.0.0", port=2222):
     try:
-        host_key = paramiko.RSAKey(filename=HOST_KEY_PATH)
+        # Clés et préférences d'algorithmes préparées une fois (ssh_crypto.py)
+        host_keys = load_paramiko_keys()
+        transport_class = make_transport_class(host_keys, KEX)
 
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         sock.bind((host, port))
         sock.listen(100)
 
-        print(f"[*] SSH Honeypot réel en écoute sur {host}:{port}")
+        SHELL_POOL.start()
+        print(f"[*] SSH Honeypot réel en écoute sur {host}:{port} "
+              f"(clés: {', '.join(HOST_KEY_TYPES)}, "
+              f"pool de shells: {SHELL_POOL_SIZE}, max: {MAX_SHELLS})")
 
         while True:
             conn, addr = sock.accept()
+            reason = ADMISSION.admit(addr[0])
+            if reason is not None:
+                reject_connection(conn, addr, reason)
+                continue
             t = threading.Thread(
                 target=handle_ssh_connection,
-                args=(conn, addr, host_key),
+                args=(conn, addr, host_keys, transport_class),
                 daemon=True
             )
             t.start()
 
-    except FileNotFoundError:
-        print(f"[-] ERREUR: clé hôte SSH non trouvée. Génère-la avec :", file=sys.stderr)
-        print(f"    ssh-keygen -t rsa -b 2048 -f {HOST_KEY_PATH}", file=sys.stderr)
+    except (ValueError, paramiko.SSHException) as e:
+        print(f"[-] ERREUR: clés d'hôte SSH ({', '.join(HOST_KEY_TYPES)}) : {e}", file=sys.stderr)
     except Exception as e:
         print(f"[-] Erreur fatale serveur SSH : {e}", file=sys.stderr)
         time.sleep(3)
@@ -300,9 +418,28 @@ def start_ssh_honeypot(host="0.0.0.0", port=2222):
 #   MAIN
 # ============================================================
 
-if _name_ == "_main_":
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SSH Honeypot")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument(
+        "--mode", choices=("thread", "asyncio"),
+        default=os.environ.get("SSH_MODE", "thread"),
+        help="thread : paramiko, un thread par connexion ; "
+             "asyncio : asyncssh, une seule boucle d'événements"
+    )
+    args = parser.parse_args()
+
+    flush_on_sigterm()
+    # Fichier d'état ouvert avant le filtre (qui peut interdire l'écriture)
+    AUTH_STATS.start()
+
     print("[*] Application du filtre Seccomp (via SECCOMP_MODE)...")
     seccomp_config.apply_from_env()
 
-    print("[*] Démarrage du SSH Honeypot...")
-    start_ssh_honeypot()
+    print(f"[*] Démarrage du SSH Honeypot (mode {args.mode})...")
+    if args.mode == "asyncio":
+        import ssh_async
+        ssh_async.start_async_ssh_honeypot(sys.modules[__name__], args.host, args.port)
+    else:
+        start_ssh_honeypot(args.host, args.port)
@@ -0,0 +1,264 @@
+# tty_capture.py
+"""
+Reconstitution des lignes de commande tapées dans un shell SSH.
+
+Le client SSH envoie les touches au fil de l'eau (souvent un octet par
+recv) : InputAssembler rejoue l'édition de ligne (backspace, flèches,
+Ctrl-U/W/K, historique, collages) pour produire une seule ligne complète
+par commande, plus un résumé compact du rythme de frappe. Une commande
+identique à la précédente, renvoyée moins de DEDUP_WINDOW secondes après
+(bot qui martèle, ↑ + Entrée en boucle), n'est pas réémise : elle est
+comptée dans le résumé (repeated_lines).
+"""
+import codecs
+import time
+
+SUMMARY_INTERVAL = 60.0     # secondes entre deux résumés de frappe
+PASTE_THRESHOLD = 16        # octets imprimables reçus d'un coup = collage
+MAX_LINE = 4096             # au-delà, la ligne est tronquée
+MAX_RAW = 1024              # octets bruts conservés par ligne (forensique)
+MAX_HISTORY = 100
+DEDUP_WINDOW = 10.0         # secondes pendant lesquelles une commande répétée est fusionnée
+
+_PASTE_START = "200~"
+_PASTE_END = "201~"
+
+
+class Line:
+    __slots__ = ("text", "raw", "flags")
+
+    def __init__(self, text, raw, flags):
+        self.text = text
+        self.raw = raw
+        self.flags = flags
+
+
+class InputAssembler:
+    def __init__(self, summary_interval=SUMMARY_INTERVAL):
+        self.summary_interval = summary_interval
+        self._buf = []
+        self._cursor = 0
+        self._raw = bytearray()
+        self._flags = {}
+        self._history = []
+        self._hist_pos = 0
+        self._esc = None            # None, "" (après ESC) ou séquence CSI/SS3 en cours
+        self._in_paste = False
+        self._last_cr = False
+        # Un caractère UTF-8 peut être coupé entre deux recv
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._now = time.monotonic()
+        self._last_line = None      # (texte, instant) de la dernière commande émise
+        # Rythme de frappe (remis à zéro à chaque résumé)
+        self._last_key_at = None
+        self._gaps = []
+        self._keys = 0
+        self._chunks = 0
+        self._pastes = 0
+        self._lines = 0
+        self._repeats = 0
+        self._bytes = 0
+        self._window_start = time.monotonic()
+
+    # ------------------------------------------------------------
+    #   Entrée
+    # ------------------------------------------------------------
+
+    def feed(self, data, now=None):
+        """Consomme un bloc reçu du client ; retourne les lignes terminées."""
+        now = time.monotonic() if now is None else now
+        if self._last_key_at is not None:
+            self._gaps.append(now - self._last_key_at)
+        self._last_key_at = now
+        self._now = now
+        self._chunks += 1
+        self._bytes += len(data)
+
+        text = self._decoder.decode(data)
+        printable = sum(1 for ch in text if ch >= " " and ch != "\x7f")
+        if printable >= PASTE_THRESHOLD:
+            self._pastes += 1
+            self._flags["pasted"] = True
+
+        done = []
+        for ch in text:
+            self._keys += 1
+            if len(self._raw) < MAX_RAW:
+                self._raw += ch.encode("utf-8")
+            line = self._key(ch)
+            if line is not None:
+                done.append(line)
+        return done
+
+    def pending(self):
+        """Ligne en cours de saisie (fin de session sans Entrée), ou None."""
+        if not self._buf:
+            return None
+        flags = dict(self._flags, incomplete=True)
+        return Line("".join(self._buf), self._raw_repr(), flags)
+
+    # ------------------------------------------------------------
+    #   Résumé de frappe
+    # ------------------------------------------------------------
+
+    def summary_due(self, now=None, final=False):
+        """Vrai si un résumé doit être émis (toujours en fin de session)."""
+        if not self._keys:
+            return False
+        now = time.monotonic() if now is None else now
+        return final or now - self._window_start >= self.summary_interval
+
+    def summary(self, now=None):
+        """Résumé compact depuis le précédent, puis remise à zéro."""
+        now = time.monotonic() if now is None else now
+        gaps = sorted(self._gaps)
+        out = {
+            "window_s": round(now - self._window_start, 3),
+            "keystrokes": self._keys,
+            "chunks": self._chunks,
+            "bytes": self._bytes,
+            "lines": self._lines,
+            "repeated_lines": self._repeats,
+            "paste_bursts": self._pastes,
+        }
+        if gaps:
+            out["gap_ms_p50"] = round(gaps[len(gaps) // 2] * 1000, 1)
+            out["gap_ms_p90"] = round(gaps[min(len(gaps) - 1, int(len(gaps) * 0.9))] * 1000, 1)
+            out["gap_ms_min"] = round(gaps[0] * 1000, 1)
+        self._gaps = []
+        self._keys = self._chunks = self._pastes = self._lines = self._repeats = self._bytes = 0
+        self._window_start = now
+        return out
+
+    # ------------------------------------------------------------
+    #   Édition de ligne
+    # ------------------------------------------------------------
+
+    def _key(self, ch):
+        if self._esc is not None:
+            return self._escape(ch)
+
+        if ch in "\r\n":
+            # "\r\n" envoyé par certains clients = une seule Entrée
+            if ch == "\n" and self._last_cr:
+                self._last_cr = False
+                return None
+            self._last_cr = ch == "\r"
+            # Dans un collage multi-lignes, chaque ligne est une commande
+            return self._finish()
+        self._last_cr = False
+
+        if ch == "\x1b":
+            self._esc = ""
+        elif self._in_paste:
+            self._insert(ch)
+        elif ch in "\x7f\x08":                          # Backspace
+            if self._cursor:
+                del self._buf[self._cursor - 1]
+                self._cursor -= 1
+                self._flags["edited"] = True
+        elif ch == "\x03":                              # Ctrl-C
+            # Ligne abandonnée : gardée pour l'analyse, marquée non exécutée
+            self._flags["interrupted"] = True
+            return self._finish()
+        elif ch == "\x15":                              # Ctrl-U
+            del self._buf[:self._cursor]
+            self._cursor = 0
+            self._flags["edited"] = True
+        elif ch == "\x0b":                              # Ctrl-K
+            del self._buf[self._cursor:]
+            self._flags["edited"] = True
+        elif ch == "\x17":                              # Ctrl-W
+            i = self._cursor
+            while i and self._buf[i - 1] == " ":
+                i -= 1
+            while i and self._buf[i - 1] != " ":
+                i -= 1
+            del self._buf[i:self._cursor]
+            self._cursor = i
+            self._flags["edited"] = True
+        elif ch == "\x01":                              # Ctrl-A
+            self._cursor = 0
+        elif ch == "\x05":                              # Ctrl-E
+            self._cursor = len(self._buf)
+        elif ch == "\t":
+            # La complétion est faite par bash : on ne voit pas le résultat
+            self._flags["tab_completion"] = True
+        elif ch >= " ":
+            self._insert(ch)
+        return None
+
+    def _escape(self, ch):
+        seq = self._esc + ch
+        if seq in ("[", "O") or (seq[0] == "[" and not ("@" <= ch <= "~")):
+            self._esc = seq                              # séquence incomplète
+            return None
+        self._esc = None
+        if seq[0] == "O":
+            seq = "[" + seq[1:]                          # SS3 = CSI pour les flèches
+        if seq == "[" + _PASTE_START:
+            self._in_paste = True
+            self._flags["pasted"] = True
+        elif seq == "[" + _PASTE_END:
+            self._in_paste = False
+        elif seq == "[D":                                # ←
+            self._cursor = max(0, self._cursor - 1)
+        elif seq == "[C":                                # →
+            self._cursor = min(len(self._buf), self._cursor + 1)
+        elif seq in ("[H", "[1~", "[7~"):                # Début
+            self._cursor = 0
+        elif seq in ("[F", "[4~", "[8~"):                # Fin
+            self._cursor = len(self._buf)
+        elif seq == "[3~":                               # Suppr
+            if self._cursor < len(self._buf):
+                del self._buf[self._cursor]
+                self._flags["edited"] = True
+        elif seq in ("[A", "[B"):                        # ↑ / ↓ : historique
+            self._recall(-1 if seq == "[A" else 1)
+        return None
+
+    def _recall(self, step):
+        if not self._history:
+            return
+        self._hist_pos = max(0, min(len(self._history), self._hist_pos + step))
+        text = self._history[self._hist_pos] if self._hist_pos < len(self._history) else ""
+        self._buf = list(text)
+        self._cursor = len(self._buf)
+        self._flags["history"] = True
+
+    def _insert(self, ch):
+        if len(self._buf) >= MAX_LINE:
+            self._flags["truncated"] = True
+            return
+        self._buf.insert(self._cursor, ch)
+        self._cursor += 1
+
+    def _finish(self):
+        text = "".join(self._buf)
+        flags = self._flags
+        raw = self._raw_repr()
+        self._reset_line()
+        if not text.strip():
+            return None
+        self._lines += 1
+        if flags.get("interrupted"):
+            return Line(text, raw, flags)
+        last = self._last_line
+        self._last_line = (text, self._now)
+        if last is not None and last[0] == text and self._now - last[1] < DEDUP_WINDOW:
+            self._repeats += 1
+            self._hist_pos = len(self._history)
+            return None
+        self._history.append(text)
+        del self._history[:-MAX_HISTORY]
+        self._hist_pos = len(self._history)
+        return Line(text, raw, flags)
+
+    def _reset_line(self):
+        self._buf = []
+        self._cursor = 0
+        self._raw = bytearray()
+        self._flags = {"pasted": True} if self._in_paste else {}
+
+    def _raw_repr(self):
+        return bytes(self._raw).decode("latin-1").encode("unicode_escape").decode("ascii")
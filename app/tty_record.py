@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# tty_record.py
+"""
+Enregistrement binaire compact des sessions TTY du honeypot SSH.
+
+Format d'un fichier .hptty :
+
+    en-tête   MAGIC (8 o) + <dHH  (début epoch, colonnes, lignes)
+    trame     <IBH (t en ms depuis le début, type, longueur) + données
+              type : 'i' entrée client, 'o' sortie du shell,
+                     'r' redimensionnement (données b"COLONNESxLIGNES")
+    fin       "IDX1" + <I (n) + n × <IQ (t ms, offset)  -- index
+              + <Q (offset de l'index) + END_MAGIC (8 o)
+
+L'index (une entrée toutes les INDEX_EVERY trames ou chaque seconde) est
+écrit à la fermeture ; un fichier tronqué (crash) reste lisible par un
+parcours linéaire. Les trames sont encodées et écrites par un thread
+unique, avec des fichiers bufferisés : la boucle de pont SSH ne fait
+qu'un put() dans une file.
+
+Lecture / rejeu :
+    python tty_record.py info   FICHIER
+    python tty_record.py replay FICHIER [--seek 12.5] [--speed 2]
+    python tty_record.py export FICHIER [-o session.cast]   # asciicast v2
+"""
+import argparse
+import bisect
+import json
+import logging
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+
+MAGIC = b"HPTTY1\x00\x00"
+END_MAGIC = b"HPTTYEND"
+INDEX_MAGIC = b"IDX1"
+
+HEADER = struct.Struct("<dHH")
+FRAME = struct.Struct("<IBH")
+INDEX_ENTRY = struct.Struct("<IQ")
+FOOTER = struct.Struct("<Q")
+
+INPUT = ord("i")
+OUTPUT = ord("o")
+RESIZE = ord("r")
+
+INDEX_EVERY = 64            # trames entre deux entrées d'index
+INDEX_MAX_GAP_MS = 1000     # ... ou au moins une entrée par seconde
+MAX_PAYLOAD = 0xFFFF
+BUFFER_SIZE = 64 * 1024
+MAX_QUEUE = 50000
+
+
+# ============================================================
+#   ÉCRITURE
+# ============================================================
+
+class _Writer:
+    """Thread unique qui encode et écrit les trames de toutes les sessions."""
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=MAX_QUEUE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def submit(self, op):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="tty-record", daemon=True)
+                    self._thread.start()
+        if op[0] != "frame":
+            # open / close jamais perdus (file pleine : on attend le thread
+            # d'écriture) ; sinon fichier jamais fermé, ni index ni pied
+            self._queue.put(op)
+            return
+        try:
+            self._queue.put_nowait(op)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            op, rec, args = self._queue.get()
+            try:
+                if op == "frame":
+                    rec._write_frame(*args)
+                elif op == "open":
+                    rec._open()
+                elif op == "close":
+                    rec._close()
+                    args.set()
+            except OSError as e:
+                logging.error("Enregistrement TTY %s: %s", rec.path, e)
+
+
+_WRITER = _Writer()
+
+
+class Recorder:
+    """Enregistreur d'une session ; toutes les méthodes sont non bloquantes."""
+
+    def __init__(self, path, cols=80, rows=24):
+        self.path = path
+        self.cols = cols
+        self.rows = rows
+        self.started_wall = time.time()
+        self._t0 = time.monotonic()
+        self._f = None
+        self._offset = 0
+        self._frames = 0
+        self._index = []
+        self._last_index_t = None
+        self._closed = False
+        _WRITER.submit(("open", self, None))
+
+    def input(self, data):
+        self._record(INPUT, data)
+
+    def output(self, data):
+        self._record(OUTPUT, data)
+
+    def resize(self, cols, rows):
+        self._record(RESIZE, f"{cols}x{rows}".encode())
+
+    def close(self, timeout=2.0):
+        if self._closed:
+            return
+        self._closed = True
+        done = threading.Event()
+        _WRITER.submit(("close", self, done))
+        done.wait(timeout)
+
+    def _record(self, kind, data):
+        if self._closed or not data:
+            return
+        t_ms = int((time.monotonic() - self._t0) * 1000)
+        _WRITER.submit(("frame", self, (t_ms, kind, bytes(data))))
+
+    # --- côté thread d'écriture ---
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._f = open(self.path, "wb", buffering=BUFFER_SIZE)
+        head = MAGIC + HEADER.pack(self.started_wall, self.cols, self.rows)
+        self._f.write(head)
+        self._offset = len(head)
+
+    def _write_frame(self, t_ms, kind, data):
+        if self._f is None:
+            return
+        for i in range(0, len(data), MAX_PAYLOAD):
+            chunk = data[i:i + MAX_PAYLOAD]
+            if (self._frames % INDEX_EVERY == 0 or self._last_index_t is None
+                    or t_ms - self._last_index_t >= INDEX_MAX_GAP_MS):
+                self._index.append((t_ms, self._offset))
+                self._last_index_t = t_ms
+            self._f.write(FRAME.pack(t_ms, kind, len(chunk)))
+            self._f.write(chunk)
+            self._offset += FRAME.size + len(chunk)
+            self._frames += 1
+
+    def _close(self):
+        if self._f is None:
+            return
+        index_offset = self._offset
+        parts = [INDEX_MAGIC, struct.pack("<I", len(self._index))]
+        parts.extend(INDEX_ENTRY.pack(t, off) for t, off in self._index)
+        parts.append(FOOTER.pack(index_offset))
+        parts.append(END_MAGIC)
+        self._f.write(b"".join(parts))
+        self._f.close()
+        self._f = None
+
+
+# ============================================================
+#   LECTURE
+# ============================================================
+
+class Recording:
+    """Lecture d'un enregistrement par mmap, avec accès direct par temps."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: pas un enregistrement TTY")
+        self.started_wall, self.cols, self.rows = HEADER.unpack_from(self._mm, len(MAGIC))
+        self._data_start = len(MAGIC) + HEADER.size
+        self._data_end, self._index = self._load_index()
+        self._index_times = [t for t, _ in self._index]
+
+    def _load_index(self):
+        mm = self._mm
+        tail = len(END_MAGIC) + FOOTER.size
+        if len(mm) >= self._data_start + tail and mm[-len(END_MAGIC):] == END_MAGIC:
+            (index_offset,) = FOOTER.unpack_from(mm, len(mm) - tail)
+            if mm[index_offset:index_offset + len(INDEX_MAGIC)] == INDEX_MAGIC:
+                (n,) = struct.unpack_from("<I", mm, index_offset + len(INDEX_MAGIC))
+                base = index_offset + len(INDEX_MAGIC) + 4
+                index = [INDEX_ENTRY.unpack_from(mm, base + i * INDEX_ENTRY.size) for i in range(n)]
+                return index_offset, index
+        # Fichier non fermé proprement : une passe linéaire sur les en-têtes
+        index = []
+        offset = self._data_start
+        n = 0
+        while offset + FRAME.size <= len(mm):
+            t_ms, _, length = FRAME.unpack_from(mm, offset)
+            if offset + FRAME.size + length > len(mm):
+                break
+            if n % INDEX_EVERY == 0:
+                index.append((t_ms, offset))
+            offset += FRAME.size + length
+            n += 1
+        return offset, index
+
+    @property
+    def index_entries(self):
+        return len(self._index)
+
+    @property
+    def duration(self):
+        last = 0.0
+        for t, _, _ in self.frames(self._index_times[-1] / 1000 if self._index_times else 0):
+            last = t
+        return last
+
+    def frames(self, start=0.0, end=None):
+        """Itère (t secondes, 'i'|'o', bytes) à partir de `start`."""
+        start_ms = int(start * 1000)
+        # Dernière entrée strictement avant `start` : plusieurs entrées peuvent
+        # partager un même instant, la première trame à `start` est après elle
+        pos = max(bisect.bisect_left(self._index_times, start_ms) - 1, 0)
+        offset = self._index[pos][1] if self._index else self._data_start
+        mm = self._mm
+        while offset + FRAME.size <= self._data_end:
+            t_ms, kind, length = FRAME.unpack_from(mm, offset)
+            payload_at = offset + FRAME.size
+            offset = payload_at + length
+            if t_ms < start_ms:
+                continue
+            if end is not None and t_ms > end * 1000:
+                return
+            yield t_ms / 1000, chr(kind), mm[payload_at:offset]
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+def export_asciicast(rec, out):
+    header = {"version": 2, "width": rec.cols, "height": rec.rows,
+              "timestamp": int(rec.started_wall)}
+    out.write(json.dumps(header) + "\n")
+    for t, kind, data in rec.frames():
+        out.write(json.dumps([round(t, 3), kind, data.decode("utf-8", errors="replace")]) + "\n")
+
+
+def replay(rec, seek=0.0, speed=1.0, out=None):
+    out = out or sys.stdout.buffer
+    last = seek
+    for t, kind, data in rec.frames(seek):
+        if kind != "o":
+            continue
+        if speed > 0:
+            time.sleep(max(0.0, (t - last) / speed))
+        last = t
+        out.write(data)
+        out.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enregistrements TTY du honeypot SSH")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("info")
+    p.add_argument("file")
+
+    p = sub.add_parser("replay")
+    p.add_argument("file")
+    p.add_argument("--seek", type=float, default=0.0, help="position de départ (s)")
+    p.add_argument("--speed", type=float, default=1.0, help="0 = sans délai")
+
+    p = sub.add_parser("export")
+    p.add_argument("file")
+    p.add_argument("-o", "--output", help="fichier .cast (défaut: stdout)")
+
+    args = parser.parse_args()
+    rec = Recording(args.file)
+    try:
+        if args.cmd == "info":
+            print(json.dumps({
+                "file": args.file,
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(rec.started_wall)),
+                "size": f"{rec.cols}x{rec.rows}",
+                "index_entries": rec.index_entries,
+                "duration_s": rec.duration,
+            }, indent=2))
+        elif args.cmd == "replay":
+            replay(rec, args.seek, args.speed)
+        elif args.cmd == "export":
+            if args.output:
+                with open(args.output, "w") as out:
+                    export_asciicast(rec, out)
+            else:
+                export_asciicast(rec, sys.stdout)
+    finally:
+        rec.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# upload_store.py
+"""
+Stockage des fichiers uploadés sur le honeypot e-commerce (/upload).
+
+  - le corps multipart est écrit sur disque par morceaux, au fil de la
+    lecture (jamais entièrement en mémoire), avec une taille maximale ;
+  - SHA-256 (et ssdeep si le module est installé) sont calculés pendant
+    cette même écriture, sans relire le fichier ;
+  - les fichiers sont rangés par contenu (.objects/ab/abcd...) : un même
+    échantillon envoyé mille fois par des bots n'est stocké qu'une fois ;
+  - le nom choisi par l'attaquant (nettoyé par secure_filename) devient un
+    lien physique vers l'objet, pour que /uploads/<nom> reste servi.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+
+try:
+    import ssdeep
+except ImportError:
+    ssdeep = None
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+class SpooledUpload:
+    """
+    Fichier temporaire (dans le dossier d'upload, donc sur le même système
+    de fichiers que les objets) qui hache ce qu'on y écrit. Sert de
+    stream_factory à Werkzeug : read/readline/seek sont ceux du fichier.
+    """
+
+    def __init__(self, tmp_dir, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        self._fuzzy = ssdeep.Hash() if ssdeep is not None else None
+        fd, self.path = tempfile.mkstemp(dir=tmp_dir, prefix="up-")
+        self._file = os.fdopen(fd, "w+b")
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise RequestEntityTooLarge()
+        self._sha256.update(data)
+        if self._fuzzy is not None:
+            self._fuzzy.update(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+    @property
+    def ssdeep(self):
+        return self._fuzzy.digest() if self._fuzzy is not None else None
+
+    def discard(self):
+        """Ferme et supprime le fichier temporaire (s'il existe encore)."""
+        self._file.close()
+        if self.path is not None:
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
+
+    def close(self):
+        # Appelé par Werkzeug en fin de requête : un upload non rangé
+        # (commit) ne laisse rien sur le disque.
+        self.discard()
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class StoredUpload:
+    __slots__ = ("name", "path", "size", "sha256", "ssdeep", "duplicate")
+
+    def __init__(self, name, path, size, sha256, ssdeep, duplicate):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.ssdeep = ssdeep
+        self.duplicate = duplicate
+
+
+class UploadStore:
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.tmp_dir = os.path.join(root, ".tmp")
+        self.objects_dir = os.path.join(root, ".objects")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # Métriques
+        self.stored = 0
+        self.duplicates = 0
+
+    def spool(self):
+        return SpooledUpload(self.tmp_dir, self.max_bytes)
+
+    def object_path(self, sha256):
+        return os.path.join(self.objects_dir, sha256[:2], sha256)
+
+    def commit(self, upload, filename):
+        """
+        Range `upload` sous son SHA-256 (ou le supprime si le contenu est
+        déjà connu) et publie `filename` nettoyé comme alias. Retourne un
+        StoredUpload.
+        """
+        upload.flush()
+        sha256 = upload.sha256
+        obj = self.object_path(sha256)
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        try:
+            os.link(upload.path, obj)
+            duplicate = False
+        except FileExistsError:
+            duplicate = True
+        upload.discard()
+
+        name = secure_filename(filename or "") or sha256
+        alias = os.path.join(self.root, name)
+        self._publish(obj, alias)
+        with self._lock:
+            if duplicate:
+                self.duplicates += 1
+            else:
+                self.stored += 1
+        return StoredUpload(name, alias, upload.size, sha256, upload.ssdeep, duplicate)
+
+    def _publish(self, obj, alias):
+        try:
+            if os.path.samefile(obj, alias):
+                return
+        except FileNotFoundError:
+            pass
+        # Lien sous un nom temporaire puis rename : l'alias est remplacé
+        # atomiquement, même si deux uploads du même nom se croisent.
+        tmp = os.path.join(self.tmp_dir, "ln-" + os.urandom(8).hex())
+        os.link(obj, tmp)
+        os.replace(tmp, alias)
+
+    def stats(self):
+        with self._lock:
+            return {"stored": self.stored, "duplicates": self.duplicates}
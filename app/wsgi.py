@@ -0,0 +1,13 @@
+# wsgi.py
+"""
+Point d'entrée WSGI du honeypot e-commerce pour un serveur de production :
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+L'import de app.py crée le schéma (init_db) et ouvre le log JSON ; avec
+preload_app (gunicorn.conf.py) cela se fait une seule fois, dans le
+processus maître, avant le fork des workers.
+"""
+from app import app
+
+__all__ = ["app"]
@@ -70,8 +70,8 @@ if [ "$1" == "--local" ]; then
     fi
 
     # Lancement des scripts en arrière-plan
-    echo "   -> Démarrage de l'E-commerce (app.py) en arrière-plan (PID enregistré)..."
-    (cd "$PROJECT_DIR/app" && "$PYTHON_EXEC" app.py > /tmp/honeypot_app.log 2>&1 &)
+    echo "   -> Démarrage de l'E-commerce (gunicorn, wsgi.py) en arrière-plan (PID enregistré)..."
+    (cd "$PROJECT_DIR/app" && "$PYTHON_EXEC" -m gunicorn -c gunicorn.conf.py wsgi:app > /tmp/honeypot_app.log 2>&1 &)
     APP_PID=$!
 
     echo "   -> Démarrage du Honeypot FTP (ftp_honeypot_advanced.py) en arrière-plan (PID enregistré)..."
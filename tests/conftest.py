@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Les modules de app/ s'importent entre eux par leur nom (python app/xxx.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
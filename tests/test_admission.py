@@ -0,0 +1,91 @@
+import importlib
+import os
+
+import pytest
+
+import admission
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = admission.TokenBucket(2, now=0.0)
+    assert bucket.take(1.0, 2, 0.0) and bucket.take(1.0, 2, 0.0)
+    assert not bucket.take(1.0, 2, 0.5)
+    assert bucket.take(1.0, 2, 1.0)
+    # Jamais plus que la rafale, même après une longue pause
+    assert [bucket.take(1.0, 2, 100.0) for _ in range(3)] == [True, True, False]
+
+
+def test_per_ip_limit(clock):
+    ctl = admission.AdmissionController(ip_rate=1, ip_burst=3, net_rate=100, net_burst=100)
+    assert [ctl.admit("10.0.0.1") for _ in range(4)] == [None, None, None, "ip_rate"]
+    assert ctl.admit("10.0.0.2") is None
+    clock.now += 1
+    assert ctl.admit("10.0.0.1") is None
+    assert ctl.stats()["throttled"]["ip_rate"] == 1
+
+
+def test_per_network_limit(clock):
+    ctl = admission.AdmissionController(ip_rate=100, ip_burst=100, net_rate=1, net_burst=2)
+    assert [ctl.admit(f"10.0.0.{i}") for i in range(3)] == [None, None, "net_rate"]
+    assert ctl.admit("10.0.1.1") is None
+
+
+def test_handshake_slot_released_once():
+    ctl = admission.AdmissionController(max_handshakes=1)
+    slot = ctl.begin_handshake()
+    assert ctl.begin_handshake() is None
+    slot.release()
+    slot.release()  # sans effet : le sémaphore borné lèverait ValueError
+    other = ctl.begin_handshake()
+    assert other is not None
+    assert ctl.begin_handshake() is None
+    other.release()
+    assert ctl.stats()["throttled"]["handshake_concurrency"] == 2
+
+
+@pytest.fixture
+def ssh_honeypot(tmp_path, monkeypatch):
+    monkeypatch.setenv("SSH_LOG_DIR", str(tmp_path))
+    import ssh_honeypot
+    module = importlib.reload(ssh_honeypot)
+    events = []
+    monkeypatch.setattr(module, "log_event", lambda event_type, *args, **kwargs: events.append(event_type))
+    module.events = events
+    return module
+
+
+class Conn:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_slot_released_when_transport_setup_fails(ssh_honeypot, monkeypatch):
+    ctl = admission.AdmissionController(max_handshakes=1)
+    monkeypatch.setattr(ssh_honeypot, "ADMISSION", ctl)
+
+    def broken_transport(conn):
+        raise OSError("socket fermée")
+
+    conn = Conn()
+    ssh_honeypot.handle_ssh_connection(conn, ("10.0.0.1", 2222), [], transport_class=broken_transport)
+
+    assert conn.closed
+    assert ssh_honeypot.events == ["connection_error"]
+    assert ctl.begin_handshake() is not None
@@ -0,0 +1,195 @@
+import contextlib
+import io
+import os
+import re
+import sqlite3
+import sys
+
+import pytest
+
+UPLOAD_MAX_BYTES = 4096
+
+
+def legacy_database(path):
+    """database.db tel que le créait l'ancien init_db : ni index, ni user_version."""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT, role TEXT DEFAULT 'user');
+        CREATE TABLE products (id INTEGER PRIMARY KEY, name TEXT, category TEXT, price REAL, description TEXT);
+        CREATE TABLE comments (id INTEGER PRIMARY KEY, product_id INTEGER, username TEXT, comment TEXT);
+        CREATE TABLE wishlist (id INTEGER PRIMARY KEY, username TEXT, product_id INTEGER);
+        CREATE TABLE orders (id INTEGER PRIMARY KEY, username TEXT, products TEXT, total REAL, date TEXT);
+        INSERT INTO products (name, category, price, description) VALUES ('Old Lamp', 'Home', 10.0, 'Lampe');
+    ''')
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture(scope="module")
+def ecom(tmp_path_factory):
+    root = tmp_path_factory.mktemp("ecom")
+    legacy_database(root / "database.db")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(root)
+        mp.setenv("ECOM_DB_PATH", str(root / "database.db"))
+        mp.setenv("ECOM_LOG_DIR", str(root / "logs"))
+        mp.setenv("ECOM_UPLOAD_MAX_BYTES", str(UPLOAD_MAX_BYTES))
+        for name in ("db", "app"):
+            mp.delitem(sys.modules, name, raising=False)
+        import app
+        yield app
+        app.db.POOL.close()
+
+
+@pytest.fixture
+def db(ecom):
+    return ecom.db
+
+
+@contextlib.contextmanager
+def raw(ecom):
+    """Connexion directe à la base, hors de l'application (commit + close)."""
+    conn = sqlite3.connect(ecom.db.DB_PATH)
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def product_id(ecom, name):
+    with raw(ecom) as conn:
+        return conn.execute("SELECT id FROM products WHERE name=?", (name,)).fetchone()[0]
+
+
+def add_products(ecom, names):
+    with raw(ecom) as conn:
+        conn.executemany("INSERT INTO products (name, category, price, description) VALUES (?, 'Gadget', 1.0, '')",
+                         [(n,) for n in names])
+
+
+def login(client):
+    assert client.post("/login", data={"username": "admin", "password": "admin123"}).status_code == 302
+
+
+def test_migrations_applied_to_existing_database(ecom, db):
+    with raw(ecom) as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == db.MIGRATIONS[-1][0]
+        indexes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        assert {"comments_product_id", "orders_username"} <= indexes
+        names = [r[0] for r in conn.execute("SELECT name FROM products ORDER BY id")]
+        assert names == ["Old Lamp", "Laptop Pro", "Smartphone X", "Wireless Mouse"]
+        assert db.migrate(conn) == []
+    # Redémarrage : rien à refaire, rien dupliqué
+    ecom.init_db()
+    with raw(ecom) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM products").fetchone()[0] == 4
+
+
+def test_requests_reuse_pooled_connection(ecom, db):
+    client = ecom.app.test_client()
+    client.get("/search?q=lamp")
+    opened = db.POOL.opened
+    for _ in range(20):
+        assert client.get("/search?q=lamp").status_code == 200
+    assert db.POOL.opened == opened
+
+
+def test_cart_and_checkout_batch_product_lookups(ecom, db, monkeypatch):
+    laptop, mouse = product_id(ecom, "Laptop Pro"), product_id(ecom, "Wireless Mouse")
+    queries = []
+    real_query_all = db.query_all
+    monkeypatch.setattr(db, "query_all", lambda sql, params=(): queries.append(sql) or real_query_all(sql, params))
+    db.PRODUCT_CACHE.clear()
+
+    client = ecom.app.test_client()
+    with client.session_transaction() as sess:
+        sess["cart"] = [str(laptop), str(mouse), str(laptop), "999999", "abc"] * 40
+    body = client.get("/cart").get_data(as_text=True)
+    assert body.count("Laptop Pro") == 80 and body.count("Wireless Mouse") == 40
+    assert sum("FROM products WHERE id IN" in sql for sql in queries) == 1
+
+    queries.clear()
+    assert client.post("/checkout").status_code == 200
+    assert not any("FROM products" in sql for sql in queries)
+    with raw(ecom) as conn:
+        products, total = conn.execute("SELECT products, total FROM orders ORDER BY id DESC").fetchone()
+    assert products.split(",") == ["Laptop Pro", "Wireless Mouse", "Laptop Pro"] * 40
+    assert total == pytest.approx(40 * (2 * 1299.99 + 49.99))
+
+
+def test_search_prefix_punctuation_and_cap(ecom, db, monkeypatch):
+    add_products(ecom, [f"Widget {i}" for i in range(30)])
+    monkeypatch.setattr(db, "SEARCH_LIMIT", 10)
+    client = ecom.app.test_client()
+
+    assert "Laptop Pro" in client.get("/search?q=lap").get_data(as_text=True)
+    for q in ['"lap', "lap*", "name:lap OR", "lap)(", "!!!", "'"]:
+        assert client.get("/search", query_string={"q": q}).status_code == 200
+    assert "Laptop Pro" in client.get("/search", query_string={"q": '"lap*'}).get_data(as_text=True)
+    with ecom.app.app_context():
+        assert len(db.get_products("widg")) == 10
+        assert len(db.get_products("")) == 10
+        assert db.get_products("!!!") == []
+
+
+def test_anonymous_pages_answer_304_on_matching_etag(ecom):
+    client = ecom.app.test_client()
+    for url in ("/", f"/product?id={product_id(ecom, 'Laptop Pro')}"):
+        first = client.get(url)
+        assert first.status_code == 200 and first.headers["ETag"]
+        again = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+        assert again.status_code == 304 and again.data == b""
+
+
+def test_comment_invalidates_cached_product_page(ecom):
+    url = f"/product?id={product_id(ecom, 'Smartphone X')}"
+    anonymous = ecom.app.test_client()
+    assert "Super écran" not in anonymous.get(url).get_data(as_text=True)
+
+    author = ecom.app.test_client()
+    login(author)
+    author.post("/comment", data={"product_id": product_id(ecom, "Smartphone X"), "comment": "Super écran"})
+
+    assert "Super écran" in anonymous.get(url).get_data(as_text=True)
+
+
+def test_comments_are_paginated_by_keyset_cursor(ecom):
+    pid = product_id(ecom, "Old Lamp")
+    with raw(ecom) as conn:
+        conn.executemany("INSERT INTO comments (product_id, username, comment) VALUES (?, 'bot', ?)",
+                         [(pid, f"avis-{i}") for i in range(7)])
+    client = ecom.app.test_client()
+    url, seen, pages = f"/product?id={pid}&limit=3", [], 0
+    while url:
+        body = client.get(url).get_data(as_text=True)
+        seen += re.findall(r"avis-\d+", body)
+        pages += 1
+        link = re.search(r'<a href="(/product\?[^"]*after=[^"]*)"', body)
+        url = link.group(1) if link else None
+    assert seen == [f"avis-{i}" for i in range(7)]
+    assert pages == 3
+
+
+def test_upload_over_limit_is_rejected_and_spool_removed(ecom):
+    client = ecom.app.test_client()
+    resp = client.post("/upload", data={"file": (io.BytesIO(b"x" * (UPLOAD_MAX_BYTES + 1)), "big.bin")},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 413
+    assert os.listdir(ecom.UPLOADS.tmp_dir) == []
+    assert not os.path.exists(os.path.join(ecom.UPLOAD_FOLDER, "big.bin"))
+
+
+def test_identical_uploads_are_stored_once(ecom):
+    client = ecom.app.test_client()
+    before = ecom.UPLOADS.stats()
+    for name in ("a.sh", "b.sh"):
+        resp = client.post("/upload", data={"file": (io.BytesIO(b"#!/bin/sh\nwget x\n"), name)},
+                           content_type="multipart/form-data")
+        assert resp.status_code == 200
+    after = ecom.UPLOADS.stats()
+    assert after["stored"] - before["stored"] == 1
+    assert after["duplicates"] - before["duplicates"] == 1
+    a, b = (os.path.join(ecom.UPLOAD_FOLDER, n) for n in ("a.sh", "b.sh"))
+    assert os.path.samefile(a, b)
+    assert os.listdir(ecom.UPLOADS.tmp_dir) == []
@@ -0,0 +1,92 @@
+import json
+import math
+import random
+from collections import Counter
+
+import auth_stats
+
+
+def test_hyperloglog_within_error_bound():
+    hll = auth_stats.HyperLogLog(p=14)
+    bound = 3 * 1.04 / math.sqrt(hll.m)         # 3 écarts-types
+    added = 0
+    for n in (100, 10000, 100000):
+        for i in range(added, n):
+            hll.add_hash(auth_stats.key_hash(f"10.{i >> 16}.{(i >> 8) & 255}.{i & 255}"))
+        added = n
+        assert abs(hll.count() - n) <= bound * n
+
+
+def test_hyperloglog_merge_counts_the_union():
+    a, b = auth_stats.HyperLogLog(p=12), auth_stats.HyperLogLog(p=12)
+    for i in range(6000):
+        a.add_hash(auth_stats.key_hash(f"u{i}"))
+    for i in range(3000, 9000):
+        b.add_hash(auth_stats.key_hash(f"u{i}"))
+    a.merge(b)
+    assert abs(a.count() - 9000) <= 3 * 1.04 / math.sqrt(a.m) * 9000
+
+
+def test_count_min_never_undercounts():
+    rng = random.Random(1)
+    cms = auth_stats.CountMinSketch(width=64, depth=3)     # collisions forcées
+    stream = [f"pass{int(rng.paretovariate(1.2))}" for _ in range(20000)]
+    for value in stream:
+        cms.add_hash(auth_stats.key_hash(value))
+    truth = Counter(stream)
+    assert all(cms.estimate(value) >= count for value, count in truth.items())
+    assert cms.estimate("jamais vu") <= len(stream)
+
+
+def test_space_saving_finds_true_top_k_on_skewed_stream():
+    rng = random.Random(2)
+    heavy = {f"root{i}": 2000 - 150 * i for i in range(10)}
+    stream = [value for value, count in heavy.items() for _ in range(count)]
+    stream += [f"noise{i}" for i in range(20000)]
+    rng.shuffle(stream)
+
+    top = auth_stats.SpaceSaving(k=50)
+    for value in stream:
+        top.add(value)
+
+    found = top.top(10)
+    assert [value for value, _, _ in found] == list(heavy)
+    for value, count, error in found:
+        assert count - error <= heavy[value] <= count
+
+
+class ListSink:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+
+def test_rollup_emits_new_attempts_and_persists_state(tmp_path):
+    sink = ListSink()
+    stats = auth_stats.AuthStats("ftp", sink, str(tmp_path), interval=3600).start("0")
+    for password in ("123456", "123456", "admin"):
+        stats.record("10.0.0.1", "root", password)
+    stats.rollup()
+    stats.rollup()          # aucune nouvelle tentative : pas d'événement
+
+    assert len(sink.events) == 1
+    event = sink.events[0]
+    assert (event["event_type"], event["honeypot_type"], event["instance"]) == ("auth_rollup", "ftp", "0")
+    assert event["attempts"] == 3 and event["attempts_total"] == 3
+    assert event["unique"]["password"] == 2
+    assert event["top"]["credential"][0] == ["root:123456", 2]
+
+    stats.record("10.0.0.2", "admin", "admin")
+    stats.close()
+    assert [e["attempts"] for e in sink.events] == [3, 1]
+
+    state = json.loads((tmp_path / "ftp-0.json").read_text())
+    assert state["attempts"] == 4
+    restarted = auth_stats.AuthStats("ftp", ListSink(), str(tmp_path), interval=3600).start("0")
+    try:
+        assert restarted.sketches.attempts == 4
+        assert restarted.sketches.frequency["password"].estimate("admin") >= 2
+    finally:
+        restarted.close()
@@ -0,0 +1,224 @@
+import asyncio
+import ftplib
+import io
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+# Serveur complet (parent + workers pré-forkés) ; le filtre seccomp est
+# remplacé par un équivalent Python : plus aucune création, troncature ni
+# renommage de fichier dans le worker une fois sandboxé.
+SERVER = r"""
+import builtins, errno, os, sys
+sys.path.insert(0, sys.argv[1])
+import ftp_honeypot_advanced as ftp
+
+def sandbox():
+    def deny(*args, **kwargs):
+        raise PermissionError(errno.EACCES, "sandbox")
+    write_flags = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND
+    real_os_open, real_open = os.open, builtins.open
+    def os_open(path, flags, *args, **kwargs):
+        if flags & write_flags:
+            deny()
+        return real_os_open(path, flags, *args, **kwargs)
+    def builtin_open(file, mode="r", *args, **kwargs):
+        if isinstance(file, (str, bytes)) and any(c in mode for c in "wax+"):
+            deny()
+        return real_open(file, mode, *args, **kwargs)
+    os.open, builtins.open = os_open, builtin_open
+    os.rename = os.replace = os.ftruncate = os.truncate = os.unlink = deny
+
+ftp.PORT = int(sys.argv[2])
+ftp.enable_seccomp_block_put = sandbox
+ftp.start_server(int(sys.argv[3]))
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def connect(port):
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            return socket.create_connection(("127.0.0.1", port), timeout=5)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def test_log_rotates_with_a_single_sandboxed_worker(tmp_path):
+    sys.path.insert(0, APP_DIR)
+    import log_rotation
+
+    log_dir = tmp_path / "logs"
+    port = free_port()
+    pasv = str(free_port())
+    env = dict(os.environ, FTP_LOG_DIR=str(log_dir), FTP_HONEYPOT_DIR=str(tmp_path / "honeypot"),
+               FTP_PASV_PORT_MIN=pasv, FTP_PASV_PORT_MAX=pasv, LOG_ROTATE_BYTES="4096")
+    server = subprocess.Popen([sys.executable, "-c", SERVER, APP_DIR, str(port), "1"],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    log = str(log_dir / "honeypot_ftp.log")
+    try:
+        with connect(port) as client:
+            client.sendall(b"".join(b"NOOP %d\r\n" % i for i in range(200)))
+            assert wait_for(lambda: log_rotation.segment_paths(log))
+            client.sendall(b"QUIT\r\n")
+    finally:
+        server.terminate()
+        server.wait(15)
+
+    commands = [line for line in log_rotation.iter_lines(log) if b'"command"' in line and b"NOOP" in line]
+    assert len(commands) == 200
+
+
+# ============================================================
+#   Serveur dans le processus de test (serve() sur un port éphémère,
+#   sans sandbox : seccomp n'est jamais chargé ici)
+# ============================================================
+
+class LoopbackServer:
+    def __init__(self, ftp, pasv_port):
+        self.ftp = ftp
+        ftp.PASV_POOL = ftp.PassivePortPool("127.0.0.1", pasv_port, pasv_port, accept_timeout=5).open()
+        self.sock = ftp.make_listen_socket()
+        self.port = self.sock.getsockname()[1]
+        self.loop = asyncio.new_event_loop()
+        self.task = self.loop.create_task(ftp.serve(self.sock))
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+
+    def client(self):
+        client = ftplib.FTP()
+        client.connect("127.0.0.1", self.port, timeout=5)
+        client.login("anonymous", "bot@")
+        return client
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join(5)
+        self.loop.close()
+        self.sock.close()
+        self.ftp.PASV_POOL.close()
+
+
+@pytest.fixture(scope="module")
+def ftp(tmp_path_factory):
+    root = tmp_path_factory.mktemp("ftp")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("FTP_LOG_DIR", str(root / "logs"))
+        mp.setenv("FTP_HONEYPOT_DIR", str(root / "honeypot"))
+        mp.delitem(sys.modules, "ftp_honeypot_advanced", raising=False)
+        import ftp_honeypot_advanced
+        mp.setattr(ftp_honeypot_advanced, "HOST", "127.0.0.1")
+        mp.setattr(ftp_honeypot_advanced, "PORT", 0)
+        yield ftp_honeypot_advanced
+
+
+@pytest.fixture
+def server(ftp):
+    server = LoopbackServer(ftp, free_port())
+    yield server
+    server.close()
+
+
+def retr(client, name):
+    out = io.BytesIO()
+    client.retrbinary(f"RETR {name}", out.write)
+    return out.getvalue()
+
+
+def test_retr_small_files_from_cache_and_large_ones_by_sendfile(ftp, server, monkeypatch):
+    big = os.urandom(3 * ftp.FS.files.small_file_max)
+    (pathlib.Path(ftp.HONEYPOT_DIR) / "big.bin").write_bytes(big)
+    sent = []
+    real_sendfile = os.sendfile
+    monkeypatch.setattr(os, "sendfile", lambda *args: sent.append(args) or real_sendfile(*args))
+
+    with server.client() as client:
+        hits = ftp.FS.files.stats()["hits"]
+        assert retr(client, "flag.txt") == b"FLAG{FTP_HONEYPOT_OK}\n"
+        assert retr(client, "/flag.txt") == b"FLAG{FTP_HONEYPOT_OK}\n"
+        assert ftp.FS.files.stats()["hits"] == hits + 1
+        assert not sent
+
+        assert retr(client, "big.bin") == big
+        assert sent
+        assert os.path.join(ftp.HONEYPOT_DIR, "big.bin") not in ftp.FS.files._entries
+
+
+def test_cached_listing_follows_directory_changes(ftp, server, monkeypatch):
+    monkeypatch.setattr(ftp.FS.listings, "revalidate", 0)
+    with server.client() as client:
+        client.cwd("/pub")
+        assert client.nlst() == ["README", "releases"]
+        rebuilds = ftp.FS.listings.stats()["rebuilds"]
+        assert client.nlst() == ["README", "releases"]
+        assert ftp.FS.listings.stats()["rebuilds"] == rebuilds
+
+        (pathlib.Path(ftp.HONEYPOT_DIR) / "pub" / "new.tar").write_bytes(b"x")
+        pub = os.path.join(ftp.HONEYPOT_DIR, "pub")
+        # Même mtime possible au sein d'un même tick d'horloge : on l'avance
+        os.utime(pub, ns=(time.time_ns(), ftp.FS.listings._entries[pub].mtime_ns + 1))
+        assert client.nlst() == ["README", "new.tar", "releases"]
+        assert ftp.FS.listings.stats()["rebuilds"] == rebuilds + 1
+
+
+def test_pasv_pool_hands_out_and_reclaims_ports(ftp, server):
+    pool = ftp.PASV_POOL
+    with server.client() as first, server.client() as second:
+        first.sendcmd("PASV")
+        assert pool.stats()["free"] == 0
+        with pytest.raises(ftplib.error_temp, match="425"):
+            second.sendcmd("PASV")
+        assert pool.stats()["exhausted"] == 1
+
+        # Le port est rendu après le transfert, puis réutilisé par l'autre session
+        first.nlst()
+        assert pool.stats()["free"] == 1
+        assert second.nlst()
+        assert pool.stats()["free"] == 1
+
+        # ... et à la fin d'une session qui ne s'en est pas servi
+        first.sendcmd("PASV")
+        assert pool.stats()["free"] == 0
+    assert wait_for(lambda: pool.stats()["free"] == 1, timeout=5)
+
+
+def test_more_workers_than_pasv_ports_is_refused(ftp, monkeypatch):
+    port = free_port()
+    monkeypatch.setattr(ftp, "PASV_PORT_MIN", port)
+    monkeypatch.setattr(ftp, "PASV_PORT_MAX", port + 1)
+    assert ftp.pasv_range(1, 2) == (port + 1, port + 1)
+    with pytest.raises(ValueError):
+        ftp.pasv_range(0, 3)
+    with pytest.raises(SystemExit, match="trop petite pour 3 workers"):
+        ftp.start_server(3)
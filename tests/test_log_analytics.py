@@ -0,0 +1,86 @@
+import json
+
+import log_analytics
+import log_shipper
+
+
+def ssh_attempt(ip, password):
+    return json.dumps({
+        "timestamp": "2024-05-01T12:00:00+0000", "honeypot_type": "ssh_real",
+        "event_type": "login_attempt", "source_ip": ip, "username": "root", "password": password,
+        "command": None, "message": "", "session_id": "s1", "extra": {}}) + "\n"
+
+
+def test_rows_after_oversize_line_are_ingested(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_shipper, "MAX_LINE", log_shipper.READ_CHUNK)
+    log_dir = tmp_path / "logs"
+    log_dir.mkdir()
+    path = log_dir / "honeypot_ssh.log"
+    path.write_text(ssh_attempt("10.0.0.1", "a")
+                    + "x" * (2 * log_shipper.READ_CHUNK) + "\n"
+                    + ssh_attempt("10.0.0.2", "b") + ssh_attempt("10.0.0.2", "c"))
+    cache = tmp_path / "cache"
+
+    table = log_analytics.open_table(str(log_dir), str(cache))
+
+    assert len(table) == 3
+    assert table.top("ip", 10) == [("10.0.0.2", 2), ("10.0.0.1", 1)]
+    store = log_analytics.ColumnStore(str(cache / "ssh_paramiko"))
+    assert store.meta["checkpoint"]["offset"] == path.stat().st_size
+
+
+def test_long_line_below_max_line_is_ingested(tmp_path):
+    log_dir = tmp_path / "logs"
+    log_dir.mkdir()
+    path = log_dir / "honeypot_ssh.log"
+    path.write_text(ssh_attempt("10.0.0.1", "p" * (log_shipper.READ_CHUNK + 100))
+                    + ssh_attempt("10.0.0.2", "b"))
+
+    table = log_analytics.open_table(str(log_dir), str(tmp_path / "cache"))
+
+    assert len(table) == 2
+
+
+def test_rows_across_rotations_are_ingested_once(tmp_path):
+    import log_rotation
+
+    log_dir = tmp_path / "logs"
+    log_dir.mkdir()
+    path = log_dir / "honeypot_ssh.log"
+    rotator = log_rotation.Rotator(str(path), max_bytes=1, max_age=0, compress_delay=0)
+    cache = str(tmp_path / "cache")
+
+    def attempt_then_rotate(i):
+        with open(path, "a") as f:
+            f.write(ssh_attempt(f"10.0.0.{i}", "p"))
+        with open(path, "rb") as f:
+            rotator.check(f.fileno())
+
+    for i in range(3):
+        attempt_then_rotate(i)
+    assert len(log_analytics.open_table(str(log_dir), cache)) == 3
+    for i in range(3, 6):
+        attempt_then_rotate(i)
+    with open(path, "a") as f:
+        f.write(ssh_attempt("10.0.0.6", "p"))
+    rotator.close()
+    assert len(log_analytics.open_table(str(log_dir), cache)) == 7
+
+
+def ftp_command(session, command):
+    return json.dumps({
+        "timestamp": "2024-05-01T12:00:00", "honeypot_type": "ftp", "event_type": "command",
+        "source_ip": "10.0.0.9", "session_id": session, "command": command, "extra": {}}) + "\n"
+
+
+def test_ftp_user_pass_pair_counts_once(tmp_path):
+    log_dir = tmp_path / "logs"
+    log_dir.mkdir()
+    (log_dir / "honeypot_ftp.log").write_text(
+        ftp_command("f1", "USER admin") + ftp_command("f1", "PASS secret")
+        + ftp_command("f2", "USER guest"))
+
+    table = log_analytics.open_table(str(log_dir), str(tmp_path / "cache"))
+
+    assert table.top("user", 10) == [("admin", 1)]
+    assert table.top("cred", 10) == [("admin:secret", 1)]
@@ -0,0 +1,72 @@
+import os
+
+import event_sink
+import log_rotation
+
+
+def make_sink(path, max_bytes=2000):
+    rotator = log_rotation.Rotator(str(path), max_bytes=max_bytes, max_age=0, compress_delay=0)
+    return event_sink.EventSink(str(path), batch_size=10, flush_interval=0.01, rotator=rotator)
+
+
+def test_rotation_renames_the_active_file(tmp_path):
+    path = tmp_path / "honeypot_ssh.log"
+    sink = make_sink(path)
+    sink.start()
+    for i in range(1000):
+        sink.emit('{"n": %d}' % i)
+    sink.close()
+
+    segments = log_rotation.segment_paths(str(path))
+    assert len(segments) > 1
+    assert all(p.endswith(".gz") for _, p in segments)
+    lines = list(log_rotation.iter_lines(str(path)))
+    assert lines == [b'{"n": %d}\n' % i for i in range(1000)]
+
+
+def test_unread_lines_stay_readable_from_the_renamed_inode(tmp_path):
+    # Un lecteur qui suit le fichier par son descripteur (comme Logstash)
+    # retrouve après la rotation les lignes qu'il n'avait pas encore lues
+    path = tmp_path / "honeypot_ssh.log"
+    sink = make_sink(path, max_bytes=10**9)
+    sink.start()
+    sink.emit('{"n": 1}')
+    sink.flush()
+    reader = open(path, "rb")
+    inode = os.fstat(reader.fileno()).st_ino
+    assert reader.readline() == b'{"n": 1}\n'
+    sink.emit('{"n": 2}')
+    sink.flush()
+
+    sink.rotator.max_bytes = 1
+    sink.emit('{"n": 3}')
+    sink.flush()
+    sink.rotator.max_bytes = 10**9
+    sink.emit('{"n": 4}')
+    sink.close()
+
+    assert reader.read() == b'{"n": 2}\n{"n": 3}\n'
+    reader.close()
+    assert os.stat(path).st_ino != inode
+    assert path.read_bytes() == b'{"n": 4}\n'
+
+
+def test_writers_reopen_after_another_process_rotated(tmp_path):
+    path = tmp_path / "ecom_honeypot.log"
+    first, second = make_sink(path, max_bytes=10**9), make_sink(path, max_bytes=10**9)
+    first.start()
+    second.start()
+    first.emit('{"w": 1}')
+    first.flush()
+    second.emit('{"w": 2}')
+    second.flush()
+
+    first.rotator.max_bytes = 1
+    first.emit('{"w": 3}')
+    first.flush()
+    second.emit('{"w": 4}')
+    second.close()
+    first.close()
+
+    assert path.read_bytes() == b'{"w": 4}\n'
+    assert list(log_rotation.iter_lines(str(path))) == [b'{"w": %d}\n' % i for i in (1, 2, 3, 4)]
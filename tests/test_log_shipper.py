@@ -0,0 +1,103 @@
+import json
+
+import log_shipper
+
+
+def write_lines(path, lines):
+    with open(path, "ab") as f:
+        for line in lines:
+            f.write(line + b"\n")
+
+
+def read_all(source):
+    lines = []
+    while True:
+        batch = source.read(log_shipper.READ_CHUNK, 1000)
+        if not batch:
+            return lines
+        lines.extend(batch)
+
+
+def test_line_longer_than_read_chunk_is_read(tmp_path):
+    path = tmp_path / "honeypot_ssh.log"
+    long_doc = json.dumps({"message": "x" * (log_shipper.READ_CHUNK + 1000)}).encode()
+    write_lines(path, [b'{"n": 1}', long_doc, b'{"n": 2}'])
+    source = log_shipper.Source(str(path), "ssh_paramiko", "ssh_honeypot")
+
+    lines = read_all(source)
+
+    assert [line.rstrip(b"\n") for line, _ in lines] == [b'{"n": 1}', long_doc, b'{"n": 2}']
+    assert lines[-1][1]["offset"] == path.stat().st_size
+    assert source.skipped == 0
+
+
+def test_line_longer_than_max_line_is_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_shipper, "MAX_LINE", log_shipper.READ_CHUNK)
+    path = tmp_path / "honeypot_ssh.log"
+    write_lines(path, [b'{"n": 1}', b"x" * (3 * log_shipper.READ_CHUNK), b'{"n": 2}', b'{"n": 3}'])
+    source = log_shipper.Source(str(path), "ssh_paramiko", "ssh_honeypot")
+
+    lines = read_all(source)
+
+    assert [line for line, _ in lines] == [b'{"n": 1}\n', b'{"n": 2}\n', b'{"n": 3}\n']
+    assert lines[-1][1]["offset"] == path.stat().st_size
+    assert source.skipped == 1
+
+
+def test_long_line_still_being_written_waits(tmp_path):
+    path = tmp_path / "honeypot_ssh.log"
+    path.write_bytes(b"x" * (log_shipper.READ_CHUNK + 10))
+    source = log_shipper.Source(str(path), "ssh_paramiko", "ssh_honeypot")
+
+    assert source.read(log_shipper.READ_CHUNK, 1000) == []
+    write_lines(path, [b"", b'{"n": 1}'])
+    assert [line for line, _ in read_all(source)][-1] == b'{"n": 1}\n'
+
+
+class FakeClient:
+    def __init__(self):
+        self.docs = []
+
+    def bulk(self, body):
+        items = []
+        lines = body.splitlines()
+        for action, doc in zip(lines[::2], lines[1::2]):
+            self.docs.append(json.loads(doc))
+            items.append({"index": {"_id": json.loads(action)["index"]["_id"], "status": 201}})
+        return 200, {"errors": False, "items": items}
+
+    def close(self):
+        pass
+
+
+def test_shipper_continues_after_oversize_line(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_shipper, "MAX_LINE", log_shipper.READ_CHUNK)
+    path = tmp_path / "honeypot_ssh.log"
+    write_lines(path, [b'{"n": 1}', b"x" * (2 * log_shipper.READ_CHUNK), b'{"n": 2}'])
+    client = FakeClient()
+    shipper = log_shipper.Shipper(client, str(tmp_path), str(tmp_path / "state.json"),
+                                  [("honeypot_ssh.log", "ssh_paramiko", "ssh_honeypot")])
+
+    shipper.run(once=True)
+
+    assert [doc["n"] for doc in client.docs] == [1, 2]
+    state = json.loads((tmp_path / "state.json").read_text())
+    assert state["honeypot_ssh.log"]["offset"] == path.stat().st_size
+
+
+def test_rotation_by_rename_is_read_once(tmp_path):
+    import log_rotation
+
+    path = tmp_path / "honeypot_ftp.log"
+    rotator = log_rotation.Rotator(str(path), max_bytes=1, max_age=0, compress_delay=3600)
+    source = log_shipper.Source(str(path), "ftp", "ftp_honeypot")
+    seen = []
+    for i in range(5):
+        write_lines(path, [b'{"n": %d}' % (2 * i), b'{"n": %d}' % (2 * i + 1)])
+        if i % 2 == 0:
+            seen += [line for line, _ in source.read(log_shipper.READ_CHUNK, 1)]
+        with open(path, "rb") as f:
+            rotator.check(f.fileno())
+    seen += [line for line, _ in read_all(source)]
+
+    assert seen == [b'{"n": %d}\n' % i for i in range(10)]
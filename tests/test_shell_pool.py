@@ -0,0 +1,65 @@
+import os
+import signal
+import time
+
+import shell_pool
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_refill_up_to_pool_size():
+    pool = shell_pool.ShellPool(size=2, max_shells=10).start()
+    try:
+        wait_for(lambda: pool.stats()["idle"] == 2)
+        shell = pool.acquire()
+        assert shell.alive()
+        assert pool.stats()["served_warm"] == 1
+        wait_for(lambda: pool.stats()["idle"] == 2)
+        pool.release(shell)
+        assert pool.stats()["active"] == 0
+    finally:
+        pool.close()
+
+
+def test_active_shells_are_capped():
+    pool = shell_pool.ShellPool(size=0, max_shells=2)
+    try:
+        shells = [pool.acquire(), pool.acquire()]
+        assert all(shells)
+        assert pool.acquire() is None
+        assert pool.stats()["rejected"] == 1
+        pool.release(shells.pop())
+        shells.append(pool.acquire())
+        assert shells[-1] is not None
+        assert pool.stats()["served_cold"] == 3
+        for shell in shells:
+            pool.release(shell)
+    finally:
+        pool.close()
+
+
+def test_dead_idle_shell_is_not_killed_again(monkeypatch):
+    pool = shell_pool.ShellPool(size=1, max_shells=2).start()
+    try:
+        wait_for(lambda: pool.stats()["idle"] == 1)
+        dead = pool._idle[0]
+        os.kill(dead.pid, signal.SIGKILL)
+        wait_for(lambda: not dead.alive())
+        assert dead.reaped
+
+        killed = []
+        real_kill = os.kill
+        monkeypatch.setattr(shell_pool.os, "kill", lambda pid, sig: killed.append(pid) or real_kill(pid, sig))
+        pool._stopped = True  # pas de nouveau shell en réserve : acquire() fork à la demande
+        shell = pool.acquire()
+        assert shell is not dead
+        assert dead.pid not in killed
+        assert dead.fd == -1
+        pool.release(shell)
+    finally:
+        pool.close()
@@ -0,0 +1,24 @@
+from tty_capture import InputAssembler
+
+
+def test_utf8_character_split_between_chunks():
+    assembler = InputAssembler()
+    data = "echo héhé €\r".encode()
+    lines = []
+    for i in range(len(data)):
+        lines += assembler.feed(data[i:i + 1], now=float(i))
+    assert [line.text for line in lines] == ["echo héhé €"]
+
+
+def test_repeated_command_is_merged():
+    assembler = InputAssembler()
+    lines = []
+    for t in (0.0, 1.0, 2.0):
+        lines += assembler.feed(b"uname -a\r", now=t)
+    lines += assembler.feed(b"id\r", now=3.0)
+    lines += assembler.feed(b"uname -a\r", now=4.0)
+    lines += assembler.feed(b"uname -a\r", now=30.0)
+    assert [line.text for line in lines] == ["uname -a", "id", "uname -a", "uname -a"]
+    summary = assembler.summary(now=31.0)
+    assert summary["lines"] == 6
+    assert summary["repeated_lines"] == 2
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import tty_record
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def record(path, monkeypatch, frames):
+    clock = Clock()
+    monkeypatch.setattr(tty_record.time, "monotonic", clock)
+    recorder = tty_record.Recorder(str(path))
+    for t, data in frames:
+        clock.now = 1000.0 + t
+        recorder.output(data)
+    recorder.close()
+    return tty_record.Recording(str(path))
+
+
+def test_seek_to_timestamp_shared_by_several_index_entries(tmp_path, monkeypatch):
+    frames = [(0.1, b"a")] * 10 + [(0.5, b"%d" % i) for i in range(200)] + [(0.9, b"z")]
+    rec = record(tmp_path / "s.hptty", monkeypatch, frames)
+    try:
+        assert rec.index_entries > 3
+        seen = [data for _, _, data in rec.frames(0.5)]
+        assert seen == [b"%d" % i for i in range(200)] + [b"z"]
+        assert [data for _, _, data in rec.frames(0.5, 0.5)] == [b"%d" % i for i in range(200)]
+    finally:
+        rec.close()
+
+
+def test_seek_from_start(tmp_path, monkeypatch):
+    frames = [(i / 8, b"%d" % i) for i in range(100)]
+    rec = record(tmp_path / "s.hptty", monkeypatch, frames)
+    try:
+        assert len(list(rec.frames())) == 100
+        assert [data for _, _, data in rec.frames(5.0)][0] == b"40"
+        assert rec.duration == 99 / 8
+    finally:
+        rec.close()
+
+
+def test_full_queue_drops_frames_but_not_open_and_close(tmp_path, monkeypatch):
+    monkeypatch.setattr(tty_record, "MAX_QUEUE", 4)
+    writer = tty_record._Writer()
+    monkeypatch.setattr(tty_record, "_WRITER", writer)
+    gate = threading.Event()
+    real_open = tty_record.Recorder._open
+    monkeypatch.setattr(tty_record.Recorder, "_open", lambda self: gate.wait() and real_open(self))
+
+    stalled = tty_record.Recorder(str(tmp_path / "a.hptty"))
+    for i in range(20):
+        stalled.output(b"%d" % i)
+    assert writer.dropped > 0
+    recorders = [stalled]
+
+    def open_and_close():
+        # File pleine : ces open / close attendent le thread d'écriture
+        recorders.extend(tty_record.Recorder(str(tmp_path / f"{i}.hptty")) for i in range(8))
+        for r in recorders:
+            r.close(timeout=5)
+
+    closing = threading.Thread(target=open_and_close)
+    closing.start()
+    time.sleep(0.1)
+    gate.set()
+    closing.join(10)
+
+    assert not closing.is_alive()
+    assert len(recorders) == 9
+    for r in recorders:
+        assert r._f is None
+        rec = tty_record.Recording(r.path)
+        rec.close()